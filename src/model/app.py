@@ -9,25 +9,51 @@ Endpoints:
 - POST /detect_pose - Head pose estimation
 - POST /predict_people - Person count detection
 - POST /predict_pose - Legacy pose detection
+- WS /stream/<session_id> - Streaming analysis channel
+- POST /stream/<session_id>/frame, GET /stream/<session_id>/events - SSE streaming
+- GET /sessions/<session_id>/violations - Aggregated session violations
+- GET /metrics - Prometheus metrics
+- GET /ready - Readiness probe
 - GET /health - Health check
 
 Author: Pariksha Guardian Team
 """
 
+import atexit
 import os
 import base64
 import json
+import threading
+import time
+from dataclasses import replace
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
 import cv2
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 
+try:
+    from flask_sock import Sock
+except ImportError:  # WebSocket streaming is optional; SSE streaming still works
+    Sock = None
+
 # Import our cheating detector
-from cheating_detector import YOLOCheatingDetector, AdvancedHeadPoseEstimator, CheatingAnalysis
+from camera_intrinsics import default_registry as camera_intrinsics
+from evidence_store import EvidenceQueueFull, EvidenceWriter, sniff_image_format
+from cheating_detector import YOLOCheatingDetector, AdvancedHeadPoseEstimator, CheatingAnalysis, Detection
+from batch_scheduler import BatchingScheduler
+from stream_sessions import StreamSessionManager
+from motion_gate import MotionGate
+from tracker import TrackingManager
+from violation_aggregator import SEVERITY_LEVELS, ViolationAggregator, ViolationEvent
+from worker_pool import InferenceWorkerPool
+from warmup import ModelWarmup, WarmupStep, parse_sizes
+from metrics import (REGISTRY, REQUEST_SECONDS, FRAMES_TOTAL, DETECTIONS_TOTAL, QUEUE_DEPTH,
+                     stage_timer, observe_stage, start_request_timings, end_request_timings,
+                     format_timing_header)
 
 # Configure logging
 logging.basicConfig(
@@ -39,18 +65,110 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app, origins=["*"])
+sock = Sock(app) if Sock is not None else None
 
 # Initialize detectors (lazy loading)
 cheating_detector: Optional[YOLOCheatingDetector] = None
 advanced_pose_estimator: Optional[AdvancedHeadPoseEstimator] = None
+batch_scheduler: Optional[BatchingScheduler] = None
+worker_pool: Optional[InferenceWorkerPool] = None
+# Guards model creation so the warm-up thread and early requests share one instance
+_model_lock = threading.RLock()
+
+# YOLO inference backend: torch, onnx or openvino (exported models are cached in assets/exported)
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'torch').lower()
+# Model precision: fp32 or int8 (int8 needs DETECTOR_BACKEND=onnx and models from quantization.py)
+MODEL_PRECISION = os.environ.get('MODEL_PRECISION', 'fp32').lower()
+INFERENCE_THREADS = int(os.environ['INFERENCE_THREADS']) if os.environ.get('INFERENCE_THREADS') else None
+# Only detect person and cheating/suspicious object classes
+RESTRICT_CLASSES = os.environ.get('RESTRICT_CLASSES', 'false').lower() == 'true'
+# Run object detection and face/head pose concurrently, with per-stage thread budgets
+PARALLEL_STAGES = os.environ.get('PARALLEL_STAGES', 'false').lower() == 'true'
+OBJECT_THREADS = int(os.environ['OBJECT_THREADS']) if os.environ.get('OBJECT_THREADS') else None
+FACE_THREADS = int(os.environ['FACE_THREADS']) if os.environ.get('FACE_THREADS') else None
+# Run YOLO on a crop around the session's student, with a full-frame pass every N detections
+ROI_MODE = os.environ.get('ROI_MODE', 'false').lower() == 'true'
+ROI_FULL_FRAME_INTERVAL = int(os.environ.get('ROI_FULL_FRAME_INTERVAL', 10))
+ROI_MARGIN = float(os.environ.get('ROI_MARGIN', 0.5))
+# Per-session tracking-mode MediaPipe FaceMesh instances for /detect_pose (LRU cap and idle TTL)
+POSE_MESH_SESSIONS = int(os.environ.get('POSE_MESH_SESSIONS', 64))
+POSE_MESH_TTL = float(os.environ.get('POSE_MESH_TTL', 300))
+
+# Dedicated multi-process inference workers fed through shared memory (0 disables)
+WORKER_POOL_SIZE = int(os.environ.get('WORKER_POOL_SIZE', 0))
+WORKER_POOL_SLOTS = int(os.environ.get('WORKER_POOL_SLOTS', 32))
+
+# Micro-batching of YOLO inference across concurrent requests
+BATCH_INFERENCE = os.environ.get('BATCH_INFERENCE', 'false').lower() == 'true'
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 15))
+BATCH_RESULT_TIMEOUT = float(os.environ.get('BATCH_RESULT_TIMEOUT', 30))
+
+# Reuse the previous analysis for unchanged frames of the same session
+MOTION_GATE = os.environ.get('MOTION_GATE', 'false').lower() == 'true'
+motion_gate = MotionGate(
+    threshold=float(os.environ.get('MOTION_GATE_THRESHOLD', 6.0)),
+    max_reuse_seconds=float(os.environ.get('MOTION_GATE_MAX_REUSE_SECONDS', 5.0))
+) if MOTION_GATE else None
+
+# Track objects across a session's frames; YOLO runs every TRACK_DETECT_INTERVAL
+# frames (or when a track is lost) and boxes are propagated in between
+OBJECT_TRACKING = os.environ.get('OBJECT_TRACKING', 'false').lower() == 'true'
+object_tracking = TrackingManager(
+    detect_interval=int(os.environ.get('TRACK_DETECT_INTERVAL', 1)),
+    iou_threshold=float(os.environ.get('TRACK_IOU_THRESHOLD', 0.3)),
+    max_misses=int(os.environ.get('TRACK_MAX_MISSES', 2))
+) if OBJECT_TRACKING else None
+
+# Turn per-frame flags of a session into violations (duration thresholds, hysteresis,
+# escalation); only state changes are reported as violation_events
+VIOLATION_AGGREGATION = os.environ.get('VIOLATION_AGGREGATION', 'true').lower() == 'true'
+violation_aggregator = ViolationAggregator() if VIOLATION_AGGREGATION else None
+
+# /save_img evidence is written by background threads through a bounded queue,
+# deduplicated by content hash and indexed in a per-session manifest
+EVIDENCE_DIR = os.environ.get('EVIDENCE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images'))
+evidence_writer = EvidenceWriter(
+    EVIDENCE_DIR,
+    max_queue=int(os.environ.get('EVIDENCE_QUEUE_SIZE', 256)),
+    num_writers=int(os.environ.get('EVIDENCE_WRITERS', 1)),
+    # dHash bit distance under which a frame counts as a near duplicate (0 = exact only)
+    near_duplicate_distance=int(os.environ.get('EVIDENCE_NEAR_DUPLICATE_DISTANCE', 0))
+)
+# Write what is still queued before the process exits
+atexit.register(evidence_writer.close)
+
+# Always attach the per-request stage breakdown as an X-Timing header
+# (clients can also ask for it per request by sending an X-Timing header)
+TIMING_HEADER = os.environ.get('TIMING_HEADER', 'false').lower() == 'true'
+
+# Load and warm up every model in the background at startup (GET /ready reports progress)
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'true').lower() == 'true'
+WARMUP_SIZES = parse_sizes(os.environ.get('WARMUP_SIZES', '640x480,1280x720'))
+WARMUP_ITERATIONS = int(os.environ.get('WARMUP_ITERATIONS', 2))
 
 
 def get_cheating_detector() -> YOLOCheatingDetector:
     """Get or create the cheating detector instance"""
     global cheating_detector
     if cheating_detector is None:
-        cheating_detector = YOLOCheatingDetector(confidence_threshold=0.4)
-        cheating_detector.initialize()
+        with _model_lock:
+            if cheating_detector is None:
+                detector = YOLOCheatingDetector(
+                    confidence_threshold=0.4,
+                    backend=DETECTOR_BACKEND,
+                    precision=MODEL_PRECISION,
+                    num_threads=INFERENCE_THREADS,
+                    restrict_classes=RESTRICT_CLASSES,
+                    parallel_stages=PARALLEL_STAGES,
+                    object_threads=OBJECT_THREADS,
+                    face_threads=FACE_THREADS,
+                    roi_mode=ROI_MODE,
+                    roi_full_frame_interval=ROI_FULL_FRAME_INTERVAL,
+                    roi_margin=ROI_MARGIN
+                )
+                detector.initialize()
+                cheating_detector = detector
     return cheating_detector
 
 
@@ -58,11 +176,182 @@ def get_pose_estimator() -> AdvancedHeadPoseEstimator:
     """Get or create the advanced pose estimator"""
     global advanced_pose_estimator
     if advanced_pose_estimator is None:
-        advanced_pose_estimator = AdvancedHeadPoseEstimator()
-        advanced_pose_estimator.initialize()
+        with _model_lock:
+            if advanced_pose_estimator is None:
+                estimator = AdvancedHeadPoseEstimator(max_sessions=POSE_MESH_SESSIONS,
+                                                      session_ttl=POSE_MESH_TTL)
+                estimator.initialize()
+                advanced_pose_estimator = estimator
     return advanced_pose_estimator
 
 
+def get_batch_scheduler() -> Optional[BatchingScheduler]:
+    """Get or create the batching scheduler (None when batching is disabled)"""
+    global batch_scheduler
+    if not BATCH_INFERENCE:
+        return None
+    if batch_scheduler is None:
+        with _model_lock:
+            if batch_scheduler is None:
+                scheduler = BatchingScheduler(
+                    get_cheating_detector(),
+                    max_batch_size=BATCH_MAX_SIZE,
+                    max_wait_ms=BATCH_MAX_WAIT_MS,
+                    result_timeout=BATCH_RESULT_TIMEOUT
+                )
+                scheduler.start()
+                QUEUE_DEPTH.set_function(lambda: scheduler.get_stats()['queue_depth'], 'batch_scheduler')
+                batch_scheduler = scheduler
+    return batch_scheduler
+
+
+def get_worker_pool() -> Optional[InferenceWorkerPool]:
+    """Get or start the inference worker pool (None when disabled)"""
+    global worker_pool
+    if WORKER_POOL_SIZE <= 0:
+        return None
+    if worker_pool is None:
+        with _model_lock:
+            if worker_pool is None:
+                pool = InferenceWorkerPool(
+                    num_workers=WORKER_POOL_SIZE,
+                    num_slots=WORKER_POOL_SLOTS,
+                    detector_kwargs={
+                        'confidence_threshold': 0.4,
+                        'backend': DETECTOR_BACKEND,
+                        'precision': MODEL_PRECISION,
+                        'num_threads': INFERENCE_THREADS,
+                        'restrict_classes': RESTRICT_CLASSES,
+                        'parallel_stages': PARALLEL_STAGES
+                    }
+                )
+                pool.start()
+                QUEUE_DEPTH.set_function(lambda: pool.get_stats()['in_flight'], 'worker_pool')
+                worker_pool = pool
+    return worker_pool
+
+
+def run_object_detection(image: np.ndarray, session_id: Optional[str] = None) -> List[Detection]:
+    """
+    Detect objects, going through the batching scheduler when enabled.
+    
+    With a session ID and ROI mode on, YOLO runs on a crop around the
+    session's last person (see YOLOCheatingDetector.detect_objects_adaptive).
+    """
+    detector = get_cheating_detector()
+    scheduler = get_batch_scheduler()
+    detect_fn = scheduler.detect if scheduler is not None else detector.detect_objects
+    if session_id and detector.roi_mode:
+        return detector.detect_objects_adaptive(image, session_id, detect_fn)
+    return detect_fn(image)
+
+
+def run_full_analysis(image: np.ndarray, timestamp: str,
+                      session_id: Optional[str] = None) -> CheatingAnalysis:
+    """
+    Run object detection, person counting and head pose on a frame.
+    
+    With a session ID and tracking enabled, detections come from the
+    session's tracker (with track IDs) instead of a fresh YOLO pass on
+    every frame, and with ROI mode YOLO only sees a crop around the
+    student. The worker pool runs its own full-frame detection.
+    """
+    pool = get_worker_pool()
+    if pool is not None:
+        analysis = pool.analyze(image, timestamp)
+        # Model stages ran in another process; record what it reported
+        for stage, elapsed_ms in (analysis.timings or {}).items():
+            observe_stage(f"worker_{stage}", elapsed_ms)
+        for detection in analysis.detections:
+            DETECTIONS_TOTAL.inc(detection['class_name'])
+        return analysis
+    
+    detector = get_cheating_detector()
+    if session_id and (object_tracking is not None or detector.roi_mode):
+        def detect(frame: np.ndarray) -> List[Detection]:
+            return run_object_detection(frame, session_id)
+        
+        if object_tracking is not None:
+            detections, _ = object_tracking.detect(session_id, image, detect)
+        else:
+            detections = detect(image)
+        return detector.analyze_frame(image, timestamp, detections=detections)
+    
+    scheduler = get_batch_scheduler()
+    if scheduler is None:
+        # Let the detector run its own stages (possibly in parallel)
+        return detector.analyze_frame(image, timestamp)
+    return detector.analyze_frame(image, timestamp, detections=scheduler.detect(image))
+
+
+def analyze_image(image: np.ndarray, timestamp: Optional[str] = None,
+                  session_id: Optional[str] = None) -> CheatingAnalysis:
+    """
+    Run the cheating analysis on a decoded frame.
+    
+    When a session ID is given and the motion gate is enabled, a frame that
+    is nearly identical to the session's last analysed frame reuses that
+    analysis instead of running the models again. The result is then fed
+    to the session's violation aggregator, whose state changes are
+    returned in violation_events.
+    """
+    timestamp = timestamp or datetime.now().isoformat()
+    with stage_timer('analysis'):
+        if motion_gate is not None and session_id:
+            analysis, _ = motion_gate.analyze(
+                session_id, image, timestamp,
+                lambda frame, ts: run_full_analysis(frame, ts, session_id))
+        else:
+            analysis = run_full_analysis(image, timestamp, session_id)
+    FRAMES_TOTAL.inc(analysis.severity)
+    
+    if violation_aggregator is not None and session_id:
+        events = violation_aggregator.update(session_id, analysis)
+        analysis = replace(analysis, violation_events=[event.to_dict() for event in events])
+    return analysis
+
+
+def build_analysis_response(analysis: CheatingAnalysis) -> Dict[str, Any]:
+    """Serialize a CheatingAnalysis into the /analyze response format"""
+    return {
+        'success': True,
+        'timestamp': analysis.timestamp,
+        'is_cheating': analysis.is_cheating,
+        'cheating_types': analysis.cheating_types,
+        'confidence_score': analysis.confidence_score,
+        'warnings': analysis.warnings,
+        'person_count': analysis.person_count,
+        'head_pose': analysis.head_pose,
+        'severity': analysis.severity,
+        'detections': analysis.detections,
+        'timings': analysis.timings,
+        'violation_events': analysis.violation_events
+    }
+
+
+def decode_image_bytes(buffer) -> np.ndarray:
+    """
+    Decode an encoded image (JPEG, PNG, WebP...) to a numpy array.
+    
+    The buffer is wrapped with np.frombuffer, so no copy of the encoded
+    bytes is made before cv2.imdecode.
+    
+    Args:
+        buffer: bytes, bytearray or memoryview holding the encoded image
+        
+    Returns:
+        BGR image as numpy array
+    """
+    nparr = np.frombuffer(buffer, np.uint8)
+    with stage_timer('imdecode'):
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    
+    if img is None:
+        raise ValueError("Failed to decode image")
+    
+    return img
+
+
 def decode_base64_image(uri: str) -> np.ndarray:
     """
     Decode base64 encoded image to numpy array.
@@ -74,29 +363,117 @@ def decode_base64_image(uri: str) -> np.ndarray:
         BGR image as numpy array
     """
     try:
-        # Handle data URI format
-        if ',' in uri:
-            encoded_data = uri.split(',')[1]
-        else:
-            encoded_data = uri
-        
-        # Decode base64
-        img_data = base64.b64decode(encoded_data)
-        nparr = np.frombuffer(img_data, np.uint8)
-        
-        # Decode image
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            raise ValueError("Failed to decode image")
-        
-        return img
+        return decode_image_bytes(decode_base64_bytes(uri))
     
     except Exception as e:
         logger.error(f"Failed to decode image: {e}")
         raise ValueError(f"Invalid image data: {e}")
 
 
+def decode_base64_bytes(uri: str) -> bytes:
+    """
+    Decode a base64 image string to its encoded bytes (no image decoding).
+    
+    Args:
+        uri: Base64 encoded image string (with or without data URI prefix)
+    """
+    # Handle data URI format
+    if ',' in uri:
+        encoded_data = uri.split(',')[1]
+    else:
+        encoded_data = uri
+    
+    # Decode base64
+    with stage_timer('base64_decode'):
+        return base64.b64decode(encoded_data)
+
+
+BINARY_IMAGE_MIMETYPES = ('application/octet-stream', 'image/jpeg', 'image/webp', 'image/png')
+
+
+def read_request_image() -> Tuple[Optional[np.ndarray], Dict[str, Any]]:
+    """
+    Read the frame and options from the current request.
+    
+    Supported bodies:
+        - application/json: {"img": "<base64 data URI>", ...options}
+        - multipart/form-data: "img" file part, options as form fields
+        - application/octet-stream (or image/jpeg, image/webp, image/png):
+          raw encoded image body, options as query parameters
+    
+    Returns:
+        Tuple of (BGR image or None if no image was sent, options dict)
+    """
+    mimetype = request.mimetype
+    
+    if mimetype == 'multipart/form-data':
+        params = request.form.to_dict()
+        upload = request.files.get('img')
+        if upload is None:
+            return None, params
+        stream = upload.stream
+        # Small uploads are held in a BytesIO; decode straight from its buffer
+        buffer = stream.getbuffer() if hasattr(stream, 'getbuffer') else stream.read()
+        try:
+            if len(buffer) == 0:
+                return None, params
+            return decode_image_bytes(buffer), params
+        except ValueError as e:
+            raise ValueError(f"Invalid image data: {e}")
+    
+    if mimetype in BINARY_IMAGE_MIMETYPES:
+        params = request.args.to_dict()
+        body = request.get_data(cache=False)
+        if not body:
+            return None, params
+        try:
+            return decode_image_bytes(body), params
+        except ValueError as e:
+            raise ValueError(f"Invalid image data: {e}")
+    
+    with stage_timer('json_parse'):
+        data = request.get_json(force=True)
+    if 'img' not in data:
+        return None, data
+    return decode_base64_image(data['img']), data
+
+
+def read_request_image_bytes() -> Tuple[Optional[bytes], Dict[str, Any]]:
+    """
+    Read the encoded (not decoded) image and options from the current request.
+    
+    Accepts the same bodies as read_request_image.
+    
+    Returns:
+        Tuple of (encoded image bytes or None, options dict)
+    """
+    mimetype = request.mimetype
+    
+    if mimetype == 'multipart/form-data':
+        upload = request.files.get('img')
+        return (upload.read() if upload is not None else None), request.form.to_dict()
+    
+    if mimetype in BINARY_IMAGE_MIMETYPES:
+        return request.get_data(cache=False) or None, request.args.to_dict()
+    
+    with stage_timer('json_parse'):
+        data = request.get_json(force=True)
+    if 'img' not in data:
+        return None, data
+    try:
+        return decode_base64_bytes(data['img']), data
+    except Exception as e:
+        raise ValueError(f"Invalid image data: {e}")
+
+
+def param_flag(params: Dict[str, Any], key: str, default: bool = False) -> bool:
+    """Read a boolean option that may arrive as JSON bool or form/query string"""
+    value = params.get(key, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
 def encode_image_base64(img: np.ndarray, format: str = 'jpg') -> str:
     """
     Encode numpy array image to base64 string.
@@ -134,44 +511,35 @@ def analyze_cheating():
     Request JSON:
         - img: Base64 encoded image
         - return_annotated: Boolean to return annotated image (default: False)
+        - session_id: Optional test session ID; enables reuse of the previous
+          analysis when the frame has not changed
+    
+    The frame may also be sent as multipart/form-data or as a raw
+    application/octet-stream body (see read_request_image).
     
     Returns:
         JSON with complete analysis results
     """
     try:
-        data = request.get_json(force=True)
+        # Decode image
+        image, data = read_request_image()
         
-        if 'img' not in data:
+        if image is None:
             return jsonify({'error': 'No image provided'}), 400
         
-        # Decode image
-        image = decode_base64_image(data['img'])
-        timestamp = datetime.now().isoformat()
-        
         # Run analysis
-        detector = get_cheating_detector()
-        analysis = detector.analyze_frame(image, timestamp)
+        analysis = analyze_image(image, session_id=data.get('session_id'))
         
         # Prepare response
-        response = {
-            'success': True,
-            'timestamp': analysis.timestamp,
-            'is_cheating': analysis.is_cheating,
-            'cheating_types': analysis.cheating_types,
-            'confidence_score': analysis.confidence_score,
-            'warnings': analysis.warnings,
-            'person_count': analysis.person_count,
-            'head_pose': analysis.head_pose,
-            'severity': analysis.severity,
-            'detections': analysis.detections
-        }
+        response = build_analysis_response(analysis)
         
         # Optionally return annotated image
-        if data.get('return_annotated', False):
-            annotated = detector.draw_detections(image, analysis)
+        if param_flag(data, 'return_annotated'):
+            annotated = get_cheating_detector().draw_detections(image, analysis)
             response['annotated_image'] = encode_image_base64(annotated)
         
-        return jsonify(response)
+        with stage_timer('serialize'):
+            return jsonify(response)
     
     except ValueError as e:
         return jsonify({'error': str(e), 'success': False}), 400
@@ -188,19 +556,19 @@ def detect_objects():
     Request JSON:
         - img: Base64 encoded image
     
+    The frame may also be sent as multipart/form-data or as a raw
+    application/octet-stream body (see read_request_image).
+    
     Returns:
         JSON with detected objects
     """
     try:
-        data = request.get_json(force=True)
+        image, _ = read_request_image()
         
-        if 'img' not in data:
+        if image is None:
             return jsonify({'error': 'No image provided'}), 400
         
-        image = decode_base64_image(data['img'])
-        
-        detector = get_cheating_detector()
-        detections = detector.detect_objects(image)
+        detections = run_object_detection(image)
         
         # Filter for cheating-related objects
         cheating_objects = [
@@ -235,24 +603,28 @@ def detect_pose():
     Request JSON:
         - img: Base64 encoded image
         - use_advanced: Boolean to use MediaPipe-based estimation (default: False)
+        - session_id: Optional test session ID; with use_advanced its frames are
+          tracked by a dedicated FaceMesh and its camera calibration (see
+          PUT /sessions/<session_id>/calibration) is used
+    
+    The frame may also be sent as multipart/form-data or as a raw
+    application/octet-stream body (see read_request_image).
     
     Returns:
         JSON with head pose information
     """
     try:
-        data = request.get_json(force=True)
+        image, data = read_request_image()
         
-        if 'img' not in data:
+        if image is None:
             return jsonify({'error': 'No image provided'}), 400
         
-        image = decode_base64_image(data['img'])
-        
-        if data.get('use_advanced', False):
+        if param_flag(data, 'use_advanced'):
             # Use MediaPipe-based advanced estimation
             pose_estimator = get_pose_estimator()
             # Convert to RGB for MediaPipe
             image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            pose = pose_estimator.estimate_pose(image_rgb)
+            pose = pose_estimator.estimate_pose(image_rgb, session_id=data.get('session_id'))
         else:
             # Use basic estimation
             detector = get_cheating_detector()
@@ -312,7 +684,7 @@ def predict_people():
         image = decode_base64_image(data['img'])
         
         detector = get_cheating_detector()
-        detections = detector.detect_objects(image)
+        detections = run_object_detection(image)
         person_count = detector.count_persons(detections)
         
         return jsonify({
@@ -417,10 +789,8 @@ def predict_pose_detailed():
             return jsonify({'error': 'No image provided'}), 400
         
         image = decode_base64_image(data['img'])
-        timestamp = datetime.now().isoformat()
-        
         detector = get_cheating_detector()
-        analysis = detector.analyze_frame(image, timestamp)
+        analysis = analyze_image(image)
         
         # Draw annotations
         annotated = detector.draw_detections(image, analysis)
@@ -457,55 +827,454 @@ def save_image():
     Save image to server (for evidence/logging purposes).
     
     Request JSON:
-        - img: Base64 encoded image
+        - img: Base64 encoded image (JPEG, PNG or WebP)
         - user: User identifier
+        - session_id: Optional test session ID (used instead of user for the directory)
+        - analysis: Optional /analyze response for this frame (severity, cheating
+          types and a summary go into the evidence manifest)
+        - severity, cheating_types: Optional overrides for the manifest
+    
+    The image may also be sent as multipart/form-data or as a raw
+    application/octet-stream body, with the other fields as form fields or
+    query parameters.
+    
+    The original image bytes are queued for a background writer and the
+    response returns at once (202) with a handle; GET /evidence/<handle>
+    reports whether the file has been written. Identical images are stored
+    once (see evidence_store.py).
     
     Returns:
-        JSON with saved file path
+        JSON with the evidence handle and the path the file is written to
     """
     try:
-        data = request.get_json(force=True)
+        data, params = read_request_image_bytes()
         
-        if 'img' not in data:
+        if not data:
             return jsonify({'error': 'No image provided'}), 400
         
-        image = decode_base64_image(data['img'])
-        user = data.get('user', 'unknown')
-        
-        # Create images directory if not exists
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        images_dir = os.path.join(base_dir, 'images')
-        os.makedirs(images_dir, exist_ok=True)
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        user_clean = user.replace('@', '_').replace('.', '_')[:50]
-        filename = f"{user_clean}_{timestamp}.jpg"
-        filepath = os.path.join(images_dir, filename)
+        extension = sniff_image_format(data)
+        if extension is None:
+            return jsonify({'error': 'Unsupported image format', 'path': ''}), 400
         
-        # Save image
-        cv2.imwrite(filepath, image)
+        session_id = str(params.get('session_id') or params.get('user') or 'unknown')
+        handle = evidence_writer.submit(session_id, data, extension,
+                                        metadata=evidence_metadata(session_id, params))
         
         return jsonify({
             'success': True,
-            'path': filepath,
-            'filename': filename
-        })
+            'status': 'queued',
+            **handle.to_dict()
+        }), 202
     
+    except EvidenceQueueFull as e:
+        logger.warning(f"Evidence rejected: {e}")
+        return jsonify({'error': str(e), 'success': False, 'path': ''}), 503, {'Retry-After': '1'}
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False, 'path': ''}), 400
     except Exception as e:
         logger.error(f"Save image error: {e}")
         return jsonify({'error': 'Failed to save image', 'path': ''}), 500
 
 
+@app.route('/evidence/<path:handle>', methods=['GET'])
+def evidence_status(handle: str):
+    """Write status (queued, written, failed) and manifest record of a /save_img handle"""
+    status = evidence_writer.status(handle)
+    if status is None:
+        return jsonify({'error': 'Unknown evidence handle'}), 404
+    return jsonify(status)
+
+
+@app.route('/sessions/<session_id>/evidence', methods=['GET'])
+def session_evidence(session_id: str):
+    """
+    A session's evidence from its manifest.
+    
+    Query parameters:
+        - start, end: Time range in seconds since the epoch
+        - type: Violation type (e.g. phone_detected)
+        - severity: Severity level
+        - limit: Most recent N records
+    """
+    try:
+        start = float(request.args['start']) if 'start' in request.args else None
+        end = float(request.args['end']) if 'end' in request.args else None
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'start, end and limit must be numbers'}), 400
+    records = evidence_writer.query(session_id, start=start, end=end, cheating_type=request.args.get('type'),
+                                    severity=request.args.get('severity'), limit=limit)
+    return jsonify({
+        'session_id': session_id,
+        'count': len(records),
+        'evidence': [record.to_dict() for record in records]
+    })
+
+
+def evidence_metadata(session_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Severity, violation types and analysis summary recorded in the evidence manifest.
+    
+    Raises:
+        ValueError: If analysis, severity or cheating_types have the wrong type
+    """
+    analysis = params.get('analysis')
+    if analysis is None:
+        analysis = {}
+    elif not isinstance(analysis, dict):
+        raise ValueError("analysis must be an object")
+    
+    cheating_types = params.get('cheating_types', analysis.get('cheating_types')) or []
+    if isinstance(cheating_types, str):
+        cheating_types = [t.strip() for t in cheating_types.split(',') if t.strip()]
+    if not isinstance(cheating_types, list) or not all(isinstance(t, str) for t in cheating_types):
+        raise ValueError("cheating_types must be a list of strings or a comma-separated string")
+    
+    severity = params.get('severity', analysis.get('severity'))
+    if severity is not None and severity not in SEVERITY_LEVELS:
+        raise ValueError(f"severity must be one of {list(SEVERITY_LEVELS)}")
+
+    if not cheating_types and severity is None and violation_aggregator is not None:
+        # Fall back to the violations currently open for the session
+        summary = violation_aggregator.get_session(session_id)
+        if summary is not None and summary['active']:
+            cheating_types = [v['cheating_type'] for v in summary['active']]
+            severity = max((v['severity'] for v in summary['active']), key=SEVERITY_LEVELS.index)
+
+    summary = {key: analysis[key] for key in ('is_cheating', 'confidence_score', 'person_count', 'warnings')
+               if key in analysis} or None
+    return {'severity': severity, 'cheating_types': cheating_types, 'summary': summary}
+
+
+def process_stream_frame(session_id: str, frame: bytes) -> Dict[str, Any]:
+    """Analyze one encoded frame pushed over a streaming channel"""
+    return build_analysis_response(analyze_image(decode_image_bytes(frame), session_id=session_id))
+
+
+def end_session(session_id: str) -> List[ViolationEvent]:
+    """
+    Drop a finished session's per-session state.
+    
+    Ends its active violations (returned as 'ended' events), forgets its
+    camera calibration and frees its FaceMesh tracker. Called when a stream
+    is closed over HTTP, by a "close" message or by its last socket dropping.
+    """
+    events = violation_aggregator.close(session_id) if violation_aggregator is not None else []
+    camera_intrinsics.clear_calibration(session_id)
+    if advanced_pose_estimator is not None:
+        advanced_pose_estimator.release_session(session_id)
+    return events
+
+
+stream_manager = StreamSessionManager(
+    process_frame=process_stream_frame,
+    idle_timeout=float(os.environ.get('STREAM_IDLE_TIMEOUT', 120))
+)
+
+
+if sock is not None:
+    @sock.route('/stream/<session_id>')
+    def stream_socket(ws, session_id: str):
+        """
+        WebSocket streaming channel for one test session.
+        
+        The client sends binary frames (JPEG/WebP) and receives one JSON
+        message per analysed frame, in the /analyze response format plus
+        session_id and frame_id. Frames that arrive while the analyzer is
+        busy replace the pending one, so results always describe the newest
+        frame. Sending the text message "close" ends the session; so does
+        the last socket of the session disconnecting.
+        """
+        session = stream_manager.open(session_id, connection=True)
+        stop = threading.Event()
+        ended = False
+        
+        def send_results():
+            while not stop.is_set() and not session.closed:
+                result = session.next_result(timeout=1.0)
+                if result is not None:
+                    try:
+                        ws.send(json.dumps(result))
+                    except Exception:
+                        break
+        
+        sender = threading.Thread(target=send_results, name=f"stream-send-{session_id}", daemon=True)
+        sender.start()
+        
+        try:
+            while True:
+                message = ws.receive()
+                if message is None:
+                    break
+                if isinstance(message, str):
+                    if message.strip().lower() == 'close':
+                        stream_manager.close(session_id)
+                        events = end_session(session_id)
+                        ended = True
+                        ws.send(json.dumps({'session_id': session_id, 'closed': True,
+                                            'violation_events': [event.to_dict() for event in events]}))
+                        break
+                    continue
+                try:
+                    session.push_frame(message)
+                except RuntimeError:
+                    # Closed underneath us (DELETE /stream/<id>); tell the client and stop
+                    ws.send(json.dumps({'session_id': session_id, 'closed': True}))
+                    break
+        finally:
+            stop.set()
+            sender.join(timeout=2.0)
+            # Release the session's worker now instead of waiting for the idle reaper
+            if stream_manager.release(session_id, session) and not ended:
+                end_session(session_id)
+
+
+@app.route('/stream/<session_id>/frame', methods=['POST'])
+def stream_push_frame(session_id: str):
+    """
+    Push a frame into a session's stream (SSE transport).
+    
+    Body: raw encoded image (application/octet-stream, image/jpeg, image/webp)
+    or multipart/form-data with an "img" file part. Results are delivered on
+    GET /stream/<session_id>/events.
+    """
+    try:
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('img')
+            frame = upload.read() if upload is not None else b''
+        else:
+            frame = request.get_data(cache=False)
+        
+        if not frame:
+            return jsonify({'error': 'No image provided', 'success': False}), 400
+        
+        session = stream_manager.open(session_id)
+        frame_id = session.push_frame(frame)
+        
+        return jsonify({
+            'success': True,
+            'frame_id': frame_id,
+            'frames_dropped': session.frames_dropped
+        }), 202
+    
+    except Exception as e:
+        logger.error(f"Stream frame error: {e}")
+        return jsonify({'error': 'Failed to queue frame', 'success': False}), 500
+
+
+@app.route('/stream/<session_id>/events', methods=['GET'])
+def stream_events(session_id: str):
+    """Server-sent events feed of analysis results for a session"""
+    session = stream_manager.open(session_id)
+    
+    def event_stream():
+        while not session.closed:
+            result = session.next_result(timeout=15.0)
+            if result is None:
+                # Keep-alive comment so proxies do not close an idle stream
+                yield ': keep-alive\n\n'
+                continue
+            yield f"data: {json.dumps(result)}\n\n"
+    
+    return Response(event_stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/stream/<session_id>', methods=['DELETE'])
+def stream_close(session_id: str):
+    """Close a streaming session, ending its active violations"""
+    closed = stream_manager.close(session_id)
+    events = end_session(session_id)
+    return jsonify({
+        'success': True,
+        'closed': closed,
+        'violation_events': [event.to_dict() for event in events]
+    })
+
+
+@app.route('/sessions/<session_id>/violations', methods=['GET'])
+def session_violations(session_id: str):
+    """Active violations and recent violation events of a session"""
+    if violation_aggregator is None:
+        return jsonify({'error': 'Violation aggregation is disabled'}), 404
+    summary = violation_aggregator.get_session(session_id)
+    if summary is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    return jsonify(summary)
+
+
+@app.route('/sessions/<session_id>/calibration', methods=['PUT'])
+def set_session_calibration(session_id: str):
+    """
+    Register the calibrated webcam intrinsics of a session.
+    
+    Request JSON:
+        - camera_matrix: 3x3 camera matrix
+        - width, height: Frame size the calibration was made at
+        - dist_coeffs: Optional distortion coefficients (OpenCV order)
+    
+    Frames of other sizes use the calibration rescaled to their resolution.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    if 'camera_matrix' not in data or 'width' not in data or 'height' not in data:
+        return jsonify({'error': 'camera_matrix, width and height are required', 'success': False}), 400
+    try:
+        intrinsics = camera_intrinsics.set_calibration(
+            session_id, data['camera_matrix'], int(data['width']), int(data['height']),
+            data.get('dist_coeffs'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    return jsonify({'success': True, 'session_id': session_id, 'calibration': intrinsics.to_dict()})
+
+
+@app.route('/sessions/<session_id>/calibration', methods=['GET'])
+def get_session_calibration(session_id: str):
+    """A session's registered camera calibration"""
+    intrinsics = camera_intrinsics.get_calibration(session_id)
+    if intrinsics is None:
+        return jsonify({'error': 'No calibration for this session'}), 404
+    return jsonify({'session_id': session_id, 'calibration': intrinsics.to_dict()})
+
+
+@app.route('/sessions/<session_id>/calibration', methods=['DELETE'])
+def delete_session_calibration(session_id: str):
+    """Forget a session's camera calibration"""
+    return jsonify({'success': True, 'removed': camera_intrinsics.clear_calibration(session_id)})
+
+
+def _load_detector() -> YOLOCheatingDetector:
+    detector = get_cheating_detector()
+    if detector.model is None:
+        raise RuntimeError("YOLO model failed to load")
+    get_batch_scheduler()
+    return detector
+
+
+def _load_worker_pool() -> InferenceWorkerPool:
+    pool = get_worker_pool()
+    if not pool.wait_ready(timeout=600):
+        failed = pool.failed_workers
+        if failed:
+            raise RuntimeError(f"Inference workers {failed} failed to load their models")
+        raise RuntimeError("Inference workers did not become ready")
+    return pool
+
+
+def _load_pose_estimator() -> AdvancedHeadPoseEstimator:
+    estimator = get_pose_estimator()
+    if estimator.face_mesh is None:
+        raise RuntimeError("MediaPipe Face Mesh not available")
+    return estimator
+
+
+def build_model_warmup() -> ModelWarmup:
+    """Warm-up plan for the models this configuration serves requests with"""
+    steps = [WarmupStep('detector', _load_detector,
+                        lambda detector, frame: detector.analyze_frame(frame),
+                        iterations=WARMUP_ITERATIONS)]
+    if WORKER_POOL_SIZE > 0:
+        # Each frame goes to one worker; send enough to reach all of them
+        steps.append(WarmupStep('worker_pool', _load_worker_pool,
+                                lambda pool, frame: [f.result(timeout=120) for f in
+                                                     [pool.submit(frame) for _ in range(pool.num_workers)]],
+                                iterations=WARMUP_ITERATIONS))
+    # MediaPipe is an optional dependency and only serves /detect_pose
+    steps.append(WarmupStep('pose_estimator', _load_pose_estimator,
+                            lambda estimator, frame: estimator.estimate_pose(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)),
+                            required=False, iterations=WARMUP_ITERATIONS))
+    return ModelWarmup(steps, sizes=WARMUP_SIZES)
+
+
+model_warmup = build_model_warmup()
+
+
+def start_model_warmup():
+    """
+    Start the background warm-up if WARMUP_ON_START is set (idempotent).
+    
+    Called from the __main__ block, gunicorn's post_worker_init hook
+    (gunicorn.conf.py) and, for any other launch (flask run, other WSGI
+    servers), the first /ready or /health probe. Never at import:
+    worker_pool's spawned processes re-import the main module as
+    __mp_main__ and must not load the models a second time, and tools
+    importing app (benchmark.py) get no warm-up.
+    """
+    if WARMUP_ON_START:
+        model_warmup.start()
+
+
+@app.before_request
+def begin_request_metrics():
+    g.request_started = time.perf_counter()
+    start_request_timings()
+
+
+@app.after_request
+def finish_request_metrics(response: Response) -> Response:
+    """Record request latency and optionally attach the X-Timing stage breakdown"""
+    timings = end_request_timings()
+    started = g.get('request_started')
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        REQUEST_SECONDS.observe(elapsed, request.endpoint or 'unknown')
+        if timings is not None and (TIMING_HEADER or 'X-Timing' in request.headers):
+            timings['request'] = elapsed * 1000
+            response.headers['X-Timing'] = format_timing_header(timings)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus metrics (text exposition format)"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness probe.
+    
+    Returns 200 once every required model is loaded and warmed up, 503
+    before that, so load balancers hold traffic back during cold starts.
+    With the worker pool enabled, every worker must also be serving (the
+    response lists failed or restarting workers).
+    """
+    start_model_warmup()
+    status = model_warmup.get_status()
+    if worker_pool is not None:
+        # Workers can fail or be restarting after warm-up finished
+        status['worker_pool'] = worker_pool.get_stats()
+        status['ready'] = status['ready'] and status['worker_pool']['ready']
+    return jsonify(status), 200 if status['ready'] else 503
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    detector_status = "initialized" if cheating_detector is not None else "not_initialized"
+    """Health check endpoint (liveness; see /ready for model readiness)"""
+    start_model_warmup()
+    if cheating_detector is not None and cheating_detector.model is not None:
+        detector_status = "initialized"
+    elif model_warmup.get_status()['started'] and not model_warmup.finished:
+        detector_status = "loading"
+    else:
+        detector_status = "not_initialized"
     
     return jsonify({
         'status': 'healthy',
+        'ready': model_warmup.ready,
         'timestamp': datetime.now().isoformat(),
         'detector_status': detector_status,
+        'warmup': model_warmup.get_status(),
+        'batch_scheduler': batch_scheduler.get_stats() if batch_scheduler is not None else None,
+        'worker_pool': worker_pool.get_stats() if worker_pool is not None else None,
+        'streams': stream_manager.get_stats(),
+        'motion_gate': motion_gate.get_stats() if motion_gate is not None else None,
+        'object_tracking': object_tracking.get_stats() if object_tracking is not None else None,
+        'roi': cheating_detector.get_roi_stats() if cheating_detector is not None and ROI_MODE else None,
+        'violations': violation_aggregator.get_stats() if violation_aggregator is not None else None,
+        'camera_intrinsics': camera_intrinsics.get_stats(),
+        'pose_estimator': advanced_pose_estimator.get_stats() if advanced_pose_estimator is not None else None,
+        'evidence': evidence_writer.get_stats(),
         'model': 'yolov8',
         'version': '2.0.0',
         'endpoints': [
@@ -515,7 +1284,17 @@ def health_check():
             'POST /predict_people - Person count (legacy)',
             'POST /predict_pose - Pose detection (legacy)',
             'POST /predict_pose_detailed - Detailed pose with image',
-            'POST /save_img - Save image',
+            'POST /save_img - Save evidence image (written asynchronously)',
+            'GET /evidence/<handle> - Evidence write status',
+            'GET /sessions/<session_id>/evidence - Evidence by time range or violation type',
+            'WS /stream/<session_id> - Streaming analysis (binary frames in, JSON results out)',
+            'POST /stream/<session_id>/frame - Push frame to a stream (SSE transport)',
+            'GET /stream/<session_id>/events - Streamed analysis results (SSE)',
+            'DELETE /stream/<session_id> - Close a stream',
+            'GET /sessions/<session_id>/violations - Active violations and recent events',
+            'PUT /sessions/<session_id>/calibration - Register camera intrinsics for head pose',
+            'GET /metrics - Prometheus metrics',
+            'GET /ready - Readiness probe (models loaded and warmed up)',
             'GET /health - Health check'
         ]
     })
@@ -543,16 +1322,12 @@ def server_error(e):
 
 
 if __name__ == '__main__':
-    # Pre-initialize detector on startup
     logger.info("Starting Pariksha Guardian AI Proctoring Server...")
     
-    # Initialize detector
-    try:
-        detector = get_cheating_detector()
-        logger.info("YOLO detector initialized successfully")
-    except Exception as e:
-        logger.warning(f"Failed to pre-initialize detector: {e}")
-        logger.info("Detector will be initialized on first request")
+    # Models load and warm up in the background; GET /ready turns 200 once they are hot
+    start_model_warmup()
+    if not WARMUP_ON_START:
+        logger.info("Startup warm-up disabled, models will be loaded on first request")
     
     # Run server
     port = int(os.environ.get('PORT', 8080))
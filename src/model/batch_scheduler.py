@@ -0,0 +1,239 @@
+"""
+Micro-batching inference scheduler for YOLO object detection.
+
+Concurrent requests submit single frames; a background worker groups them
+into one batched ultralytics call, bounded by a maximum batch size and a
+latency deadline, and hands each result back to its waiting request.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Any
+import logging
+
+import numpy as np
+
+from cheating_detector import YOLOCheatingDetector, Detection
+from metrics import add_request_timing
+
+logger = logging.getLogger(__name__)
+
+
+class BatchFuture(Future):
+    """Future for one submitted frame, carrying the timings of the batch it ran in"""
+
+    def __init__(self):
+        super().__init__()
+        # 'batch_wait' (this frame's queue wait) and 'yolo' (the whole batch's
+        # inference time), in milliseconds; set before the result
+        self.timings: Dict[str, float] = {}
+
+
+@dataclass
+class _PendingFrame:
+    """A frame waiting in the scheduler queue"""
+    image: np.ndarray
+    future: BatchFuture
+    enqueued_at: float
+
+
+@dataclass
+class SchedulerStats:
+    """Running batch size and queue-wait metrics"""
+    batches: int = 0
+    frames: int = 0
+    rejected: int = 0
+    batch_sizes: Dict[int, int] = field(default_factory=dict)
+    total_wait_ms: float = 0.0
+    max_wait_ms: float = 0.0
+    total_inference_ms: float = 0.0
+    recent_waits_ms: Deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+
+
+class BatchingScheduler:
+    """
+    Collects frames from concurrent requests and runs them through
+    `YOLOCheatingDetector.detect_objects_batch` in groups.
+    """
+
+    def __init__(self, detector: YOLOCheatingDetector, max_batch_size: int = 8,
+                 max_wait_ms: float = 15.0, max_queue_size: int = 256,
+                 result_timeout: Optional[float] = 30.0):
+        """
+        Initialize the scheduler.
+
+        Args:
+            detector: Initialized cheating detector used for inference
+            max_batch_size: Largest number of frames sent in one model call
+            max_wait_ms: Longest time the first frame of a batch waits for company
+            max_queue_size: Frames allowed to wait before submissions are rejected
+            result_timeout: Default seconds detect() waits for a frame's result (None waits forever)
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.result_timeout = result_timeout
+        self._queue: "queue.Queue[Optional[_PendingFrame]]" = queue.Queue(maxsize=max_queue_size)
+        self._stats = SchedulerStats()
+        self._stats_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._running = False
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the background batching worker"""
+        with self._start_lock:
+            if self._running:
+                return
+            self._running = True
+            self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+            self._worker.start()
+        logger.info(f"Batching scheduler started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait={self.max_wait * 1000:.1f}ms)")
+
+    def stop(self):
+        """Stop the worker after the frames already queued are processed"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def submit(self, image: np.ndarray) -> BatchFuture:
+        """
+        Queue a frame for detection.
+
+        Args:
+            image: BGR image (OpenCV format)
+
+        Returns:
+            Future resolving to the list of Detection objects for the frame
+        """
+        if not self._running:
+            self.start()
+
+        future = BatchFuture()
+        try:
+            self._queue.put_nowait(_PendingFrame(image, future, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats.rejected += 1
+            raise RuntimeError("Inference queue is full")
+        return future
+
+    def detect(self, image: np.ndarray, timeout: Optional[float] = None) -> List[Detection]:
+        """
+        Submit a frame and block until its detections are ready.
+
+        The batch's timings are added to the calling request's timings, so the
+        X-Timing header shows yolo (and batch_wait) as it does without batching.
+
+        Args:
+            image: BGR image (OpenCV format)
+            timeout: Seconds to wait (default: result_timeout)
+
+        Raises:
+            concurrent.futures.TimeoutError: If no result arrives in time
+        """
+        future = self.submit(image)
+        detections = future.result(timeout=self.result_timeout if timeout is None else timeout)
+        for stage, elapsed_ms in future.timings.items():
+            add_request_timing(stage, elapsed_ms)
+        return detections
+
+    def _collect_batch(self) -> Optional[List[_PendingFrame]]:
+        """Block for the first frame, then gather more until full or the deadline passes"""
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the sentinel so the run loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        """Worker loop"""
+        while True:
+            batch = []
+            try:
+                batch = self._collect_batch()
+                if batch is None:
+                    break
+                self._process(batch)
+            except Exception as e:
+                logger.error(f"Batched inference error: {e}")
+            finally:
+                # Never leave a caller waiting on a frame the batch did not answer
+                for item in batch or []:
+                    if not item.future.done():
+                        item.future.set_exception(RuntimeError("Batched inference returned no result for the frame"))
+
+    def _process(self, batch: List[_PendingFrame]):
+        started = time.perf_counter()
+        waits = [(started - item.enqueued_at) * 1000 for item in batch]
+
+        try:
+            results = self.detector.detect_objects_batch([item.image for item in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"detect_objects_batch returned {len(results)} results "
+                                   f"for {len(batch)} frames")
+            inference_ms = (time.perf_counter() - started) * 1000
+            for item, wait_ms, detections in zip(batch, waits, results):
+                item.future.timings.update(batch_wait=wait_ms, yolo=inference_ms)
+                item.future.set_result(detections)
+        except Exception as e:
+            logger.error(f"Batched inference error: {e}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+
+        self._record(len(batch), waits, (time.perf_counter() - started) * 1000)
+
+    def _record(self, batch_size: int, waits_ms: List[float], inference_ms: float):
+        with self._stats_lock:
+            stats = self._stats
+            stats.batches += 1
+            stats.frames += batch_size
+            stats.batch_sizes[batch_size] = stats.batch_sizes.get(batch_size, 0) + 1
+            stats.total_wait_ms += sum(waits_ms)
+            stats.max_wait_ms = max(stats.max_wait_ms, max(waits_ms))
+            stats.total_inference_ms += inference_ms
+            stats.recent_waits_ms.extend(waits_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return a snapshot of batch size and queue-wait metrics"""
+        with self._stats_lock:
+            stats = self._stats
+            recent = np.array(stats.recent_waits_ms) if stats.recent_waits_ms else None
+            return {
+                'running': self._running,
+                'queue_depth': self._queue.qsize(),
+                'batches': stats.batches,
+                'frames': stats.frames,
+                'rejected': stats.rejected,
+                'mean_batch_size': round(stats.frames / stats.batches, 2) if stats.batches else 0.0,
+                'batch_size_histogram': dict(sorted(stats.batch_sizes.items())),
+                'mean_queue_wait_ms': round(stats.total_wait_ms / stats.frames, 3) if stats.frames else 0.0,
+                'p95_queue_wait_ms': round(float(np.percentile(recent, 95)), 3) if recent is not None else 0.0,
+                'max_queue_wait_ms': round(stats.max_wait_ms, 3),
+                'mean_batch_inference_ms': round(stats.total_inference_ms / stats.batches, 3) if stats.batches else 0.0,
+            }
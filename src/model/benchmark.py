@@ -0,0 +1,343 @@
+"""
+Reproducible benchmark suite for the proctoring pipeline.
+
+Times each pipeline stage and the full /analyze request path (through
+Flask's test client) on the sample frames in images/ plus synthetic
+resolutions, and reports p50/p95/p99 latency, throughput and peak RSS.
+Results are written as JSON and can be compared against a saved baseline.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.15   # exit 1 on regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(BASE_DIR, 'images')
+
+# Synthetic 16:9 frames derived from a sample image
+SYNTHETIC_RESOLUTIONS = {
+    '320p': (568, 320),
+    '480p': (854, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+}
+
+ALL_STAGES = (
+    'decode_base64_image', 'detect_objects', 'detect_face', 'estimate_head_pose',
+    'advanced_estimate_pose', 'detect_marks', 'draw_detections', 'encode_image_base64',
+    'analyze_request',
+)
+
+
+class StageSkipped(Exception):
+    """Raised by a stage setup when its dependencies are unavailable"""
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def load_inputs(resolutions: List[str]) -> Dict[str, np.ndarray]:
+    """Sample frames from images/ plus synthetic resolutions"""
+    inputs = {}
+    for name in sorted(os.listdir(IMAGES_DIR)):
+        if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+            image = cv2.imread(os.path.join(IMAGES_DIR, name))
+            if image is not None:
+                inputs[name] = image
+
+    if not inputs:
+        raise RuntimeError(f"No sample images found in {IMAGES_DIR}")
+
+    source = inputs.get('forward.jpg', next(iter(inputs.values())))
+    for label in resolutions:
+        inputs[label] = cv2.resize(source, SYNTHETIC_RESOLUTIONS[label], interpolation=cv2.INTER_LINEAR)
+    return inputs
+
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int) -> Dict[str, float]:
+    """Run fn repeatedly and summarise its latency distribution"""
+    for _ in range(warmup):
+        fn()
+
+    samples = np.empty(iterations, dtype=np.float64)
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples[i] = (time.perf_counter() - t0) * 1000
+    total = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'iterations': iterations,
+        'mean_ms': round(float(samples.mean()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'throughput_per_s': round(iterations / total, 2) if total > 0 else 0.0,
+    }
+
+
+class PipelineBenchmark:
+    """Builds a callable per (stage, input) pair and measures it"""
+
+    def __init__(self, model_path: Optional[str] = None, backend: str = 'torch',
+                 num_threads: Optional[int] = None):
+        self.model_path = model_path
+        self.backend = backend
+        self.num_threads = num_threads
+        self._detector = None
+        self._pose_estimator = None
+        self._mark_detector = None
+        self._app = None
+
+    @property
+    def detector(self):
+        if self._detector is None:
+            from cheating_detector import YOLOCheatingDetector
+            self._detector = YOLOCheatingDetector(self.model_path, confidence_threshold=0.4,
+                                                  backend=self.backend, num_threads=self.num_threads)
+            if not self._detector.initialize():
+                raise StageSkipped("YOLO detector could not be initialized")
+        return self._detector
+
+    @property
+    def app_module(self):
+        if self._app is None:
+            import app as app_module
+            app_module.cheating_detector = self.detector
+            self._app = app_module
+        return self._app
+
+    def build(self, stage: str, image: np.ndarray) -> Callable[[], Any]:
+        """Return a zero-argument callable that runs one iteration of the stage"""
+        if stage == 'decode_base64_image':
+            from app import decode_base64_image, encode_image_base64
+            uri = encode_image_base64(image)
+            return lambda: decode_base64_image(uri)
+
+        if stage == 'encode_image_base64':
+            from app import encode_image_base64
+            return lambda: encode_image_base64(image)
+
+        if stage == 'detect_objects':
+            detector = self.detector
+            return lambda: detector.detect_objects(image)
+
+        if stage == 'detect_face':
+            detector = self.detector
+            if detector.face_detector is None:
+                raise StageSkipped("face detector model files not found")
+            return lambda: detector.detect_face(image)
+
+        if stage == 'estimate_head_pose':
+            detector = self.detector
+            if detector.face_detector is None:
+                raise StageSkipped("face detector model files not found")
+            return lambda: detector.estimate_head_pose(image)
+
+        if stage == 'advanced_estimate_pose':
+            if self._pose_estimator is None:
+                from cheating_detector import AdvancedHeadPoseEstimator
+                self._pose_estimator = AdvancedHeadPoseEstimator()
+                if not self._pose_estimator.initialize():
+                    raise StageSkipped("MediaPipe not available")
+            estimator = self._pose_estimator
+            rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            return lambda: estimator.estimate_pose(rgb)
+
+        if stage == 'detect_marks':
+            if self._mark_detector is None:
+                try:
+                    cwd = os.getcwd()
+                    os.chdir(BASE_DIR)  # MarkDetector loads assets by relative path
+                    try:
+                        from mark_detector import MarkDetector
+                        self._mark_detector = MarkDetector()
+                    finally:
+                        os.chdir(cwd)
+                except Exception as e:
+                    raise StageSkipped(f"MarkDetector unavailable: {e}")
+            mark_detector = self._mark_detector
+            face = cv2.resize(image, (128, 128))
+            return lambda: mark_detector.detect_marks(face)
+
+        if stage == 'draw_detections':
+            detector = self.detector
+            analysis = detector.analyze_frame(image, datetime.now().isoformat())
+            return lambda: detector.draw_detections(image, analysis)
+
+        if stage == 'analyze_request':
+            app_module = self.app_module
+            client = app_module.app.test_client()
+            payload = {'img': app_module.encode_image_base64(image)}
+
+            def request_once():
+                response = client.post('/analyze', json=payload)
+                if response.status_code != 200:
+                    raise RuntimeError(f"/analyze returned {response.status_code}")
+            return request_once
+
+        raise ValueError(f"Unknown stage: {stage}")
+
+
+def run_benchmarks(stages: List[str], inputs: Dict[str, np.ndarray], iterations: int,
+                   warmup: int, backend: str, num_threads: Optional[int],
+                   model_path: Optional[str] = None) -> Dict[str, Any]:
+    """Run every (stage, input) combination and collect results"""
+    bench = PipelineBenchmark(model_path=model_path, backend=backend, num_threads=num_threads)
+    results = []
+    skipped = {}
+
+    for stage in stages:
+        for label, image in inputs.items():
+            try:
+                fn = bench.build(stage, image)
+                stats = measure(fn, iterations, warmup)
+            except StageSkipped as e:
+                skipped[stage] = str(e)
+                break
+            stats.update({
+                'stage': stage,
+                'input': label,
+                'resolution': f"{image.shape[1]}x{image.shape[0]}",
+                'peak_rss_mb': round(peak_rss_mb(), 1),
+            })
+            results.append(stats)
+            print(f"{stage:24s} {label:16s} p50={stats['p50_ms']:9.3f}ms "
+                  f"p95={stats['p95_ms']:9.3f}ms p99={stats['p99_ms']:9.3f}ms "
+                  f"{stats['throughput_per_s']:9.1f}/s")
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'model': model_path or 'yolov8n.pt',
+            'backend': backend,
+            'num_threads': num_threads,
+            'iterations': iterations,
+            'warmup': warmup,
+        },
+        'results': results,
+        'skipped': skipped,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def compare_to_baseline(current: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Compare p50/p95 latency against a baseline run.
+
+    Returns:
+        (comparisons, regressions) where a regression is any metric slower
+        than the baseline by more than `tolerance` (a fraction)
+    """
+    base_index = {(r['stage'], r['input']): r for r in baseline.get('results', [])}
+    comparisons, regressions = [], []
+
+    for result in current['results']:
+        base = base_index.get((result['stage'], result['input']))
+        if base is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if base[metric] <= 0:
+                continue
+            ratio = result[metric] / base[metric]
+            entry = {
+                'stage': result['stage'],
+                'input': result['input'],
+                'metric': metric,
+                'baseline': base[metric],
+                'current': result[metric],
+                'ratio': round(ratio, 3),
+            }
+            comparisons.append(entry)
+            if ratio > 1 + tolerance:
+                regressions.append(entry)
+
+    return comparisons, regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the proctoring pipeline")
+    parser.add_argument('--stages', nargs='+', choices=ALL_STAGES, default=list(ALL_STAGES))
+    parser.add_argument('--resolutions', nargs='*', choices=list(SYNTHETIC_RESOLUTIONS),
+                        default=list(SYNTHETIC_RESOLUTIONS))
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--model', default=None, help="YOLO weights (default: yolov8n.pt)")
+    parser.add_argument('--backend', default='torch', choices=('torch', 'onnx', 'openvino'))
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Inference threads (also applied to cv2.setNumThreads)")
+    parser.add_argument('--output', help="Write results JSON to this path")
+    parser.add_argument('--baseline', help="Compare against a previously saved results JSON")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="Allowed slowdown vs baseline as a fraction (default 0.15)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    inputs = load_inputs(args.resolutions)
+    report = run_benchmarks(args.stages, inputs, args.iterations, args.warmup,
+                            args.backend, args.threads, args.model)
+
+    for stage, reason in report['skipped'].items():
+        print(f"skipped {stage}: {reason}")
+    print(f"peak RSS: {report['peak_rss_mb']} MB")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparisons, regressions = compare_to_baseline(report, baseline, args.tolerance)
+        report['comparison'] = {
+            'baseline': args.baseline,
+            'tolerance': args.tolerance,
+            'entries': comparisons,
+            'regressions': regressions,
+        }
+        for entry in regressions:
+            print(f"REGRESSION {entry['stage']} {entry['input']} {entry['metric']}: "
+                  f"{entry['baseline']:.3f}ms -> {entry['current']:.3f}ms (x{entry['ratio']})")
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Shared camera intrinsics for the head pose estimators.
+
+solvePnP needs a camera matrix matching the frame it is given. Without a
+calibration the usual approximation is used (focal length = frame width,
+principal point at the centre, no distortion), built once per resolution and
+cached instead of on every frame. Frame sizes come from clients, so both the
+shared and the per-session caches are small LRUs. Clients that calibrated their webcam can
+register the real intrinsics for their session; they are rescaled when the
+session's frames arrive at a different resolution than the calibration.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from session_state import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class CameraIntrinsics:
+    """Read-only camera matrix and distortion coefficients for one resolution"""
+    camera_matrix: np.ndarray      # 3x3 float64
+    dist_coeffs: np.ndarray        # (N, 1) float64
+    size: Tuple[int, int]          # width, height
+    calibrated: bool = False
+
+    @classmethod
+    def approximate(cls, width: int, height: int) -> 'CameraIntrinsics':
+        """Focal length = frame width, principal point at the centre, no distortion"""
+        camera_matrix = np.array([
+            [width, 0, width / 2],
+            [0, width, height / 2],
+            [0, 0, 1]
+        ], dtype=np.float64)
+        return cls(_frozen(camera_matrix), _frozen(np.zeros((4, 1))), (width, height))
+
+    def scaled(self, width: int, height: int) -> 'CameraIntrinsics':
+        """The same camera at another resolution"""
+        sx, sy = width / self.size[0], height / self.size[1]
+        camera_matrix = self.camera_matrix.copy()
+        camera_matrix[0, :] *= sx
+        camera_matrix[1, :] *= sy
+        return CameraIntrinsics(_frozen(camera_matrix), self.dist_coeffs, (width, height), self.calibrated)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'camera_matrix': self.camera_matrix.tolist(),
+            'dist_coeffs': self.dist_coeffs.ravel().tolist(),
+            'width': self.size[0],
+            'height': self.size[1],
+            'calibrated': self.calibrated,
+        }
+
+
+def _size_key(size: Tuple[int, int]) -> str:
+    return f"{size[0]}x{size[1]}"
+
+
+@dataclass
+class _SessionCalibration:
+    intrinsics: CameraIntrinsics
+    by_size: "OrderedDict[Tuple[int, int], CameraIntrinsics]" = field(default_factory=OrderedDict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class IntrinsicsRegistry:
+    """Camera intrinsics cached per resolution, with optional per-session calibration"""
+
+    def __init__(self, max_sessions: int = 1000, session_ttl: Optional[float] = 900.0,
+                 max_resolutions: int = 16, max_session_resolutions: int = 4):
+        """
+        Initialize the registry.
+
+        Args:
+            max_sessions: Calibrated sessions kept before least recently used ones are evicted
+            session_ttl: Idle seconds after which a session's calibration is dropped
+            max_resolutions: Approximate camera matrices cached (least recently used evicted)
+            max_session_resolutions: Rescaled calibrations cached per session
+        """
+        self.max_session_resolutions = max(1, max_session_resolutions)
+        self._by_size: SessionStore[CameraIntrinsics] = SessionStore(max_resolutions, ttl_seconds=None)
+        self._calibrations: SessionStore[_SessionCalibration] = SessionStore(max_sessions, session_ttl)
+
+    def get(self, width: int, height: int, session_id: Optional[str] = None) -> CameraIntrinsics:
+        """
+        Intrinsics for a frame.
+
+        Args:
+            width: Frame width in pixels
+            height: Frame height in pixels
+            session_id: Optional session whose calibration should be used
+
+        Returns:
+            The session's calibration scaled to the frame, or the cached approximation
+        """
+        size = (int(width), int(height))
+        if session_id is not None:
+            calibration = self._calibrations.get(session_id)
+            if calibration is not None:
+                with calibration.lock:
+                    intrinsics = calibration.by_size.get(size)
+                    if intrinsics is None:
+                        intrinsics = calibration.intrinsics.scaled(*size)
+                        calibration.by_size[size] = intrinsics
+                        if len(calibration.by_size) > self.max_session_resolutions:
+                            calibration.by_size.popitem(last=False)
+                    else:
+                        calibration.by_size.move_to_end(size)
+                return intrinsics
+
+        return self._by_size.get_or_create(_size_key(size), lambda: CameraIntrinsics.approximate(*size))
+
+    def set_calibration(self, session_id: str, camera_matrix: Sequence[Sequence[float]],
+                        width: int, height: int,
+                        dist_coeffs: Optional[Sequence[float]] = None) -> CameraIntrinsics:
+        """
+        Register a session's calibrated camera.
+
+        Args:
+            session_id: Test session identifier
+            camera_matrix: 3x3 camera matrix from calibration
+            width: Frame width the calibration was made at
+            height: Frame height the calibration was made at
+            dist_coeffs: Optional distortion coefficients (OpenCV order)
+
+        Raises:
+            ValueError: If the matrix or resolution is invalid
+        """
+        matrix = np.asarray(camera_matrix, dtype=np.float64)
+        if matrix.shape != (3, 3) or not np.isfinite(matrix).all() or matrix[0, 0] <= 0 or matrix[1, 1] <= 0:
+            raise ValueError("camera_matrix must be a finite 3x3 matrix with positive focal lengths")
+        if width <= 0 or height <= 0:
+            raise ValueError("width and height must be positive")
+
+        coeffs = np.zeros((4, 1)) if dist_coeffs is None else np.asarray(dist_coeffs, dtype=np.float64).reshape(-1, 1)
+        if len(coeffs) not in (4, 5, 8, 12, 14) or not np.isfinite(coeffs).all():
+            raise ValueError("dist_coeffs must hold 4, 5, 8, 12 or 14 finite values")
+
+        intrinsics = CameraIntrinsics(_frozen(matrix), _frozen(coeffs), (int(width), int(height)), calibrated=True)
+        self._calibrations.set(session_id, _SessionCalibration(intrinsics, OrderedDict({intrinsics.size: intrinsics})))
+        logger.info(f"Registered camera calibration for session {session_id} at {width}x{height}")
+        return intrinsics
+
+    def get_calibration(self, session_id: str) -> Optional[CameraIntrinsics]:
+        calibration = self._calibrations.get(session_id)
+        return calibration.intrinsics if calibration is not None else None
+
+    def clear_calibration(self, session_id: str) -> bool:
+        """Forget a session's calibration; returns whether there was one"""
+        return self._calibrations.pop(session_id) is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'resolutions': [key for key, _ in self._by_size.items()],
+            'resolution_evictions': self._by_size.evictions,
+            'calibrated_sessions': len(self._calibrations),
+        }
+
+
+# Shared by every pose estimator in the process
+default_registry = IntrinsicsRegistry()
@@ -8,13 +8,23 @@ This module implements real-time cheating detection using YOLOv8 for:
 - Gaze tracking
 """
 
+import contextvars
 import cv2
 import numpy as np
-from typing import Dict, List, Tuple, Optional, Any
-from dataclasses import dataclass, asdict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Optional, Any
+from dataclasses import dataclass, asdict, field, replace
 from enum import Enum
 import logging
 
+from camera_intrinsics import IntrinsicsRegistry, default_registry
+from metrics import DETECTIONS_TOTAL, MODEL_LOAD_SECONDS, stage_timer
+from pose_geometry import HeadPose, head_pose_from_angles, rotation_vectors_to_euler
+import pose_geometry
+from session_state import SessionStore
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -44,16 +54,7 @@ class Detection:
     confidence: float
     bbox: Tuple[int, int, int, int]  # x1, y1, x2, y2
     is_cheating_object: bool = False
-
-
-@dataclass
-class HeadPose:
-    """Head pose estimation results"""
-    pitch: float  # Up/Down
-    yaw: float    # Left/Right
-    roll: float   # Tilt
-    looking_straight: bool = True
-    direction: str = "straight"
+    track_id: Optional[int] = None  # stable ID across a session's frames (see tracker.py)
 
 
 @dataclass
@@ -68,6 +69,50 @@ class CheatingAnalysis:
     head_pose: Optional[Dict]
     severity: str  # low, medium, high, critical
     timestamp: str
+    face_box: Optional[List[int]] = None  # x1, y1, x2, y2 of the face used for head pose
+    timings: Optional[Dict[str, float]] = None  # per-stage latency in milliseconds
+    violation_events: Optional[List[Dict]] = None  # session-level state changes (see violation_aggregator.py)
+
+
+@dataclass
+class FrameContext:
+    """
+    Intermediate results for one frame, shared by every analyze_frame stage.
+    
+    The face network runs at most once per frame: its raw SSD output is kept
+    here (coordinates normalized to the full frame, same layout as
+    `net.forward()`) so head pose, landmark extraction and annotation all
+    reuse it.
+    """
+    image: np.ndarray
+    detections: Optional[List[Detection]] = None
+    face_detections: Optional[np.ndarray] = None  # (1, 1, N, 7) SSD output
+    face_box: Optional[Tuple[int, int, int, int]] = None
+    face_searched: bool = False
+    
+    def person_region(self, margin: float = 0.1) -> Optional[Tuple[int, int, int, int]]:
+        """Union of the detected person boxes, expanded by margin, clipped to the frame"""
+        persons = [d.bbox for d in self.detections or [] if d.class_name == 'person']
+        if not persons:
+            return None
+        
+        img_h, img_w = self.image.shape[:2]
+        x1 = min(b[0] for b in persons)
+        y1 = min(b[1] for b in persons)
+        x2 = max(b[2] for b in persons)
+        y2 = max(b[3] for b in persons)
+        pad_x = int((x2 - x1) * margin)
+        pad_y = int((y2 - y1) * margin)
+        return (max(0, x1 - pad_x), max(0, y1 - pad_y),
+                min(img_w, x2 + pad_x), min(img_h, y2 + pad_y))
+
+
+@dataclass
+class RoiState:
+    """Adaptive region of interest for one session's frames"""
+    box: Optional[Tuple[int, int, int, int]] = None  # x1, y1, x2, y2 crop around the person
+    frames_since_full: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
 
 
 class YOLOCheatingDetector:
@@ -96,26 +141,81 @@ class YOLOCheatingDetector:
         'bottle': 39,  # Could hide notes
     }
     
-    # Pose thresholds (in degrees)
-    PITCH_THRESHOLD_UP = -15
-    PITCH_THRESHOLD_DOWN = 15
-    YAW_THRESHOLD = 20
-    ROLL_THRESHOLD = 25
+    # Pose thresholds (in degrees), shared by every estimator
+    PITCH_THRESHOLD_UP = pose_geometry.PITCH_THRESHOLD_UP
+    PITCH_THRESHOLD_DOWN = pose_geometry.PITCH_THRESHOLD_DOWN
+    YAW_THRESHOLD = pose_geometry.YAW_THRESHOLD
+    ROLL_THRESHOLD = pose_geometry.ROLL_THRESHOLD
     
-    def __init__(self, model_path: Optional[str] = None, confidence_threshold: float = 0.5):
+    def __init__(self, model_path: Optional[str] = None, confidence_threshold: float = 0.5,
+                 backend: str = 'torch', num_threads: Optional[int] = None,
+                 restrict_classes: bool = False, parallel_stages: bool = False,
+                 object_threads: Optional[int] = None, face_threads: Optional[int] = None,
+                 stage_workers: int = 4, roi_mode: bool = False, roi_full_frame_interval: int = 10,
+                 roi_margin: float = 0.5, roi_min_confidence: float = 0.6,
+                 precision: str = 'fp32'):
         """
         Initialize the YOLO cheating detector.
         
         Args:
             model_path: Path to custom YOLO model (uses default if None)
             confidence_threshold: Minimum confidence for detections
+            backend: Inference backend - 'torch' (ultralytics PyTorch), 'onnx'
+                (ONNX Runtime) or 'openvino'. Exported models are cached on disk.
+            num_threads: Intra-op thread count for the onnx/openvino backends
+            restrict_classes: Only detect proctoring-relevant classes (person,
+                CHEATING_OBJECTS, SUSPICIOUS_OBJECTS). The class allow-list and
+                confidence threshold are applied inside the model call.
+            parallel_stages: Run object detection and face/head-pose stages
+                concurrently inside analyze_frame
+            object_threads: Thread budget for YOLO (torch intra-op threads, or
+                the onnx/openvino thread count when num_threads is not set)
+            face_threads: Thread budget for OpenCV DNN (cv2.setNumThreads)
+            stage_workers: Size of the bounded pool running parallel stages
+            roi_mode: In detect_objects_adaptive, run YOLO on a crop around the
+                session's last confident person instead of the full frame
+            roi_full_frame_interval: Run a full-frame pass at least every this
+                many detections per session (catches new people and objects)
+            roi_margin: Crop padding as a fraction of the person box size
+            roi_min_confidence: Minimum person confidence to anchor the crop
+            precision: 'fp32', or 'int8' to load the quantized YOLO model (onnx
+                backend) and, when present, the quantized face net created by
+                quantization.py
         """
+        from inference_backends import SUPPORTED_BACKENDS, SUPPORTED_PRECISIONS
+        if backend not in SUPPORTED_BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {SUPPORTED_BACKENDS}")
+        if precision not in SUPPORTED_PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {SUPPORTED_PRECISIONS}")
+        if precision == 'int8' and backend != 'onnx':
+            raise ValueError("INT8 models require backend='onnx'")
+        
         self.confidence_threshold = confidence_threshold
         self.model = None
         self.face_detector = None
         self.pose_model = None
         self._initialized = False
         self.model_path = model_path
+        self.backend = backend
+        self.precision = precision
+        self.num_threads = num_threads
+        self.restrict_classes = restrict_classes
+        self.parallel_stages = parallel_stages
+        self.object_threads = object_threads
+        self.face_threads = face_threads
+        self.stage_workers = max(2, stage_workers)
+        self._stage_executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # cv2.dnn.Net is not safe to drive from several threads at once
+        self._face_lock = threading.Lock()
+        
+        self.roi_mode = roi_mode
+        self.roi_full_frame_interval = max(1, roi_full_frame_interval)
+        self.roi_margin = roi_margin
+        self.roi_min_confidence = roi_min_confidence
+        self._roi_states: SessionStore[RoiState] = SessionStore()
+        self.roi_stats = {'crop_passes': 0, 'full_passes': 0, 'fallbacks': 0}
+        self._roi_stats_lock = threading.Lock()
         
     def initialize(self) -> bool:
         """
@@ -125,32 +225,81 @@ class YOLOCheatingDetector:
             bool: True if initialization successful
         """
         try:
-            from ultralytics import YOLO
+            self._apply_thread_budgets()
             
             # Load YOLO model
-            if self.model_path:
+            load_started = time.perf_counter()
+            if self.backend != 'torch':
+                # Exported ONNX / OpenVINO model (ultralytics only needed for the first export)
+                from inference_backends import ExportedYOLO
+                self.model = ExportedYOLO(
+                    weights=self.model_path or 'yolov8n.pt',
+                    backend=self.backend,
+                    num_threads=self.num_threads or self.object_threads,
+                    precision=self.precision
+                )
+                self.model.load()
+            elif self.model_path:
+                from ultralytics import YOLO
                 self.model = YOLO(self.model_path)
                 logger.info(f"Loaded custom YOLO model from {self.model_path}")
             else:
+                from ultralytics import YOLO
                 # Use pretrained YOLOv8 model
                 self.model = YOLO('yolov8n.pt')
                 logger.info("Loaded YOLOv8n pretrained model")
+            MODEL_LOAD_SECONDS.set(time.perf_counter() - load_started, 'yolo')
             
             # Initialize face detector for head pose
+            load_started = time.perf_counter()
             self._init_face_detector()
+            if self.face_detector is not None:
+                MODEL_LOAD_SECONDS.set(time.perf_counter() - load_started, 'face_net')
             
             self._initialized = True
             logger.info("YOLO Cheating Detector initialized successfully")
             return True
             
         except ImportError as e:
-            logger.error(f"Failed to import ultralytics: {e}")
-            logger.info("Please install: pip install ultralytics")
+            logger.error(f"Failed to import inference runtime: {e}")
+            logger.info("Please install: pip install ultralytics (plus onnxruntime or openvino for those backends)")
             return False
         except Exception as e:
             logger.error(f"Failed to initialize detector: {e}")
             return False
     
+    def _apply_thread_budgets(self):
+        """
+        Split cores between the YOLO and OpenCV DNN stages.
+        
+        Both settings are process-wide, so they bound each runtime's own
+        thread pool rather than individual calls; together they keep the two
+        parallel stages from oversubscribing the CPU.
+        """
+        if self.face_threads is not None:
+            cv2.setNumThreads(self.face_threads)
+        if self.object_threads is not None and self.backend == 'torch':
+            try:
+                import torch
+                torch.set_num_threads(self.object_threads)
+            except ImportError:
+                pass
+    
+    def _get_stage_executor(self) -> ThreadPoolExecutor:
+        """Bounded pool used to run analyze_frame stages concurrently"""
+        with self._executor_lock:
+            if self._stage_executor is None:
+                self._stage_executor = ThreadPoolExecutor(
+                    max_workers=self.stage_workers, thread_name_prefix="analysis-stage")
+            return self._stage_executor
+    
+    @staticmethod
+    def _timed(fn, *args, **kwargs) -> Tuple[Any, float]:
+        """Call fn and return (result, elapsed milliseconds)"""
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        return result, (time.perf_counter() - started) * 1000
+    
     def _init_face_detector(self):
         """Initialize OpenCV DNN face detector for head pose estimation"""
         try:
@@ -159,6 +308,15 @@ class YOLOCheatingDetector:
             proto_path = os.path.join(base_path, 'assets', 'deploy.prototxt')
             model_path = os.path.join(base_path, 'assets', 'res10_300x300_ssd_iter_140000.caffemodel')
             
+            if self.precision == 'int8':
+                from inference_backends import DEFAULT_CACHE_DIR, FACE_NET_ONNX, OnnxFaceNet, quantized_path
+                int8_path = quantized_path(os.path.join(DEFAULT_CACHE_DIR, FACE_NET_ONNX))
+                if os.path.exists(int8_path):
+                    self.face_detector = OnnxFaceNet(int8_path, self.face_threads)
+                    logger.info(f"INT8 face detector initialized from {int8_path}")
+                    return
+                logger.info("No INT8 face net found, using the FP32 Caffe model")
+            
             if os.path.exists(proto_path) and os.path.exists(model_path):
                 self.face_detector = cv2.dnn.readNetFromCaffe(proto_path, model_path)
                 logger.info("Face detector initialized")
@@ -177,41 +335,163 @@ class YOLOCheatingDetector:
         Returns:
             List of Detection objects
         """
+        return self.detect_objects_batch([image])[0]
+    
+    def detect_objects_batch(self, images: List[np.ndarray]) -> List[List[Detection]]:
+        """
+        Detect objects in several images with a single YOLO call.
+        
+        Args:
+            images: List of BGR images (OpenCV format)
+            
+        Returns:
+            One list of Detection objects per input image, in input order
+        """
+        if not images:
+            return []
+        
         if not self._initialized:
             if not self.initialize():
-                return []
+                return [[] for _ in images]
         
-        detections = []
+        classes = self.relevant_class_ids() if self.restrict_classes else None
         
         try:
-            results = self.model(image, verbose=False)[0]
-            
-            for box in results.boxes:
-                class_id = int(box.cls[0])
-                confidence = float(box.conf[0])
-                class_name = results.names[class_id]
-                
-                if confidence < self.confidence_threshold:
-                    continue
-                
-                # Get bounding box coordinates
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                
-                # Check if it's a cheating-related object
-                is_cheating = self._is_cheating_object(class_name, class_id)
-                
-                detections.append(Detection(
-                    class_name=class_name,
-                    confidence=confidence,
-                    bbox=(x1, y1, x2, y2),
-                    is_cheating_object=is_cheating
-                ))
-                
+            with stage_timer('yolo'):
+                if self.backend != 'torch':
+                    outputs = self.model.predict(list(images), conf=self.confidence_threshold, classes=classes)
+                    batch = [self._detections_from_array(boxes, self.model.names) for boxes in outputs]
+                else:
+                    if classes is not None:
+                        results = self.model(list(images), verbose=False, classes=classes,
+                                             conf=self.confidence_threshold)
+                    else:
+                        results = self.model(list(images), verbose=False)
+                    batch = [self._parse_detections(result) for result in results]
         except Exception as e:
             logger.error(f"Object detection error: {e}")
+            return [[] for _ in images]
+        
+        for detections in batch:
+            for detection in detections:
+                DETECTIONS_TOTAL.inc(detection.class_name)
+        return batch
+    
+    def detect_objects_adaptive(self, image: np.ndarray, session_id: str,
+                                detect_fn: Optional[Callable[[np.ndarray], List[Detection]]] = None) -> List[Detection]:
+        """
+        Detect objects on a crop around the session's last confident person.
+        
+        A full-frame pass runs every `roi_full_frame_interval` detections, when
+        no person is anchored yet, or when the crop loses the person; it also
+        re-anchors the crop. Crop detections are mapped back to full-frame
+        coordinates. Without roi_mode this is a plain full-frame detection.
         
+        Args:
+            image: BGR image (OpenCV format)
+            session_id: Test session identifier
+            detect_fn: Detector to run (default: detect_objects), e.g. the
+                batching scheduler's detect
+            
+        Returns:
+            List of Detection objects in full-frame coordinates
+        """
+        detect_fn = detect_fn or self.detect_objects
+        if not self.roi_mode:
+            return detect_fn(image)
+        
+        state = self._roi_states.get_or_create(session_id, RoiState)
+        # Decide on a snapshot and update under the lock afterwards, so concurrent
+        # frames of one session stay consistent without serializing inference
+        with state.lock:
+            box = state.box
+            use_crop = box is not None and state.frames_since_full + 1 < self.roi_full_frame_interval
+            if use_crop:
+                # Count the crop pass now so concurrent frames still honour the interval
+                state.frames_since_full += 1
+        detections = None
+        
+        if use_crop:
+            x1, y1, x2, y2 = box
+            crop_detections = detect_fn(image[y1:y2, x1:x2])
+            if any(d.class_name == 'person' for d in crop_detections):
+                detections = [
+                    replace(d, bbox=(d.bbox[0] + x1, d.bbox[1] + y1, d.bbox[2] + x1, d.bbox[3] + y1))
+                    for d in crop_detections
+                ]
+                self._count_roi_pass('crop_passes')
+            else:
+                # Person left the crop; look at the whole frame again
+                self._count_roi_pass('fallbacks')
+        
+        full_pass = detections is None
+        if full_pass:
+            detections = detect_fn(image)
+            self._count_roi_pass('full_passes')
+        
+        new_box = self._roi_from_detections(image, detections)
+        with state.lock:
+            if full_pass:
+                state.frames_since_full = 0
+            state.box = new_box
         return detections
     
+    def _count_roi_pass(self, kind: str):
+        with self._roi_stats_lock:
+            self.roi_stats[kind] += 1
+    
+    def get_roi_stats(self) -> Dict[str, int]:
+        with self._roi_stats_lock:
+            return dict(self.roi_stats)
+    
+    def _roi_from_detections(self, image: np.ndarray, detections: List[Detection]) -> Optional[Tuple[int, int, int, int]]:
+        """Expanded box around confident persons, or None if cropping would not help"""
+        persons = [d for d in detections
+                   if d.class_name == 'person' and d.confidence >= self.roi_min_confidence]
+        box = FrameContext(image=image, detections=persons).person_region(self.roi_margin)
+        if box is None:
+            return None
+        x1, y1, x2, y2 = box
+        img_h, img_w = image.shape[:2]
+        if x2 <= x1 or y2 <= y1 or (x2 - x1) * (y2 - y1) > 0.8 * img_w * img_h:
+            return None
+        return box
+    
+    def _parse_detections(self, results) -> List[Detection]:
+        """Convert a single ultralytics result into Detection objects"""
+        # One device-to-host copy of the (N, 6) box tensor instead of per-box indexing
+        return self._detections_from_array(results.boxes.data.cpu().numpy(), results.names)
+    
+    def _detections_from_array(self, boxes: np.ndarray, names: Dict[int, str]) -> List[Detection]:
+        """Convert an (N, 6) [x1, y1, x2, y2, conf, cls] array into Detection objects"""
+        if len(boxes) == 0:
+            return []
+        
+        boxes = boxes[boxes[:, 4] >= self.confidence_threshold]
+        
+        # Truncate like int() on each coordinate, then convert everything to Python once
+        bboxes = boxes[:, :4].astype(np.int64).tolist()
+        confidences = boxes[:, 4].tolist()
+        class_ids = boxes[:, 5].astype(np.int64).tolist()
+        
+        return [
+            Detection(
+                class_name=names[class_id],
+                confidence=confidence,
+                bbox=tuple(bbox),
+                is_cheating_object=self._is_cheating_object(names[class_id], class_id)
+            )
+            for bbox, confidence, class_id in zip(bboxes, confidences, class_ids)
+        ]
+    
+    @classmethod
+    def relevant_class_ids(cls) -> List[int]:
+        """COCO class ids that matter for proctoring: person plus cheating/suspicious objects"""
+        ids = {0}  # person
+        ids.update(i for i in cls.CHEATING_OBJECTS.values() if i >= 0)
+        ids.update(i for i in cls.SUSPICIOUS_OBJECTS.values() if i >= 0)
+        return sorted(ids)
+    
     def _is_cheating_object(self, class_name: str, class_id: int) -> bool:
         """Check if detected object is cheating-related"""
         cheating_names = ['cell phone', 'book', 'laptop', 'remote', 'tablet']
@@ -221,27 +501,74 @@ class YOLOCheatingDetector:
         """Count number of persons in detections"""
         return sum(1 for d in detections if d.class_name == 'person')
     
-    def detect_face(self, image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    def detect_faces_raw(self, image: np.ndarray, context: Optional[FrameContext] = None) -> Optional[np.ndarray]:
         """
-        Detect face in image using OpenCV DNN.
+        Run the SSD face network once for a frame.
+        
+        When the context holds YOLO person detections, only the region around
+        the people is searched. Results are cached on the context so later
+        stages do not run the network again.
         
         Args:
             image: BGR image
+            context: Optional per-frame context
             
         Returns:
-            Tuple of (x1, y1, x2, y2) or None if no face found
+            (1, 1, N, 7) SSD output with coordinates normalized to the full
+            frame, or None if the face detector is unavailable
         """
+        if context is not None and context.face_detections is not None:
+            return context.face_detections
+        
         if self.face_detector is None:
             return None
         
-        try:
-            h, w = image.shape[:2]
-            blob = cv2.dnn.blobFromImage(
-                cv2.resize(image, (300, 300)), 1.0, (300, 300),
-                (104.0, 177.0, 123.0), False, False
-            )
+        img_h, img_w = image.shape[:2]
+        region = context.person_region() if context is not None else None
+        if region is not None and (region[2] <= region[0] or region[3] <= region[1]):
+            region = None
+        x1, y1, x2, y2 = region if region is not None else (0, 0, img_w, img_h)
+        
+        # blobFromImage resizes to the network input itself
+        blob = cv2.dnn.blobFromImage(
+            image[y1:y2, x1:x2], 1.0, (300, 300),
+            (104.0, 177.0, 123.0), False, False
+        )
+        with self._face_lock, stage_timer('face_net'):
             self.face_detector.setInput(blob)
             detections = self.face_detector.forward()
+        
+        if region is not None:
+            # Map crop-normalized coordinates back onto the full frame
+            detections = detections.copy()
+            coords = detections[0, 0, :, 3:7]
+            coords[:, [0, 2]] = (coords[:, [0, 2]] * (x2 - x1) + x1) / img_w
+            coords[:, [1, 3]] = (coords[:, [1, 3]] * (y2 - y1) + y1) / img_h
+        
+        if context is not None:
+            context.face_detections = detections
+        return detections
+    
+    def detect_face(self, image: np.ndarray, context: Optional[FrameContext] = None) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Detect face in image using OpenCV DNN.
+        
+        Args:
+            image: BGR image
+            context: Optional per-frame context; reuses its face network output
+            
+        Returns:
+            Tuple of (x1, y1, x2, y2) or None if no face found
+        """
+        if context is not None and context.face_searched:
+            return context.face_box
+        
+        try:
+            detections = self.detect_faces_raw(image, context)
+            if detections is None:
+                return None
+            
+            h, w = image.shape[:2]
             
             # Get the detection with highest confidence
             best_conf = 0
@@ -254,13 +581,17 @@ class YOLOCheatingDetector:
                     box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
                     best_box = tuple(box.astype(int))
             
+            if context is not None:
+                context.face_box = best_box
+                context.face_searched = True
             return best_box
             
         except Exception as e:
             logger.error(f"Face detection error: {e}")
             return None
     
-    def estimate_head_pose(self, image: np.ndarray, face_box: Optional[Tuple[int, int, int, int]] = None) -> Optional[HeadPose]:
+    def estimate_head_pose(self, image: np.ndarray, face_box: Optional[Tuple[int, int, int, int]] = None,
+                           context: Optional[FrameContext] = None) -> Optional[HeadPose]:
         """
         Estimate head pose from face region.
         
@@ -270,12 +601,13 @@ class YOLOCheatingDetector:
         Args:
             image: BGR image
             face_box: Face bounding box (x1, y1, x2, y2)
+            context: Optional per-frame context used to find the face box
             
         Returns:
             HeadPose object or None
         """
         if face_box is None:
-            face_box = self.detect_face(image)
+            face_box = self.detect_face(image, context)
         
         if face_box is None:
             return None
@@ -303,40 +635,22 @@ class YOLOCheatingDetector:
             aspect_ratio = face_width / face_height if face_height > 0 else 1
             roll = (1 - aspect_ratio) * 20 if aspect_ratio < 1 else (aspect_ratio - 1) * -20
             
-            # Determine direction
-            direction = "straight"
-            looking_straight = True
-            
-            if pitch < self.PITCH_THRESHOLD_UP:
-                direction = "up"
-                looking_straight = False
-            elif pitch > self.PITCH_THRESHOLD_DOWN:
-                direction = "down"
-                looking_straight = False
-            
-            if abs(yaw) > self.YAW_THRESHOLD:
-                direction = "left" if yaw < 0 else "right"
-                looking_straight = False
-            
-            return HeadPose(
-                pitch=round(pitch, 2),
-                yaw=round(yaw, 2),
-                roll=round(roll, 2),
-                looking_straight=looking_straight,
-                direction=direction
-            )
+            return head_pose_from_angles(pitch, yaw, roll)
             
         except Exception as e:
             logger.error(f"Head pose estimation error: {e}")
             return None
     
-    def analyze_frame(self, image: np.ndarray, timestamp: str = "") -> CheatingAnalysis:
+    def analyze_frame(self, image: np.ndarray, timestamp: str = "",
+                      detections: Optional[List[Detection]] = None) -> CheatingAnalysis:
         """
         Perform complete cheating analysis on a frame.
         
         Args:
             image: BGR image (OpenCV format)
             timestamp: Optional timestamp string
+            detections: Precomputed object detections for this frame (e.g. from
+                the batching scheduler). Runs YOLO on the frame if None.
             
         Returns:
             CheatingAnalysis object with all results
@@ -346,8 +660,33 @@ class YOLOCheatingDetector:
         is_cheating = False
         confidence_score = 0.0
         
-        # Detect all objects
-        detections = self.detect_objects(image)
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        
+        if detections is None and self.parallel_stages:
+            # Object detection and face/head pose are independent; both release
+            # the GIL in native code, so run them side by side. The face search
+            # covers the full frame since person boxes are not known yet.
+            context = FrameContext(image=image)
+            executor = self._get_stage_executor()
+            # Carry the caller's context so stage timings reach the active request
+            objects_future = executor.submit(contextvars.copy_context().run,
+                                             self._timed, self.detect_objects, image)
+            pose_future = executor.submit(contextvars.copy_context().run,
+                                          self._timed, self.estimate_head_pose, image, None, context)
+            detections, timings['object_detection'] = objects_future.result()
+            head_pose, timings['head_pose'] = pose_future.result()
+            context.detections = detections
+        else:
+            # Detect all objects
+            if detections is None:
+                detections, timings['object_detection'] = self._timed(self.detect_objects, image)
+            
+            # Share intermediate results (person boxes, face net output) across stages
+            context = FrameContext(image=image, detections=detections)
+            
+            # Estimate head pose
+            head_pose, timings['head_pose'] = self._timed(self.estimate_head_pose, image, context=context)
         
         # Count persons
         person_count = self.count_persons(detections)
@@ -380,8 +719,6 @@ class YOLOCheatingDetector:
                 cheating_types.append(CheatingType.SUSPICIOUS_OBJECT.value)
                 warnings.append(f"Suspicious object ({obj.class_name}) detected")
         
-        # Estimate head pose
-        head_pose = self.estimate_head_pose(image)
         head_pose_dict = None
         
         if head_pose:
@@ -431,7 +768,8 @@ class YOLOCheatingDetector:
                 'class_name': d.class_name,
                 'confidence': d.confidence,
                 'bbox': list(d.bbox),
-                'is_cheating_object': d.is_cheating_object
+                'is_cheating_object': d.is_cheating_object,
+                'track_id': d.track_id
             }
             for d in detections
         ]
@@ -445,7 +783,12 @@ class YOLOCheatingDetector:
             person_count=person_count,
             head_pose=head_pose_dict,
             severity=severity,
-            timestamp=timestamp
+            timestamp=timestamp,
+            face_box=[int(v) for v in context.face_box] if context.face_box is not None else None,
+            timings={
+                **{k: round(v, 3) for k, v in timings.items()},
+                'total': round((time.perf_counter() - started) * 1000, 3)
+            }
         )
     
     def _calculate_severity(self, cheating_types: List[str], confidence: float) -> str:
@@ -498,9 +841,16 @@ class YOLOCheatingDetector:
             cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
             
             label = f"{det['class_name']}: {det['confidence']:.2f}"
+            if det.get('track_id') is not None:
+                label = f"#{det['track_id']} {label}"
             cv2.putText(annotated, label, (x1, y1 - 10),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
         
+        # Face box found during analysis (no need to run the face net again)
+        if analysis.face_box:
+            fx1, fy1, fx2, fy2 = analysis.face_box
+            cv2.rectangle(annotated, (fx1, fy1), (fx2, fy2), (255, 0, 255), 2)
+        
         # Draw warnings at top
         y_offset = 30
         for warning in analysis.warnings[:3]:  # Show top 3 warnings
@@ -524,28 +874,62 @@ class YOLOCheatingDetector:
         return annotated
 
 
+@dataclass
+class FaceMeshSlot:
+    """A MediaPipe FaceMesh graph and the lock serializing calls into it"""
+    mesh: Any = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    closed: bool = False
+
+
 class AdvancedHeadPoseEstimator:
     """
     Advanced head pose estimation using facial landmarks.
     
-    Uses MediaPipe Face Mesh for accurate 3D pose estimation.
+    Uses MediaPipe Face Mesh for accurate 3D pose estimation. Each session
+    gets its own tracking-mode FaceMesh so consecutive frames of one student
+    take MediaPipe's landmark-tracking path instead of re-running face
+    detection; requests without a session use a shared static_image_mode
+    instance.
     """
     
-    def __init__(self):
+    # Nose tip, left eye, left mouth corner, chin, right eye, right mouth corner
+    KEY_POINTS = [1, 33, 61, 199, 263, 291]  # MediaPipe landmark indices
+    KEY_POINT_INDICES = np.array(KEY_POINTS, dtype=np.intp)
+    
+    # Direction thresholds (in degrees); tighter than YOLOCheatingDetector's
+    # because landmark-based angles are more precise
+    PITCH_THRESHOLD_UP = -10
+    PITCH_THRESHOLD_DOWN = 10
+    YAW_THRESHOLD = 15
+    
+    def __init__(self, intrinsics: Optional[IntrinsicsRegistry] = None,
+                 max_sessions: int = 64, session_ttl: Optional[float] = 300.0):
+        """
+        Initialize the estimator.
+        
+        Args:
+            intrinsics: Camera intrinsics registry (defaults to the process-wide one)
+            max_sessions: Tracking FaceMesh instances kept; least recently used
+                sessions are evicted and their graphs closed
+            session_ttl: Idle seconds after which a session's FaceMesh is closed
+        """
         self.face_mesh = None
         self._initialized = False
+        self.intrinsics = intrinsics or default_registry
+        self._static_lock = threading.Lock()
+        self._session_meshes: SessionStore[FaceMeshSlot] = SessionStore(
+            max_sessions, session_ttl, on_evict=self._close_slot)
+        self._stats_lock = threading.Lock()
+        self.mesh_stats = {'created': 0, 'closed': 0}
     
     def initialize(self) -> bool:
         """Initialize MediaPipe Face Mesh"""
         try:
             import mediapipe as mp
             self.mp_face_mesh = mp.solutions.face_mesh
-            self.face_mesh = self.mp_face_mesh.FaceMesh(
-                max_num_faces=1,
-                refine_landmarks=True,
-                min_detection_confidence=0.5,
-                min_tracking_confidence=0.5
-            )
+            # Stateless instance for one-off requests
+            self.face_mesh = self._create_mesh(static_image_mode=True)
             self._initialized = True
             logger.info("Advanced head pose estimator initialized")
             return True
@@ -556,12 +940,71 @@ class AdvancedHeadPoseEstimator:
             logger.error(f"Failed to initialize advanced pose estimator: {e}")
             return False
     
-    def estimate_pose(self, image: np.ndarray) -> Optional[HeadPose]:
+    def _create_mesh(self, static_image_mode: bool):
+        return self.mp_face_mesh.FaceMesh(
+            static_image_mode=static_image_mode,
+            max_num_faces=1,
+            refine_landmarks=True,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+    
+    def _close_slot(self, session_id: str, slot: FaceMeshSlot):
+        # Wait for an in-flight process() call before tearing the graph down
+        with slot.lock:
+            slot.closed = True
+            if slot.mesh is not None:
+                slot.mesh.close()
+                slot.mesh = None
+                with self._stats_lock:
+                    self.mesh_stats['closed'] += 1
+                logger.debug(f"Closed FaceMesh of session {session_id}")
+    
+    def _process(self, image: np.ndarray, session_id: Optional[str]):
+        """Run FaceMesh on an RGB frame with the session's tracker (or the static one)"""
+        if session_id is None:
+            with self._static_lock:
+                return self.face_mesh.process(image)
+        
+        while True:
+            slot = self._session_meshes.get_or_create(session_id, FaceMeshSlot)
+            with slot.lock:
+                if slot.closed:
+                    # Evicted between lookup and use; take a fresh slot
+                    continue
+                if slot.mesh is None:
+                    # Built outside the store lock: graph start-up takes a while
+                    slot.mesh = self._create_mesh(static_image_mode=False)
+                    with self._stats_lock:
+                        self.mesh_stats['created'] += 1
+                return slot.mesh.process(image)
+    
+    def release_session(self, session_id: str) -> bool:
+        """Close a session's FaceMesh; returns whether it had one"""
+        slot = self._session_meshes.pop(session_id)
+        if slot is None:
+            return False
+        self._close_slot(session_id, slot)
+        return True
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            mesh_stats = dict(self.mesh_stats)
+        return {
+            'initialized': self._initialized,
+            'session_meshes': len(self._session_meshes),
+            'evictions': self._session_meshes.evictions,
+            **mesh_stats,
+        }
+    
+    def estimate_pose(self, image: np.ndarray, session_id: Optional[str] = None) -> Optional[HeadPose]:
         """
         Estimate head pose using MediaPipe.
         
         Args:
             image: RGB image
+            session_id: Optional session; its frames are tracked by a dedicated
+                FaceMesh and its camera calibration is used
             
         Returns:
             HeadPose object or None
@@ -571,82 +1014,82 @@ class AdvancedHeadPoseEstimator:
                 return None
         
         try:
-            results = self.face_mesh.process(image)
+            results = self._process(image, session_id)
             
             if not results.multi_face_landmarks:
                 return None
             
-            face_landmarks = results.multi_face_landmarks[0]
             img_h, img_w = image.shape[:2]
-            
-            # Get key facial landmarks for pose estimation
-            # Nose tip, chin, left eye, right eye, left mouth corner, right mouth corner
-            face_3d = []
-            face_2d = []
-            
-            key_points = [1, 33, 61, 199, 263, 291]  # MediaPipe landmark indices
-            
-            for idx in key_points:
-                lm = face_landmarks.landmark[idx]
-                x, y = int(lm.x * img_w), int(lm.y * img_h)
-                face_2d.append([x, y])
-                face_3d.append([x, y, lm.z])
-            
-            face_2d = np.array(face_2d, dtype=np.float64)
-            face_3d = np.array(face_3d, dtype=np.float64)
-            
-            # Camera matrix
-            focal_length = img_w
-            cam_matrix = np.array([
-                [focal_length, 0, img_w / 2],
-                [0, focal_length, img_h / 2],
-                [0, 0, 1]
-            ])
-            
-            dist_coeffs = np.zeros((4, 1))
-            
-            # Solve PnP
-            success, rotation_vec, translation_vec = cv2.solvePnP(
-                face_3d, face_2d, cam_matrix, dist_coeffs
-            )
-            
-            if not success:
-                return None
-            
-            # Convert to rotation matrix and get Euler angles
-            rotation_mat, _ = cv2.Rodrigues(rotation_vec)
-            angles, _, _, _, _, _ = cv2.RQDecomp3x3(rotation_mat)
-            
-            pitch = angles[0]
-            yaw = angles[1]
-            roll = angles[2]
-            
-            # Determine direction
-            direction = "straight"
-            looking_straight = True
-            
-            if pitch < -10:
-                direction = "up"
-                looking_straight = False
-            elif pitch > 10:
-                direction = "down"
-                looking_straight = False
-            
-            if yaw < -15:
-                direction = "right"
-                looking_straight = False
-            elif yaw > 15:
-                direction = "left"
-                looking_straight = False
-            
-            return HeadPose(
-                pitch=round(pitch, 2),
-                yaw=round(yaw, 2),
-                roll=round(roll, 2),
-                looking_straight=looking_straight,
-                direction=direction
-            )
+            points = self.key_points_to_array(results.multi_face_landmarks[0])
+            return self._poses_from_key_points(points[None], img_w, img_h, session_id)[0]
             
         except Exception as e:
             logger.error(f"Advanced pose estimation error: {e}")
             return None
+    
+    @classmethod
+    def key_points_to_array(cls, face_landmarks) -> np.ndarray:
+        """(K, 3) normalized x, y, z of the KEY_POINTS of a FaceMesh landmark list"""
+        return cls.landmarks_to_array(face_landmarks)[cls.KEY_POINT_INDICES]
+    
+    @staticmethod
+    def landmarks_to_array(face_landmarks) -> np.ndarray:
+        """(L, 3) normalized x, y, z of every landmark of a FaceMesh landmark list"""
+        landmark = face_landmarks.landmark
+        # One pass over the repeated field straight into a preallocated (L, 3) array
+        return np.fromiter(((lm.x, lm.y, lm.z) for lm in landmark),
+                           dtype=np.dtype((np.float64, 3)), count=len(landmark))
+    
+    def estimate_poses_from_landmarks(self, landmarks: np.ndarray, image_size: Tuple[int, int],
+                                      session_id: Optional[str] = None) -> List[Optional[HeadPose]]:
+        """
+        Estimate head pose for a stack of FaceMesh landmark arrays.
+        
+        Args:
+            landmarks: (L, 3) or (N, L, 3) normalized landmarks (see
+                landmarks_to_array), e.g. several faces or frames
+            image_size: (width, height) of the frames the landmarks belong to
+            session_id: Optional session whose camera calibration should be used
+            
+        Returns:
+            One HeadPose (None where solvePnP fails) per landmark array
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        if landmarks.ndim == 2:
+            landmarks = landmarks[None]
+        points = landmarks[:, self.KEY_POINT_INDICES, :]
+        return self._poses_from_key_points(points, image_size[0], image_size[1], session_id)
+    
+    def _poses_from_key_points(self, points: np.ndarray, img_w: int, img_h: int,
+                               session_id: Optional[str]) -> List[Optional[HeadPose]]:
+        """(N, K, 3) normalized key points -> one HeadPose (or None) per face"""
+        face_2d = np.ascontiguousarray(np.trunc(points[:, :, :2] * (img_w, img_h)))
+        face_3d = np.concatenate([face_2d, points[:, :, 2:]], axis=2)
+        
+        # Camera matrix (cached per resolution / session calibration)
+        intrinsics = self.intrinsics.get(img_w, img_h, session_id)
+        
+        rotation_vecs = []
+        solved = []
+        for object_points, image_points in zip(face_3d, face_2d):
+            success, rotation_vec, _ = cv2.solvePnP(
+                object_points, image_points, intrinsics.camera_matrix, intrinsics.dist_coeffs
+            )
+            solved.append(bool(success))
+            if success:
+                rotation_vecs.append(rotation_vec.ravel())
+        
+        poses: List[Optional[HeadPose]] = [None] * len(points)
+        if rotation_vecs:
+            # Closed-form Euler angles for every face at once (cv2.RQDecomp3x3 convention)
+            angles = iter(rotation_vectors_to_euler(np.stack(rotation_vecs)))
+            for i, success in enumerate(solved):
+                if success:
+                    pitch, yaw, roll = next(angles)
+                    poses[i] = head_pose_from_angles(
+                        pitch, yaw, roll, mirrored=True,
+                        pitch_up=self.PITCH_THRESHOLD_UP,
+                        pitch_down=self.PITCH_THRESHOLD_DOWN,
+                        yaw_threshold=self.YAW_THRESHOLD,
+                    )
+        return poses
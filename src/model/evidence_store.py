@@ -0,0 +1,464 @@
+"""
+Asynchronous, content-addressed evidence storage for /save_img.
+
+The request thread only base64-decodes the upload and hands the original
+image bytes to a background writer through a bounded queue; nothing is
+decoded or re-encoded, and the response carries a handle immediately.
+
+Images are stored under their SHA-256, per session, next to an append-only
+manifest:
+
+    <root>/<session>-<id hash>/objects/<sha[:2]>/<sha256>.<jpg|png|webp>
+    <root>/<session>-<id hash>/manifest.jsonl
+
+Saving the same bytes again only appends a manifest record pointing at the
+existing file. Optionally, a 64-bit difference hash (dHash) also catches
+near-identical frames (re-encoded, sensor noise): within `near_duplicate_distance`
+bits of one of the session's recent images, the frame is recorded but not
+stored again. Every save, duplicate or not, gets a manifest record with its
+time, severity, violation types and analysis summary, so a session's evidence
+is queried from its manifest (cached in memory) without listing directories.
+
+Each file is written to a temporary name and renamed, so readers never see a
+partial image. When the queue is full, submit() refuses the image instead of
+blocking the request thread.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+from metrics import EVIDENCE_FILES_TOTAL, EVIDENCE_QUEUE_DEPTH, EVIDENCE_WRITE_SECONDS
+from session_state import SessionStore
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+# Leading bytes of the image formats accepted as evidence
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'RIFF', 'webp'),  # followed by a size and "WEBP", checked in sniff_image_format
+)
+
+
+class EvidenceQueueFull(Exception):
+    """Raised when the writer's queue is full"""
+
+
+def sniff_image_format(data: bytes) -> Optional[str]:
+    """File extension for JPEG/PNG/WebP bytes, or None"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            if extension == 'webp' and data[8:12] != b'WEBP':
+                return None
+            return extension
+    return None
+
+
+def safe_session_name(session_id: str) -> str:
+    """
+    Filesystem-safe, collision-free directory name for a session or user identifier.
+
+    The readable part alone is lossy ("a.b" and "a_b" both become "a_b"), so a
+    short hash of the raw identifier keeps distinct sessions apart.
+    """
+    session_id = session_id or ''
+    name = re.sub(r'[^A-Za-z0-9_-]', '_', session_id)[:40] or 'unknown'
+    digest = hashlib.sha256(session_id.encode('utf-8')).hexdigest()[:12]
+    return f"{name}-{digest}"
+
+
+def difference_hash(data: bytes) -> Optional[int]:
+    """64-bit dHash of an encoded image (decoded at 1/8 scale), or None if undecodable"""
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+@dataclass
+class EvidenceHandle:
+    """A submitted image; its record is looked up with the handle"""
+    handle: str                 # "<session>/<entry id>", used for status lookups
+    path: str                   # absolute path of the content-addressed file
+    session_id: str
+    sha256: str
+    received_at: float
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'handle': self.handle, 'path': self.path, 'filename': self.filename, 'sha256': self.sha256}
+
+
+@dataclass
+class EvidenceRecord:
+    """One manifest line: a save request and the file that holds its image"""
+    entry_id: str
+    session_id: str
+    timestamp: float                        # receive time, seconds since the epoch
+    sha256: str
+    path: str                               # file path relative to the evidence root
+    size: int
+    duplicate: Optional[str] = None         # None, "exact" or "near"
+    duplicate_of: Optional[str] = None      # entry_id of the record whose file is reused
+    phash: Optional[str] = None             # hex dHash when near-duplicate detection is on
+    severity: Optional[str] = None
+    cheating_types: List[str] = field(default_factory=list)
+    summary: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class _WriteJob:
+    handle: EvidenceHandle
+    data: bytes
+    metadata: Dict[str, Any]
+    enqueued_at: float
+
+
+class _SessionIndex:
+    """In-memory copy of a session's manifest plus the dedup lookups"""
+
+    def __init__(self, records: List[EvidenceRecord], recent_hashes: int):
+        self.records = records
+        self.by_sha: Dict[str, EvidenceRecord] = {}
+        self.recent: Deque[Tuple[int, EvidenceRecord]] = deque(maxlen=recent_hashes)
+        self.lock = threading.Lock()
+        for record in records:
+            if record.duplicate is None:
+                self._add_stored(record)
+
+    def _add_stored(self, record: EvidenceRecord):
+        self.by_sha.setdefault(record.sha256, record)
+        if record.phash is not None:
+            self.recent.append((int(record.phash, 16), record))
+
+    def add(self, record: EvidenceRecord):
+        self.records.append(record)
+        if record.duplicate is None:
+            self._add_stored(record)
+
+    def near_duplicate(self, phash: int, max_distance: int) -> Optional[EvidenceRecord]:
+        best, best_distance = None, max_distance + 1
+        for other_hash, record in self.recent:
+            distance = hamming_distance(phash, other_hash)
+            if distance < best_distance:
+                best, best_distance = record, distance
+        return best
+
+
+class EvidenceWriter:
+    """Background, deduplicating writer for evidence images with a bounded queue"""
+
+    def __init__(self, root: str, max_queue: int = 256, num_writers: int = 1,
+                 max_tracked: int = 10000, near_duplicate_distance: int = 0,
+                 recent_hashes: int = 16, max_indexed_sessions: int = 200):
+        """
+        Initialize the writer and start its threads.
+
+        Args:
+            root: Evidence directory
+            max_queue: Images waiting to be written before submit() refuses new ones
+            num_writers: Writer threads
+            max_tracked: Recent handles whose status is kept for status()
+            near_duplicate_distance: Max dHash bit difference for a frame to count as a
+                near duplicate of a recent one (0 = exact duplicates only)
+            recent_hashes: Stored images per session compared for near duplicates
+            max_indexed_sessions: Session manifests kept in memory for dedup and queries
+        """
+        self.root = root
+        self.max_queue = max_queue
+        self.near_duplicate_distance = near_duplicate_distance
+        self.recent_hashes = recent_hashes
+        self._queue: "queue.Queue[Optional[_WriteJob]]" = queue.Queue(maxsize=max_queue)
+        self._status: "OrderedDict[str, Tuple[str, Optional[EvidenceRecord]]]" = OrderedDict()
+        self._max_tracked = max_tracked
+        self._lock = threading.Lock()
+        self._indexes: SessionStore[_SessionIndex] = SessionStore(max_indexed_sessions, ttl_seconds=None)
+        self._index_lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._token = uuid.uuid4().hex[:6]
+        self._closed = False
+
+        self.submitted = 0
+        self.processed = 0
+        self.written = 0
+        self.duplicates = 0
+        self.near_duplicates = 0
+        self.failed = 0
+        self.rejected = 0
+        self.bytes_written = 0
+        self.bytes_deduplicated = 0
+        self.total_write_ms = 0.0
+        self.max_write_ms = 0.0
+        self.total_wait_ms = 0.0
+
+        EVIDENCE_QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._threads: List[threading.Thread] = []
+        for i in range(max(1, num_writers)):
+            thread = threading.Thread(target=self._run, name=f"evidence-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, session_id: str, data: bytes, extension: str = 'jpg',
+               received_at: Optional[float] = None,
+               metadata: Optional[Dict[str, Any]] = None) -> EvidenceHandle:
+        """
+        Queue an encoded image for writing and return at once.
+
+        Args:
+            session_id: Session or user the evidence belongs to
+            data: Original encoded image bytes (written unchanged)
+            extension: File extension matching the bytes
+            received_at: Receive time in seconds since the epoch (default: now)
+            metadata: Optional severity, cheating_types and summary for the manifest
+
+        Raises:
+            EvidenceQueueFull: If the queue is full
+            RuntimeError: If the writer has been closed
+        """
+        if self._closed:
+            raise RuntimeError("Evidence writer is closed")
+        received_at = time.time() if received_at is None else received_at
+        handle = self._new_handle(session_id, data, extension, received_at)
+
+        with self._lock:
+            self._track(handle.handle, 'queued')
+        try:
+            self._queue.put_nowait(_WriteJob(handle, data, metadata or {}, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._status.pop(handle.handle, None)
+                self.rejected += 1
+            EVIDENCE_FILES_TOTAL.inc('rejected')
+            raise EvidenceQueueFull(f"Evidence queue is full ({self.max_queue} images pending)")
+
+        with self._lock:
+            self.submitted += 1
+        return handle
+
+    def _new_handle(self, session_id: str, data: bytes, extension: str, received_at: float) -> EvidenceHandle:
+        session_dir = safe_session_name(session_id)
+        moment = datetime.fromtimestamp(received_at)
+        entry_id = f"{moment:%Y%m%d_%H%M%S_%f}_{self._token}-{next(self._sequence):06d}"
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.root, session_dir, 'objects', sha256[:2], f"{sha256}.{extension}")
+        return EvidenceHandle(f"{session_dir}/{entry_id}", path, session_id, sha256, received_at)
+
+    def _track(self, handle: str, status: str, record: Optional[EvidenceRecord] = None):
+        self._status[handle] = (status, record)
+        self._status.move_to_end(handle)
+        while len(self._status) > self._max_tracked:
+            self._status.popitem(last=False)
+
+    def status(self, handle: str) -> Optional[Dict[str, Any]]:
+        """Status (queued, written, failed) and manifest record of a recent handle; None if unknown"""
+        with self._lock:
+            entry = self._status.get(handle)
+        if entry is None:
+            return None
+        status, record = entry
+        return {'handle': handle, 'status': status, 'record': record.to_dict() if record is not None else None}
+
+    def _index(self, session_dir: str) -> _SessionIndex:
+        """The session's manifest index, loaded from manifest.jsonl on first use"""
+        with self._index_lock:
+            return self._indexes.get_or_create(session_dir, lambda: self._load_index(session_dir))
+
+    def _load_index(self, session_dir: str) -> _SessionIndex:
+        records = []
+        manifest = os.path.join(self.root, session_dir, MANIFEST_NAME)
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(EvidenceRecord(**json.loads(line)))
+                    except (TypeError, ValueError) as e:
+                        # A crash can leave a truncated last line; skip it
+                        logger.warning(f"Skipping bad manifest line in {manifest}: {e}")
+        return _SessionIndex(records, self.recent_hashes)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(job)
+            except Exception as e:
+                # A bad job must not take the writer thread down with it
+                logger.exception(f"Unexpected error writing evidence {job.handle.handle}: {e}")
+                self._fail(job)
+            finally:
+                self._queue.task_done()
+
+    def _fail(self, job: _WriteJob):
+        with self._lock:
+            self.failed += 1
+            self._track(job.handle.handle, 'failed')
+        EVIDENCE_FILES_TOTAL.inc('failed')
+
+    def _write(self, job: _WriteJob):
+        started = time.perf_counter()
+        handle = job.handle
+        session_dir = safe_session_name(handle.session_id)
+        index = self._index(session_dir)
+
+        try:
+            with index.lock:
+                duplicate, duplicate_of = None, None
+                relative = os.path.relpath(handle.path, self.root).replace(os.sep, '/')
+                phash = difference_hash(job.data) if self.near_duplicate_distance > 0 else None
+
+                existing = index.by_sha.get(handle.sha256)
+                if existing is not None and os.path.exists(os.path.join(self.root, existing.path)):
+                    duplicate, duplicate_of, relative = 'exact', existing.entry_id, existing.path
+                elif phash is not None:
+                    similar = index.near_duplicate(phash, self.near_duplicate_distance)
+                    if similar is not None:
+                        duplicate, duplicate_of, relative = 'near', similar.entry_id, similar.path
+
+                if duplicate is None:
+                    self._write_file(handle.path, job.data)
+
+                record = EvidenceRecord(
+                    entry_id=handle.handle.split('/', 1)[1],
+                    session_id=handle.session_id,
+                    timestamp=handle.received_at,
+                    sha256=handle.sha256,
+                    path=relative,
+                    size=len(job.data),
+                    duplicate=duplicate,
+                    duplicate_of=duplicate_of,
+                    phash=f"{phash:016x}" if phash is not None else None,
+                    severity=job.metadata.get('severity'),
+                    cheating_types=list(job.metadata.get('cheating_types') or []),
+                    summary=job.metadata.get('summary'),
+                )
+                self._append_manifest(session_dir, record)
+                index.add(record)
+        except OSError as e:
+            logger.error(f"Failed to write evidence {handle.handle}: {e}")
+            self._fail(job)
+            return
+
+        elapsed = time.perf_counter() - started
+        EVIDENCE_WRITE_SECONDS.observe(elapsed)
+        EVIDENCE_FILES_TOTAL.inc({None: 'written', 'exact': 'duplicate', 'near': 'near_duplicate'}[duplicate])
+        with self._lock:
+            self.processed += 1
+            if duplicate is None:
+                self.written += 1
+                self.bytes_written += len(job.data)
+            else:
+                self.duplicates += duplicate == 'exact'
+                self.near_duplicates += duplicate == 'near'
+                self.bytes_deduplicated += len(job.data)
+            self.total_write_ms += elapsed * 1000
+            self.max_write_ms = max(self.max_write_ms, elapsed * 1000)
+            self.total_wait_ms += (started - job.enqueued_at) * 1000
+            self._track(handle.handle, 'written', record)
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.part"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _append_manifest(self, session_dir: str, record: EvidenceRecord):
+        directory = os.path.join(self.root, session_dir)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, MANIFEST_NAME), 'a') as f:
+            f.write(json.dumps(record.to_dict(), separators=(',', ':')) + '\n')
+
+    def query(self, session_id: str, start: Optional[float] = None, end: Optional[float] = None,
+              cheating_type: Optional[str] = None, severity: Optional[str] = None,
+              limit: Optional[int] = None) -> List[EvidenceRecord]:
+        """
+        A session's evidence records from its manifest, oldest first.
+
+        Args:
+            session_id: Session or user the evidence was saved for
+            start: Only records at or after this time (seconds since the epoch)
+            end: Only records at or before this time
+            cheating_type: Only records listing this violation type
+            severity: Only records with this severity
+            limit: Return at most this many (the most recent ones)
+        """
+        index = self._index(safe_session_name(session_id))
+        with index.lock:
+            records = [
+                r for r in index.records
+                if r.session_id == session_id
+                and (start is None or r.timestamp >= start)
+                and (end is None or r.timestamp <= end)
+                and (cheating_type is None or cheating_type in r.cheating_types)
+                and (severity is None or r.severity == severity)
+            ]
+        records.sort(key=lambda r: r.timestamp)
+        return records[-limit:] if limit else records
+
+    def flush(self):
+        """Block until every queued image has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued, then stop the writer threads"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'submitted': self.submitted,
+                'written': self.written,
+                'duplicates': self.duplicates,
+                'near_duplicates': self.near_duplicates,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'bytes_written': self.bytes_written,
+                'bytes_deduplicated': self.bytes_deduplicated,
+                'avg_write_ms': round(self.total_write_ms / self.processed, 3) if self.processed else 0.0,
+                'max_write_ms': round(self.max_write_ms, 3),
+                'avg_queue_wait_ms': round(self.total_wait_ms / self.processed, 3) if self.processed else 0.0,
+                'indexed_sessions': len(self._indexes),
+            }
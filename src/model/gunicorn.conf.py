@@ -0,0 +1,13 @@
+"""
+Gunicorn settings for the proctoring server.
+
+Gunicorn loads this file from the working directory, e.g.
+
+    gunicorn -w 1 -k gthread --threads 32 -b 0.0.0.0:8080 app:app
+"""
+
+
+def post_worker_init(worker):
+    # Model warm-up starts in the serving process only, never at import (see app.start_model_warmup)
+    from app import start_model_warmup
+    start_model_warmup()
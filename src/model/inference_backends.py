@@ -0,0 +1,400 @@
+"""
+Alternative CPU inference backends for the YOLO detector.
+
+The PyTorch path of ultralytics is slow to start and not the fastest CPU
+runtime. This module exports the detector once to ONNX (or OpenVINO IR),
+caches the exported model on disk and runs it through ONNX Runtime / the
+OpenVINO runtime with an explicit thread count. Pre- and post-processing
+mirror ultralytics (minimal stride-multiple letterbox on the dynamic-shape
+export, class-aware NMS, box rescaling) so the detector builds the same
+Detection objects as on the PyTorch path.
+
+INT8 variants produced by quantization.py are loaded from the same cache
+directory with precision='int8' (ONNX Runtime only), together with ONNX
+Runtime adapters for the face net and the landmark model.
+
+Parity check against the PyTorch path:
+    python inference_backends.py --backend onnx --images images/
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Sequence
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_BACKENDS = ('torch', 'onnx', 'openvino')
+SUPPORTED_PRECISIONS = ('fp32', 'int8')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'exported')
+
+# ONNX face net / landmark model locations inside the cache directory
+FACE_NET_ONNX = 'face_net.onnx'
+LANDMARK_ONNX = 'pose_model.onnx'
+
+
+def quantized_path(path: str) -> str:
+    """INT8 counterpart of an ONNX model path (model.onnx -> model.int8.onnx)"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.int8{ext}"
+
+
+def create_ort_session(path: str, num_threads: Optional[int] = None):
+    """CPU ONNX Runtime session with full graph optimization and a fixed thread count"""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+
+def letterbox(image: np.ndarray, size: int, stride: Optional[int] = None) -> np.ndarray:
+    """
+    Resize and pad a BGR image the way ultralytics LetterBox does.
+
+    Without a stride the image is padded to size x size; with one, only up to
+    the next multiple of the stride (LetterBox(auto=True), what ultralytics
+    uses for PyTorch and dynamic-shape models).
+    """
+    h, w = image.shape[:2]
+    r = min(size / h, size / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    dw, dh = size - new_w, size - new_h
+    if stride:
+        dw, dh = dw % stride, dh % stride
+    dw, dh = dw / 2, dh / 2
+
+    if (w, h) != (new_w, new_h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                              value=(114, 114, 114))
+
+
+def scale_boxes(boxes: np.ndarray, input_shape, shape: Sequence[int]) -> np.ndarray:
+    """
+    Map xyxy boxes from the letterboxed input back onto the original image (in place).
+
+    Args:
+        boxes: (N, >=4) array whose first four columns are xyxy boxes
+        input_shape: (height, width) of the letterboxed input, or one int for a square input
+        shape: Shape of the original image
+    """
+    in_h, in_w = (input_shape, input_shape) if isinstance(input_shape, int) else input_shape[:2]
+    h, w = shape[:2]
+    gain = min(in_h / h, in_w / w)
+    new_h, new_w = round(h * gain), round(w * gain)
+    pad_x = round((in_w - new_w) / 2 - 0.1)
+    pad_y = round((in_h - new_h) / 2 - 0.1)
+    boxes[:, [0, 2]] -= pad_x
+    boxes[:, [1, 3]] -= pad_y
+    boxes[:, [0, 2]] /= new_w / w
+    boxes[:, [1, 3]] /= new_h / h
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+    return boxes
+
+
+class ExportedYOLO:
+    """
+    YOLOv8 detector running from an exported model file.
+
+    predict() returns, per image, an (N, 6) float32 array of
+    [x1, y1, x2, y2, confidence, class_id] in original image coordinates,
+    the same layout as ultralytics `results.boxes.data`.
+    """
+
+    def __init__(self, weights: str = 'yolov8n.pt', backend: str = 'onnx',
+                 cache_dir: Optional[str] = None, imgsz: int = 640,
+                 num_threads: Optional[int] = None, iou_threshold: float = 0.7,
+                 max_det: int = 300, precision: str = 'fp32', stride: int = 32):
+        """
+        Initialize the backend (call load() before predict()).
+
+        Args:
+            weights: PyTorch weights to export from
+            backend: 'onnx' or 'openvino'
+            cache_dir: Directory holding exported models (default: assets/exported)
+            imgsz: Square input size the model is exported at
+            num_threads: Intra-op thread count (None lets the runtime decide)
+            iou_threshold: IoU threshold for NMS (ultralytics default is 0.7)
+            max_det: Maximum detections kept per image
+            precision: 'fp32', or 'int8' to load the statically quantized
+                model created by quantization.py (onnx backend only)
+            stride: Largest model stride; same-sized batches are padded to a multiple of it
+        """
+        if backend not in ('onnx', 'openvino'):
+            raise ValueError(f"Unsupported export backend: {backend}")
+        if precision not in SUPPORTED_PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {SUPPORTED_PRECISIONS}")
+        if precision == 'int8' and backend != 'onnx':
+            raise ValueError("INT8 models are only supported on the onnx backend")
+        self.weights = weights
+        self.backend = backend
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.imgsz = imgsz
+        self.num_threads = num_threads
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+        self.precision = precision
+        self.stride = stride
+        self.names: Dict[int, str] = {}
+        self._infer = None
+
+    @property
+    def _stem(self) -> str:
+        return f"{os.path.splitext(os.path.basename(self.weights))[0]}_{self.imgsz}"
+
+    @property
+    def exported_path(self) -> str:
+        """Location of the cached exported model"""
+        if self.backend == 'onnx':
+            return os.path.join(self.cache_dir, f"{self._stem}.onnx")
+        return os.path.join(self.cache_dir, f"{self._stem}_openvino_model")
+
+    @property
+    def quantized_path(self) -> str:
+        """Location of the INT8 model created by quantization.py"""
+        return quantized_path(os.path.join(self.cache_dir, f"{self._stem}.onnx"))
+
+    @property
+    def _names_path(self) -> str:
+        return os.path.join(self.cache_dir, f"{self._stem}.names.json")
+
+    def export(self) -> str:
+        """Export the PyTorch weights once and cache the result"""
+        if os.path.exists(self.exported_path) and os.path.exists(self._names_path):
+            return self.exported_path
+
+        import shutil
+        from ultralytics import YOLO
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        model = YOLO(self.weights)
+        logger.info(f"Exporting {self.weights} to {self.backend} (imgsz={self.imgsz})")
+        exported = model.export(format=self.backend, imgsz=self.imgsz, dynamic=True, verbose=False)
+
+        if os.path.isdir(self.exported_path):
+            shutil.rmtree(self.exported_path)
+        elif os.path.exists(self.exported_path):
+            os.remove(self.exported_path)
+        shutil.move(str(exported), self.exported_path)
+
+        with open(self._names_path, 'w') as f:
+            json.dump({str(k): v for k, v in model.names.items()}, f)
+
+        logger.info(f"Cached exported model at {self.exported_path}")
+        return self.exported_path
+
+    def load(self):
+        """Export if needed, then create the runtime session"""
+        path = self.export()
+
+        with open(self._names_path) as f:
+            self.names = {int(k): v for k, v in json.load(f).items()}
+
+        if self.precision == 'int8':
+            path = self.quantized_path
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    f"No INT8 model at {path}; create it with "
+                    f"`python quantization.py --models yolo --calibration-dir <frames>`")
+
+        if self.backend == 'onnx':
+            session = create_ort_session(path, self.num_threads)
+            input_name = session.get_inputs()[0].name
+            self._infer = lambda batch: session.run(None, {input_name: batch})[0]
+        else:
+            import openvino as ov
+
+            core = ov.Core()
+            xml = next(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.xml'))
+            config = {'INFERENCE_NUM_THREADS': self.num_threads} if self.num_threads else {}
+            compiled = core.compile_model(core.read_model(xml), 'CPU', config)
+            output = compiled.output(0)
+            self._infer = lambda batch: compiled(batch)[output]
+
+        logger.info(f"Loaded {self.backend} {self.precision} YOLO backend from {path} "
+                    f"(threads={self.num_threads or 'auto'})")
+
+    def preprocess(self, images: List[np.ndarray]) -> np.ndarray:
+        """
+        Letterbox, BGR->RGB, HWC->CHW and scale a list of images into one batch.
+
+        Like the ultralytics predictor, a batch of same-sized images gets minimal
+        stride-multiple padding (the model is exported with dynamic shapes);
+        mixed sizes are padded to the square imgsz.
+        """
+        same_shapes = len({image.shape for image in images}) == 1
+        stride = self.stride if same_shapes else None
+        batch = np.stack([letterbox(image, self.imgsz, stride) for image in images])
+        batch = batch[..., ::-1].transpose(0, 3, 1, 2)
+        return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+    def postprocess(self, predictions: np.ndarray, shape: Sequence[int], conf: float,
+                    classes: Optional[Sequence[int]] = None,
+                    input_shape: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Decode one image's raw (4 + nc, anchors) output into an (N, 6) array.
+
+        input_shape is the (height, width) of the letterboxed input (default: square imgsz).
+        """
+        predictions = predictions.T
+        scores = predictions[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+
+        keep = confidences > conf
+        if classes is not None:
+            keep &= np.isin(class_ids, classes)
+        if not keep.any():
+            return np.zeros((0, 6), dtype=np.float32)
+
+        xywh = predictions[keep, :4]
+        confidences = confidences[keep]
+        class_ids = class_ids[keep]
+
+        # Top-left xywh for OpenCV NMS; class-aware like ultralytics
+        tl_boxes = xywh.copy()
+        tl_boxes[:, :2] -= xywh[:, 2:] / 2
+        indices = cv2.dnn.NMSBoxesBatched(tl_boxes.tolist(), confidences.tolist(),
+                                          class_ids.tolist(), conf, self.iou_threshold)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)[:self.max_det]
+
+        out = np.empty((len(indices), 6), dtype=np.float32)
+        out[:, 0:2] = tl_boxes[indices, :2]
+        out[:, 2:4] = tl_boxes[indices, :2] + xywh[indices, 2:]
+        out[:, 4] = confidences[indices]
+        out[:, 5] = class_ids[indices]
+        scale_boxes(out, input_shape if input_shape is not None else self.imgsz, shape)
+        return out
+
+    def predict(self, images: List[np.ndarray], conf: float = 0.25,
+                classes: Optional[Sequence[int]] = None) -> List[np.ndarray]:
+        """Run detection on a batch of BGR images"""
+        if self._infer is None:
+            raise RuntimeError("Backend not loaded; call load() first")
+        batch = self.preprocess(images)
+        raw = self._infer(batch)
+        return [self.postprocess(raw[i], image.shape, conf, classes, batch.shape[2:])
+                for i, image in enumerate(images)]
+
+
+class OnnxFaceNet:
+    """
+    Face SSD running in ONNX Runtime behind the cv2.dnn.Net setInput/forward API.
+
+    Expects an ONNX conversion of res10_300x300_ssd that keeps the SSD
+    detection output, so forward() returns the same (1, 1, N, 7) layout as
+    the Caffe net.
+    """
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        self.path = path
+        self._session = create_ort_session(path, num_threads)
+        self.input_name = self._session.get_inputs()[0].name
+        self.input_dtype = np.float32
+        self._blob: Optional[np.ndarray] = None
+
+        probe = self._session.run(None, {self.input_name: np.zeros((1, 3, 300, 300), self.input_dtype)})[0]
+        if probe.shape[-1] != 7:
+            raise ValueError(f"{path} does not produce SSD detections (output shape {probe.shape})")
+
+    def setInput(self, blob: np.ndarray):
+        self._blob = blob
+
+    def forward(self) -> np.ndarray:
+        output = self._session.run(None, {self.input_name: self._blob})[0]
+        return output.reshape(1, 1, -1, 7)
+
+
+class OnnxLandmarkModel:
+    """Facial landmark CNN exported from Keras, with a Keras-like predict()"""
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        self.path = path
+        self._session = create_ort_session(path, num_threads)
+        model_input = self._session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = np.uint8 if model_input.type == 'tensor(uint8)' else np.float32
+
+    def predict(self, inputs, verbose: int = 0) -> np.ndarray:
+        batch = np.asarray(inputs).astype(self.input_dtype, copy=False)
+        return self._session.run(None, {self.input_name: batch})[0]
+
+
+def compare_backends(image_paths: List[str], backend: str, weights: str = 'yolov8n.pt',
+                     confidence_threshold: float = 0.4, iou_match: float = 0.5,
+                     num_threads: Optional[int] = None) -> bool:
+    """
+    Check that an exported backend produces the same Detection objects as PyTorch.
+
+    Detections are matched by class and IoU; confidences must agree within 0.05.
+
+    Returns:
+        True if every image matched
+    """
+    from cheating_detector import YOLOCheatingDetector
+
+    reference = YOLOCheatingDetector(weights, confidence_threshold, backend='torch')
+    candidate = YOLOCheatingDetector(weights, confidence_threshold, backend=backend,
+                                     num_threads=num_threads)
+    if not (reference.initialize() and candidate.initialize()):
+        print("Failed to initialize detectors")
+        return False
+
+    def iou(a, b):
+        ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+        iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+        inter = ix * iy
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+        return inter / union if union > 0 else 0.0
+
+    all_ok = True
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        expected = reference.detect_objects(image)
+        actual = list(candidate.detect_objects(image))
+
+        unmatched = []
+        for det in expected:
+            match = next((a for a in actual if a.class_name == det.class_name
+                          and iou(a.bbox, det.bbox) >= iou_match
+                          and abs(a.confidence - det.confidence) <= 0.05), None)
+            if match is None:
+                unmatched.append(det)
+            else:
+                actual.remove(match)
+
+        ok = not unmatched and not actual
+        all_ok &= ok
+        print(f"{'OK  ' if ok else 'FAIL'} {os.path.basename(path)}: "
+              f"{len(expected)} reference, {len(unmatched)} missing, {len(actual)} extra")
+
+    return all_ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare an exported YOLO backend against PyTorch")
+    parser.add_argument('--backend', choices=('onnx', 'openvino'), default='onnx')
+    parser.add_argument('--weights', default='yolov8n.pt')
+    parser.add_argument('--images', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images'))
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.images, f) for f in os.listdir(args.images)
+                   if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    sys.exit(0 if compare_backends(paths, args.backend, args.weights, num_threads=args.threads) else 1)
@@ -1,4 +1,6 @@
 """Human facial landmark detector based on Convolutional Neural Network."""
+import threading
+
 import cv2
 import numpy as np
 import tensorflow as tf
@@ -15,18 +17,26 @@ class FaceDetector:
         self.face_net = cv2.dnn.readNetFromCaffe(dnn_proto_text, dnn_model)
         self.detection_result = None
 
-    def get_faceboxes(self, image, threshold=0.5):
+    def get_faceboxes(self, image, threshold=0.5, detections=None):
         """
         Get the bounding box of faces in image using dnn.
+
+        Args:
+            image: BGR image.
+            threshold: minimum face confidence.
+            detections: optional SSD output for this frame (e.g. from
+                `FrameContext.face_detections`); the network is only run when
+                this is None.
         """
         rows, cols, _ = image.shape
 
         confidences = []
         faceboxes = []
 
-        self.face_net.setInput(cv2.dnn.blobFromImage(
-            image, 1.0, (300, 300), (104.0, 177.0, 123.0), False, False))
-        detections = self.face_net.forward()
+        if detections is None:
+            self.face_net.setInput(cv2.dnn.blobFromImage(
+                image, 1.0, (300, 300), (104.0, 177.0, 123.0), False, False))
+            detections = self.face_net.forward()
 
         for result in detections[0, 0, :, :]:
             confidence = result[2]
@@ -63,16 +73,51 @@ class FaceDetector:
 class MarkDetector:
     """Facial landmark detector by Convolutional Neural Network"""
 
-    def __init__(self, saved_model='assets/pose_model'):
-        """Initialization"""
+    def __init__(self, saved_model='assets/pose_model', onnx_model=None, max_batch=8):
+        """Initialization
+
+        Args:
+            saved_model: Keras saved model directory.
+            onnx_model: optional ONNX export of the same model (e.g. the INT8
+                variant written by quantization.py), run with ONNX Runtime
+                instead of Keras.
+            max_batch: face crops per model call; also the size of the
+                preallocated input buffer.
+        """
         # A face detector is required for mark detection.
         self.face_detector = FaceDetector()
 
         self.cnn_input_size = 128
         self.marks = None
-
-        # Restore model from the saved_model file.
-        self.model = keras.models.load_model(saved_model)
+        self.max_batch = max_batch
+
+        if onnx_model is not None:
+            from inference_backends import OnnxLandmarkModel
+            self.model = OnnxLandmarkModel(onnx_model)
+            input_dtype = self.model.input_dtype
+            self._infer = self.model.predict
+        else:
+            # Restore model from the saved_model file.
+            self.model = keras.models.load_model(saved_model)
+            model_inputs = getattr(self.model, 'inputs', None)
+            tf_dtype = model_inputs[0].dtype if model_inputs else tf.uint8
+            input_dtype = tf_dtype.as_numpy_dtype
+
+            # model.predict() sets up data adapters and callbacks on every
+            # call, which costs far more than the network itself for a few
+            # crops. A tf.function with a fixed signature is traced once.
+            @tf.function(input_signature=[tf.TensorSpec(
+                [None, self.cnn_input_size, self.cnn_input_size, 3], tf_dtype)])
+            def infer(images):
+                return self.model(images, training=False)
+
+            self._infer = lambda batch: infer(batch).numpy()
+
+        # Crops are resized straight into this buffer; the lock keeps
+        # concurrent callers from sharing it.
+        self._input_buffer = np.empty(
+            (max_batch, self.cnn_input_size, self.cnn_input_size, 3), dtype=input_dtype)
+        self._buffer_lock = threading.Lock()
 
     @staticmethod
     def draw_box(image, boxes, box_color=(255, 255, 255)):
@@ -131,11 +176,31 @@ class MarkDetector:
         cols = image.shape[1]
         return box[0] >= 0 and box[1] >= 0 and box[2] <= cols and box[3] <= rows
 
-    def extract_cnn_facebox(self, image):
-        """Extract face area from image."""
+    def extract_cnn_facebox(self, image, detections=None):
+        """Extract face area from image.
+
+        Args:
+            image: BGR image.
+            detections: optional precomputed SSD output for this frame.
+        """
+        faceboxes = self.extract_cnn_faceboxes(image, detections)
+        return faceboxes[0] if faceboxes else None
+
+    def extract_cnn_faceboxes(self, image, detections=None, threshold=0.9):
+        """Extract every face area that fits in the image.
+
+        Args:
+            image: BGR image.
+            detections: optional precomputed SSD output for this frame.
+            threshold: minimum face confidence.
+
+        Returns:
+            faceboxes: list of square [x1, y1, x2, y2] boxes.
+        """
         _, raw_boxes = self.face_detector.get_faceboxes(
-            image=image, threshold=0.9)
+            image=image, threshold=threshold, detections=detections)
 
+        faceboxes = []
         for box in raw_boxes:
             # Move box down.
             offset_y = int(abs((box[3] - box[1]) * 0.12))
@@ -145,9 +210,9 @@ class MarkDetector:
             facebox = self.get_square_box(box_moved)
 
             if self.box_in_image(facebox, image):
-                return facebox
+                faceboxes.append(facebox)
 
-        return None
+        return faceboxes
 
     def detect_marks(self, image):
         """Detect facial marks from an face image.
@@ -158,18 +223,37 @@ class MarkDetector:
         Returns:
             marks: the facial marks as a numpy array of shape [N, 2].
         """
-        # Resize the image into fix size.
-        image = cv2.resize(image, (128, 128))
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        inputs = tf.expand_dims(image, axis=0)
+        return self.detect_marks_batch([image])[0]
+
+    def detect_marks_batch(self, images):
+        """Detect facial marks for several face images in as few model calls
+        as possible (max_batch crops per call).
+
+        Args:
+            images: list of face images (any size, BGR).
+
+        Returns:
+            marks: list of numpy arrays of shape [N, 2], one per image.
+        """
+        size = (self.cnn_input_size, self.cnn_input_size)
+        results = []
+
+        with self._buffer_lock:
+            for start in range(0, len(images), self.max_batch):
+                chunk = images[start:start + self.max_batch]
+                for i, image in enumerate(chunk):
+                    # Resize the image into fix size.
+                    face = cv2.resize(image, size)
+                    self._input_buffer[i] = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
 
-        # Actual detection.
-        marks = self.model.predict(inputs)
+                # Actual detection.
+                marks = self._infer(self._input_buffer[:len(chunk)])
 
-        # Convert predictions to landmarks.
-        marks = np.reshape(marks, (-1, 2))
+                # Convert predictions to landmarks.
+                marks = np.reshape(marks, (len(chunk), -1, 2))
+                results.extend(marks)
 
-        return marks
+        return results
 
     @staticmethod
     def draw_marks(image, marks, color=(255, 255, 255)):
@@ -0,0 +1,251 @@
+"""
+Low-overhead metrics for the proctoring pipeline.
+
+Counters, gauges and histograms rendered in Prometheus text exposition
+format by GET /metrics. Recording costs a perf_counter call, a bisect and a
+lock acquire (a few microseconds), so instrumentation stays always-on.
+
+`stage_timer` also adds its measurement to the per-request timing dict when
+one is active (see `start_request_timings`), which feeds the X-Timing header.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds (1 ms .. 5 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_timings', default=None)
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base class holding name, help text and label names"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self._header()
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally computed on scrape"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, fn: Callable[[], float], *labels: str):
+        """Compute the value with fn() each time metrics are scraped"""
+        with self._lock:
+            self._functions[labels] = fn
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for labels, fn in functions.items():
+            try:
+                values[labels] = float(fn())
+            except Exception:
+                continue
+        lines = self._header()
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed distribution"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        lines = self._header()
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'proctor_stage_seconds', 'Latency of individual pipeline stages', ('stage',)))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'proctor_request_seconds', 'End-to-end HTTP request latency', ('endpoint',)))
+DETECTIONS_TOTAL = REGISTRY.register(Counter(
+    'proctor_detections_total', 'Objects detected by YOLO, per class', ('class_name',)))
+FRAMES_TOTAL = REGISTRY.register(Counter(
+    'proctor_frames_total', 'Frames analysed, per severity', ('severity',)))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'proctor_inference_queue_depth', 'Frames waiting for inference', ('queue',)))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    'proctor_model_load_seconds', 'Time taken to load each model', ('model',)))
+WARMUP_SECONDS = REGISTRY.register(Gauge(
+    'proctor_model_warmup_seconds', 'Time taken by warm-up inferences per input size', ('model', 'size')))
+EVIDENCE_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'proctor_evidence_queue_depth', 'Evidence images waiting to be written'))
+EVIDENCE_WRITE_SECONDS = REGISTRY.register(Histogram(
+    'proctor_evidence_write_seconds', 'Time taken to write one evidence image to disk'))
+EVIDENCE_FILES_TOTAL = REGISTRY.register(Counter(
+    'proctor_evidence_files_total', 'Evidence images by outcome', ('status',)))
+MOTION_GATE_FRAMES_TOTAL = REGISTRY.register(Counter(
+    'proctor_motion_gate_frames_total', 'Session frames seen by the motion gate, by outcome', ('result',)))
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Time a block, record it in STAGE_SECONDS and the active request timings"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed * 1000
+
+
+def observe_stage(stage: str, elapsed_ms: float):
+    """Record a stage duration measured elsewhere (milliseconds)"""
+    STAGE_SECONDS.observe(elapsed_ms / 1000, stage)
+    add_request_timing(stage, elapsed_ms)
+
+
+def add_request_timing(stage: str, elapsed_ms: float):
+    """
+    Add a duration to the active request timings only.
+
+    For work already recorded in STAGE_SECONDS on another thread, such as a
+    batched YOLO call shared by several requests.
+    """
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + elapsed_ms
+
+
+def start_request_timings() -> Dict[str, float]:
+    """Begin collecting per-stage timings for the current request"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def end_request_timings() -> Optional[Dict[str, float]]:
+    """Stop collecting and return the current request's timings"""
+    timings = _request_timings.get()
+    _request_timings.set(None)
+    return timings
+
+
+def format_timing_header(timings: Dict[str, float]) -> str:
+    """Render timings as 'stage=1.234,other=5.678' (milliseconds)"""
+    return ",".join(f"{stage}={ms:.3f}" for stage, ms in timings.items())
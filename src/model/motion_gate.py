@@ -0,0 +1,138 @@
+"""
+Motion-gated frame skipping for the cheating analysis pipeline.
+
+Consecutive proctoring frames from one student are usually nearly identical.
+The gate keeps a tiny grayscale signature of the last fully analysed frame
+per session; when no block of a new frame differs by more than a threshold
+(a whole-frame mean would dilute a phone appearing in one corner), the cached
+CheatingAnalysis is returned with a fresh timestamp instead of running YOLO,
+the face net and head pose again. A full analysis is still forced every
+`max_reuse_seconds` so nothing can hide behind a static scene for long.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+from cheating_detector import CheatingAnalysis
+from metrics import MOTION_GATE_FRAMES_TOTAL
+from session_state import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _GateState:
+    """Last fully analysed frame for a session"""
+    signature: np.ndarray
+    analysis: CheatingAnalysis
+    analysed_at: float
+    analysis_ms: float
+
+
+class MotionGate:
+    """Per-session change detector in front of YOLOCheatingDetector.analyze_frame"""
+
+    def __init__(self, threshold: float = 6.0, max_reuse_seconds: float = 5.0,
+                 signature_size: Tuple[int, int] = (32, 24), block_size: int = 2,
+                 max_sessions: int = 1000, session_ttl: float = 900.0):
+        """
+        Initialize the gate.
+
+        Args:
+            threshold: Largest per-block mean absolute grayscale difference (0-255)
+                below which a frame counts as unchanged
+            max_reuse_seconds: Longest time a cached analysis may be reused
+            signature_size: (width, height) of the downscaled signature
+            block_size: Side in signature pixels of the blocks compared (2 at 32x24
+                means each block covers 1/192 of the frame)
+            max_sessions: Sessions tracked before least recently used ones are evicted
+            session_ttl: Idle seconds after which a session's cached frame is dropped
+        """
+        self.threshold = threshold
+        self.max_reuse_seconds = max_reuse_seconds
+        self.signature_size = signature_size
+        self.block_size = max(1, block_size)
+        self._states: SessionStore[_GateState] = SessionStore(max_sessions, session_ttl)
+        self._stats_lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.forced = 0
+        self.time_saved_ms = 0.0
+
+    def compute_signature(self, image: np.ndarray) -> np.ndarray:
+        """Downscaled grayscale signature of a BGR frame"""
+        # Shrink before converting so the color conversion touches few pixels
+        small = cv2.resize(image, self.signature_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def difference(self, a: np.ndarray, b: np.ndarray) -> float:
+        """Largest block mean of the absolute difference between two signatures"""
+        diff = cv2.absdiff(a, b).astype(np.float32)
+        h, w = diff.shape[:2]
+        blocks = (max(1, w // self.block_size), max(1, h // self.block_size))
+        return float(cv2.resize(diff, blocks, interpolation=cv2.INTER_AREA).max())
+
+    def analyze(self, session_id: str, image: np.ndarray, timestamp: str,
+                analyze_fn: Callable[[np.ndarray, str], CheatingAnalysis]) -> Tuple[CheatingAnalysis, bool]:
+        """
+        Analyse a frame, reusing the session's cached analysis when the scene is unchanged.
+
+        Args:
+            session_id: Test session identifier
+            image: BGR image (OpenCV format)
+            timestamp: Timestamp for the returned analysis
+            analyze_fn: Full analysis callable, run when the frame has changed
+
+        Returns:
+            Tuple of (analysis, reused) where reused is True if the cached result was returned
+        """
+        signature = self.compute_signature(image)
+        state = self._states.get(session_id)
+        now = time.monotonic()
+
+        if state is not None and state.signature.shape == signature.shape:
+            expired = now - state.analysed_at >= self.max_reuse_seconds
+            if not expired and self.difference(signature, state.signature) < self.threshold:
+                with self._stats_lock:
+                    self.frames += 1
+                    self.skipped += 1
+                    self.time_saved_ms += state.analysis_ms
+                MOTION_GATE_FRAMES_TOTAL.inc('skipped')
+                return replace(state.analysis, timestamp=timestamp, timings=None), True
+            if expired:
+                with self._stats_lock:
+                    self.forced += 1
+
+        started = time.perf_counter()
+        analysis = analyze_fn(image, timestamp)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self._states.set(session_id, _GateState(signature, analysis, now, elapsed_ms))
+        with self._stats_lock:
+            self.frames += 1
+        MOTION_GATE_FRAMES_TOTAL.inc('passed')
+        return analysis, False
+
+    def reset(self, session_id: str):
+        """Forget a session's cached frame"""
+        self._states.pop(session_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Skip rate and estimated time saved"""
+        with self._stats_lock:
+            return {
+                'frames': self.frames,
+                'skipped': self.skipped,
+                'forced_reanalysis': self.forced,
+                'skip_rate': round(self.skipped / self.frames, 4) if self.frames else 0.0,
+                'time_saved_ms': round(self.time_saved_ms, 1),
+                'sessions': len(self._states),
+            }
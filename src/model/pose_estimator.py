@@ -2,11 +2,25 @@
 import cv2
 import numpy as np
 
+from camera_intrinsics import default_registry
+from pose_geometry import head_pose_from_angles, rotation_vectors_to_euler
+from session_state import SessionStore
+
 
 class PoseEstimator:
     """Estimate head pose according to the facial landmarks"""
 
-    def __init__(self, img_size=(480, 640)):
+    def __init__(self, img_size=(480, 640), max_sessions=1000, session_ttl=900.0,
+                 intrinsics=None):
+        """Initialization
+
+        Args:
+            img_size: default (height, width) of the frames, used when a call
+                does not pass frame_size.
+            max_sessions: sessions whose last pose is kept as solvePnP warm start.
+            session_ttl: idle seconds after which a session's pose is dropped.
+            intrinsics: IntrinsicsRegistry (defaults to the process-wide one).
+        """
         self.size = img_size
 
         # 3D model points.
@@ -21,16 +35,15 @@ class PoseEstimator:
 
         self.model_points_68 = self._get_full_model_points()
 
-        # Camera internals
+        # Camera internals, shared with the other pose estimators per resolution
+        self.intrinsics = intrinsics or default_registry
+        default_camera = self.intrinsics.get(self.size[1], self.size[0])
         self.focal_length = self.size[1]
         self.camera_center = (self.size[1] / 2, self.size[0] / 2)
-        self.camera_matrix = np.array(
-            [[self.focal_length, 0, self.camera_center[0]],
-             [0, self.focal_length, self.camera_center[1]],
-             [0, 0, 1]], dtype="double")
+        self.camera_matrix = default_camera.camera_matrix
 
         # Assuming no lens distortion
-        self.dist_coeefs = np.zeros((4, 1))
+        self.dist_coeefs = default_camera.dist_coeffs
 
         # Rotation vector and translation vector
         self.r_vec = np.array([[0.01891013], [0.08560084], [-3.14392813]])
@@ -39,6 +52,10 @@ class PoseEstimator:
         # self.r_vec = None
         # self.t_vec = None
 
+        # Last pose of each session as [r_vec, t_vec] (6 floats), so every
+        # student's solvePnP starts from their own previous pose.
+        self._session_poses = SessionStore(max_sessions, session_ttl)
+
     def _get_full_model_points(self, filename='assets/model.txt'):
         """Get all 68 3D model points from file"""
         raw_value = []
@@ -88,11 +105,18 @@ class PoseEstimator:
         #     useExtrinsicGuess=True)
         return (rotation_vector, translation_vector)
 
-    def solve_pose_by_68_points(self, image_points):
+    def solve_pose_by_68_points(self, image_points, session_id=None, frame_size=None):
         """
         Solve pose from all the 68 image points
         Return (rotation_vector, translation_vector) as pose.
+
+        With a session_id, solvePnP is warm-started from that session's last
+        pose instead of the guess shared by every caller. frame_size
+        (width, height) selects the camera intrinsics for that resolution.
         """
+        if session_id is not None or frame_size is not None:
+            r_vecs, t_vecs = self.solve_poses_by_68_points(image_points, [session_id], frame_size)
+            return (r_vecs[0].reshape(3, 1), t_vecs[0].reshape(3, 1))
 
         if self.r_vec is None:
             (_, rotation_vector, translation_vector) = cv2.solvePnP(
@@ -111,6 +135,80 @@ class PoseEstimator:
 
         return (rotation_vector, translation_vector)
 
+    def _initial_guess(self, session_id=None):
+        """Extrinsic guess as (r_vec, t_vec) copies, or None to solve from scratch"""
+        if session_id is not None:
+            pose = self._session_poses.get(session_id)
+            if pose is not None:
+                return pose[:3].reshape(3, 1).copy(), pose[3:].reshape(3, 1).copy()
+        if self.r_vec is None:
+            return None
+        return self.r_vec.copy(), self.t_vec.copy()
+
+    def _camera(self, frame_size=None, session_id=None):
+        """(camera_matrix, dist_coeffs) for a frame size and session"""
+        if frame_size is None and session_id is None:
+            return self.camera_matrix, self.dist_coeefs
+        width, height = frame_size if frame_size is not None else (self.size[1], self.size[0])
+        intrinsics = self.intrinsics.get(width, height, session_id)
+        return intrinsics.camera_matrix, intrinsics.dist_coeffs
+
+    def reset_session(self, session_id):
+        """Forget a session's last pose"""
+        self._session_poses.pop(session_id)
+
+    def solve_poses_by_68_points(self, marks, session_ids=None, frame_size=None):
+        """
+        Solve pose for several faces from their 68 image points each.
+
+        Faces with a session ID start from that session's last pose (and
+        update it); the others start from the shared extrinsic guess. solvePnP
+        writes its result into the guess arrays, so each face gets its own
+        copy.
+
+        Args:
+            marks: array of shape [N, 68, 2] in image coordinates.
+            session_ids: optional list of N session IDs (None entries allowed).
+            frame_size: optional (width, height) of the frame the marks come
+                from; defaults to img_size.
+
+        Returns:
+            (rotation_vectors, translation_vectors), each of shape [N, 3].
+        """
+        marks = np.asarray(marks, dtype=np.float64).reshape(-1, 68, 2)
+        if session_ids is None:
+            session_ids = [None] * len(marks)
+        rotation_vectors = np.empty((len(marks), 3))
+        translation_vectors = np.empty((len(marks), 3))
+
+        for i, (image_points, session_id) in enumerate(zip(marks, session_ids)):
+            guess = self._initial_guess(session_id)
+            camera_matrix, dist_coeffs = self._camera(frame_size, session_id)
+            if guess is None:
+                (success, r_vec, t_vec) = cv2.solvePnP(
+                    self.model_points_68, image_points, camera_matrix, dist_coeffs)
+            else:
+                (success, r_vec, t_vec) = cv2.solvePnP(
+                    self.model_points_68,
+                    image_points,
+                    camera_matrix,
+                    dist_coeffs,
+                    rvec=guess[0],
+                    tvec=guess[1],
+                    useExtrinsicGuess=True)
+            rotation_vectors[i] = r_vec.ravel()
+            translation_vectors[i] = t_vec.ravel()
+
+            if session_id is not None:
+                pose = np.concatenate([rotation_vectors[i], translation_vectors[i]])
+                if success and np.isfinite(pose).all():
+                    self._session_poses.set(session_id, pose)
+                else:
+                    # Do not warm-start the next frame from a diverged solution
+                    self._session_poses.pop(session_id)
+
+        return (rotation_vectors, translation_vectors)
+
     def draw_annotation_box(self, image, rotation_vector, translation_vector, color=(255, 255, 255), line_width=2):
         """Draw a 3D box as annotation of pose"""
         # point_3d = []
@@ -201,4 +299,43 @@ class PoseEstimator:
         pose_marks.append(marks[45])    # Right eye right corner
         pose_marks.append(marks[48])    # Mouth left corner
         pose_marks.append(marks[54])    # Mouth right corner
-        return pose_marks
\ No newline at end of file
+        return pose_marks
+
+
+def estimate_head_poses(image, mark_detector, pose_estimator, detections=None, session_id=None):
+    """
+    Head pose of every face in the image.
+
+    All face crops go through the landmark model in one batch, and the Euler
+    angles of all faces are computed in one vectorized step, so a frame with
+    several people costs about as much as a single-face frame.
+
+    Args:
+        image: BGR image.
+        mark_detector: MarkDetector instance.
+        pose_estimator: PoseEstimator instance.
+        detections: optional precomputed SSD output for this frame.
+        session_id: optional session ID; the first (most confident) face is
+            warm-started from that session's last pose.
+
+    Returns:
+        (faceboxes, head_poses): parallel lists, one entry per face.
+    """
+    faceboxes = mark_detector.extract_cnn_faceboxes(image, detections)
+    if not faceboxes:
+        return [], []
+
+    boxes = np.array(faceboxes, dtype=np.float64)
+    crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in faceboxes]
+    marks = np.stack(mark_detector.detect_marks_batch(crops))
+
+    # Landmarks are relative to the 128x128 crop; map them back to the image.
+    sizes = boxes[:, 2] - boxes[:, 0]
+    marks = marks * sizes[:, None, None] + boxes[:, None, :2]
+
+    session_ids = [session_id] + [None] * (len(faceboxes) - 1)
+    frame_size = (image.shape[1], image.shape[0])
+    rotation_vectors, _ = pose_estimator.solve_poses_by_68_points(marks, session_ids, frame_size)
+    angles = rotation_vectors_to_euler(rotation_vectors)
+
+    return faceboxes, [head_pose_from_angles(*face_angles) for face_angles in angles]
@@ -0,0 +1,102 @@
+"""
+Vectorized rotation helpers for head pose estimation.
+
+Turning a solvePnP rotation into Euler angles with cv2.Rodrigues and
+cv2.RQDecomp3x3 costs two OpenCV calls per face. These functions convert any
+number of rotations in one NumPy pass, using the cv2.RQDecomp3x3 convention:
+R = Rz(roll) @ Ry(yaw) @ Rx(pitch), angles in degrees.
+
+HeadPose and head_pose_from_angles are shared by every head pose estimator
+so they all classify gaze direction the same way; the thresholds default to
+YOLOCheatingDetector's and can be overridden per estimator.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# Gaze direction thresholds (in degrees)
+PITCH_THRESHOLD_UP = -15
+PITCH_THRESHOLD_DOWN = 15
+YAW_THRESHOLD = 20
+ROLL_THRESHOLD = 25
+
+
+@dataclass
+class HeadPose:
+    """Head pose estimation results"""
+    pitch: float  # Up/Down
+    yaw: float    # Left/Right
+    roll: float   # Tilt
+    looking_straight: bool = True
+    direction: str = "straight"
+
+
+def head_pose_from_angles(pitch: float, yaw: float, roll: float, mirrored: bool = False,
+                          pitch_up: float = PITCH_THRESHOLD_UP,
+                          pitch_down: float = PITCH_THRESHOLD_DOWN,
+                          yaw_threshold: float = YAW_THRESHOLD) -> HeadPose:
+    """
+    HeadPose with the gaze direction classified from Euler angles.
+
+    Args:
+        pitch, yaw, roll: Angles in degrees
+        mirrored: Positive yaw means the subject looks left rather than right
+            (MediaPipe landmarks in image coordinates)
+        pitch_up: Pitch below which the subject looks up
+        pitch_down: Pitch above which the subject looks down
+        yaw_threshold: Absolute yaw above which the subject looks left/right
+    """
+    direction = "straight"
+    looking_straight = True
+
+    if pitch < pitch_up:
+        direction = "up"
+        looking_straight = False
+    elif pitch > pitch_down:
+        direction = "down"
+        looking_straight = False
+
+    if abs(yaw) > yaw_threshold:
+        direction = "left" if (yaw < 0) != mirrored else "right"
+        looking_straight = False
+
+    return HeadPose(
+        pitch=round(float(pitch), 2),
+        yaw=round(float(yaw), 2),
+        roll=round(float(roll), 2),
+        looking_straight=looking_straight,
+        direction=direction
+    )
+
+
+def rodrigues(r_vecs: np.ndarray) -> np.ndarray:
+    """(N, 3) axis-angle rotation vectors -> (N, 3, 3) rotation matrices"""
+    r_vecs = np.asarray(r_vecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(r_vecs, axis=1)
+    axis = r_vecs / np.maximum(theta, 1e-12)[:, None]
+    x, y, z = axis[:, 0], axis[:, 1], axis[:, 2]
+    zeros = np.zeros_like(x)
+    # Cross-product matrices K so that R = I + sin(t) K + (1 - cos(t)) K^2
+    k = np.stack([
+        np.stack([zeros, -z, y], axis=1),
+        np.stack([z, zeros, -x], axis=1),
+        np.stack([-y, x, zeros], axis=1),
+    ], axis=1)
+    sin = np.sin(theta)[:, None, None]
+    cos = np.cos(theta)[:, None, None]
+    return np.eye(3) + sin * k + (1 - cos) * (k @ k)
+
+
+def rotation_matrices_to_euler(matrices: np.ndarray) -> np.ndarray:
+    """(N, 3, 3) rotation matrices -> (N, 3) pitch, yaw, roll in degrees"""
+    m = np.asarray(matrices, dtype=np.float64).reshape(-1, 3, 3)
+    pitch = np.arctan2(m[:, 2, 1], m[:, 2, 2])
+    yaw = np.arctan2(-m[:, 2, 0], np.hypot(m[:, 2, 1], m[:, 2, 2]))
+    roll = np.arctan2(m[:, 1, 0], m[:, 0, 0])
+    return np.degrees(np.stack([pitch, yaw, roll], axis=1))
+
+
+def rotation_vectors_to_euler(r_vecs: np.ndarray) -> np.ndarray:
+    """(N, 3) rotation vectors -> (N, 3) pitch, yaw, roll in degrees"""
+    return rotation_matrices_to_euler(rodrigues(r_vecs))
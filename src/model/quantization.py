@@ -0,0 +1,450 @@
+"""
+INT8 static quantization of the proctoring models with an accuracy/latency report.
+
+Produces ONNX Runtime INT8 (QDQ) variants calibrated on a local folder of
+frames, next to the FP32 ONNX models in assets/exported/:
+
+- YOLO detector: exported from the PyTorch weights, quantized with the
+  box/class decoding of the detection head kept in FP32
+  (yolov8n_640.onnx -> yolov8n_640.int8.onnx)
+- Landmark CNN used by MarkDetector: converted from the Keras saved model
+  with tf2onnx (pose_model.onnx -> pose_model.int8.onnx)
+- Face SSD: OpenCV's Caffe res10 model has no in-tree ONNX exporter, so an
+  ONNX conversion that keeps the SSD detection output has to be placed at
+  assets/exported/face_net.onnx first (face_net.onnx -> face_net.int8.onnx)
+
+The report compares each INT8 model against its FP32 reference: per-class
+detection agreement for YOLO, box agreement for the face net, landmark error
+for the CNN, plus p50/p95 latency and file size, so a variant can be chosen
+per deployment. Load the INT8 models with DETECTOR_BACKEND=onnx
+MODEL_PRECISION=int8.
+
+Usage:
+    python quantization.py --calibration-dir frames/ --output quantization_report.json
+    python quantization.py --models yolo --calibration-dir frames/ --eval-dir holdout/
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+from inference_backends import (DEFAULT_CACHE_DIR, FACE_NET_ONNX, LANDMARK_ONNX, ExportedYOLO,
+                                OnnxFaceNet, OnnxLandmarkModel, create_ort_session, quantized_path)
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ALL_MODELS = ('yolo', 'face', 'landmarks')
+
+FACE_PROTO = os.path.join(BASE_DIR, 'assets', 'deploy.prototxt')
+FACE_CAFFEMODEL = os.path.join(BASE_DIR, 'assets', 'res10_300x300_ssd_iter_140000.caffemodel')
+LANDMARK_SAVED_MODEL = os.path.join(BASE_DIR, 'assets', 'pose_model')
+
+
+class ModelSkipped(Exception):
+    """Raised when a model's files or libraries are unavailable"""
+
+
+class FrameCalibrationReader:
+    """Feeds preprocessed frames to onnxruntime.quantization (CalibrationDataReader protocol)"""
+
+    def __init__(self, input_name: str, batches: Iterable[np.ndarray]):
+        self.input_name = input_name
+        self._batches = list(batches)
+        self._index = 0
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        if self._index >= len(self._batches):
+            return None
+        batch = self._batches[self._index]
+        self._index += 1
+        return {self.input_name: batch}
+
+    def rewind(self):
+        self._index = 0
+
+
+def load_frames(directory: str, max_frames: int = 200) -> List[np.ndarray]:
+    """Read up to max_frames images from a folder (sorted by name)"""
+    names = sorted(f for f in os.listdir(directory) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    frames = []
+    for name in names[:max_frames]:
+        image = cv2.imread(os.path.join(directory, name))
+        if image is not None:
+            frames.append(image)
+    if not frames:
+        raise ValueError(f"No images found in {directory}")
+    return frames
+
+
+def quantize_onnx(fp32_path: str, int8_path: str, reader: FrameCalibrationReader,
+                  nodes_to_exclude: Optional[List[str]] = None, per_channel: bool = True) -> str:
+    """
+    Statically quantize an ONNX model to INT8 (QDQ format).
+
+    Activations are calibrated (MinMax) on the reader's batches; weights are
+    quantized per channel.
+    """
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    prepared = f"{int8_path}.prep.onnx"
+    try:
+        # Shape inference and graph cleanup recommended before quantization
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        quant_pre_process(fp32_path, prepared, auto_merge=True)
+        source = prepared
+    except Exception as e:
+        logger.warning(f"Pre-processing of {fp32_path} failed ({e}); quantizing the raw model")
+        source = fp32_path
+
+    try:
+        quantize_static(
+            source, int8_path, reader,
+            quant_format=QuantFormat.QDQ,
+            per_channel=per_channel,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CalibrationMethod.MinMax,
+            nodes_to_exclude=nodes_to_exclude or [],
+        )
+    finally:
+        if os.path.exists(prepared):
+            os.remove(prepared)
+
+    logger.info(f"Wrote INT8 model {int8_path}")
+    return int8_path
+
+
+def yolo_head_nodes(model_path: str) -> List[str]:
+    """Non-convolution nodes of the YOLOv8 detection head (box decoding, DFL, concat)"""
+    import onnx
+
+    graph = onnx.load(model_path, load_external_data=False).graph
+    pattern = re.compile(r'^/model\.(\d+)/')
+    indices = [int(m.group(1)) for m in (pattern.match(node.name) for node in graph.node) if m]
+    if not indices:
+        return []
+    head = f"/model.{max(indices)}/"
+    return [node.name for node in graph.node if node.name.startswith(head) and node.op_type != 'Conv']
+
+
+def face_blob(frame: np.ndarray) -> np.ndarray:
+    """Face SSD input, same preprocessing as YOLOCheatingDetector.detect_faces_raw"""
+    return cv2.dnn.blobFromImage(frame, 1.0, (300, 300), (104.0, 177.0, 123.0), False, False)
+
+
+def face_crops(frames: List[np.ndarray], size: int = 128) -> List[np.ndarray]:
+    """Square face crops for the landmark model (centre crop when no face net is available)"""
+    net = None
+    if os.path.exists(FACE_PROTO) and os.path.exists(FACE_CAFFEMODEL):
+        net = cv2.dnn.readNetFromCaffe(FACE_PROTO, FACE_CAFFEMODEL)
+
+    crops = []
+    for frame in frames:
+        h, w = frame.shape[:2]
+        box = None
+        if net is not None:
+            net.setInput(face_blob(frame))
+            detections = net.forward()[0, 0]
+            best = detections[detections[:, 2].argmax()] if len(detections) else None
+            if best is not None and best[2] > 0.5:
+                x1, y1, x2, y2 = (best[3:7] * [w, h, w, h]).astype(int)
+                side = max(x2 - x1, y2 - y1)
+                cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+                box = (cx - side // 2, cy - side // 2, cx + side // 2, cy + side // 2)
+        if box is None:
+            side = min(h, w)
+            box = ((w - side) // 2, (h - side) // 2, (w + side) // 2, (h + side) // 2)
+        x1, y1, x2, y2 = max(0, box[0]), max(0, box[1]), min(w, box[2]), min(h, box[3])
+        if x2 > x1 and y2 > y1:
+            crops.append(cv2.resize(frame[y1:y2, x1:x2], (size, size)))
+    return crops
+
+
+def landmark_batch(crop: np.ndarray) -> np.ndarray:
+    """Landmark model input, same preprocessing as MarkDetector.detect_marks"""
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)[np.newaxis].astype(np.float32)
+
+
+def export_landmark_model(saved_model: str, onnx_path: str) -> str:
+    """Convert the Keras landmark model to ONNX with tf2onnx (cached)"""
+    if os.path.exists(onnx_path):
+        return onnx_path
+    if not os.path.exists(saved_model):
+        raise ModelSkipped(f"Keras landmark model not found at {saved_model}")
+    try:
+        import tensorflow as tf
+        import tf2onnx
+    except ImportError as e:
+        raise ModelSkipped(f"tensorflow and tf2onnx are required to convert the landmark model ({e})")
+
+    model = tf.keras.models.load_model(saved_model)
+    spec = (tf.TensorSpec((None, 128, 128, 3), tf.float32, name='image'),)
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=onnx_path)
+    logger.info(f"Converted {saved_model} to {onnx_path}")
+    return onnx_path
+
+
+def measure_latency(fn: Callable[[Any], Any], inputs: Sequence[Any], warmup: int = 3) -> Dict[str, float]:
+    """p50/p95/mean latency of fn over inputs, in milliseconds"""
+    for item in inputs[:warmup]:
+        fn(item)
+    samples = np.empty(len(inputs), dtype=np.float64)
+    for i, item in enumerate(inputs):
+        started = time.perf_counter()
+        fn(item)
+        samples[i] = (time.perf_counter() - started) * 1000
+    p50, p95 = np.percentile(samples, [50, 95])
+    return {'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3),
+            'mean_ms': round(float(samples.mean()), 3)}
+
+
+def _box_iou(a: Sequence[float], b: Sequence[float]) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_boxes(reference: np.ndarray, candidate: np.ndarray,
+                iou_match: float = 0.5) -> List[Tuple[int, int]]:
+    """Greedy same-class matches between two (N, 6) [x1, y1, x2, y2, conf, cls] arrays"""
+    matches, used = [], set()
+    for i in np.argsort(-reference[:, 4]) if len(reference) else []:
+        best, best_iou = None, iou_match
+        for j in range(len(candidate)):
+            if j in used or int(candidate[j, 5]) != int(reference[i, 5]):
+                continue
+            iou = _box_iou(reference[i, :4], candidate[j, :4])
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            matches.append((int(i), best))
+    return matches
+
+
+def _file_mb(path: str) -> float:
+    return round(os.path.getsize(path) / (1024 * 1024), 2)
+
+
+def compare_yolo(fp32: ExportedYOLO, int8: ExportedYOLO, frames: List[np.ndarray],
+                 conf: float = 0.4, iou_match: float = 0.5) -> Dict[str, Any]:
+    """Per-class agreement of INT8 detections with FP32 detections, plus latency"""
+    per_class: Dict[str, Dict[str, Any]] = {}
+
+    def bucket(class_id: int) -> Dict[str, Any]:
+        name = fp32.names.get(class_id, str(class_id))
+        return per_class.setdefault(name, {'fp32': 0, 'int8': 0, 'matched': 0, 'conf_deltas': []})
+
+    for frame in frames:
+        reference = fp32.predict([frame], conf=conf)[0]
+        candidate = int8.predict([frame], conf=conf)[0]
+        for row in reference:
+            bucket(int(row[5]))['fp32'] += 1
+        for row in candidate:
+            bucket(int(row[5]))['int8'] += 1
+        for i, j in match_boxes(reference, candidate, iou_match):
+            entry = bucket(int(reference[i, 5]))
+            entry['matched'] += 1
+            entry['conf_deltas'].append(abs(float(candidate[j, 4] - reference[i, 4])))
+
+    totals = {'fp32': 0, 'int8': 0, 'matched': 0}
+    for entry in per_class.values():
+        deltas = entry.pop('conf_deltas')
+        entry['recall'] = round(entry['matched'] / entry['fp32'], 4) if entry['fp32'] else None
+        entry['precision'] = round(entry['matched'] / entry['int8'], 4) if entry['int8'] else None
+        entry['mean_conf_delta'] = round(float(np.mean(deltas)), 4) if deltas else None
+        for key in totals:
+            totals[key] += entry[key]
+
+    return {
+        'per_class': dict(sorted(per_class.items())),
+        'agreement': {
+            **totals,
+            'recall': round(totals['matched'] / totals['fp32'], 4) if totals['fp32'] else None,
+            'precision': round(totals['matched'] / totals['int8'], 4) if totals['int8'] else None,
+        },
+        'latency': {
+            'fp32': measure_latency(lambda f: fp32.predict([f], conf=conf), frames),
+            'int8': measure_latency(lambda f: int8.predict([f], conf=conf), frames),
+        },
+        'size_mb': {'fp32': _file_mb(fp32.exported_path), 'int8': _file_mb(int8.quantized_path)},
+    }
+
+
+def _face_boxes(net, frame: np.ndarray, threshold: float = 0.5) -> np.ndarray:
+    net.setInput(face_blob(frame))
+    detections = net.forward()[0, 0]
+    detections = detections[detections[:, 2] > threshold]
+    # (N, 6) layout with class 0 so match_boxes can be reused
+    out = np.zeros((len(detections), 6), dtype=np.float32)
+    out[:, :4] = detections[:, 3:7]
+    out[:, 4] = detections[:, 2]
+    return out
+
+
+def compare_face_net(fp32_net, int8_net: OnnxFaceNet, frames: List[np.ndarray]) -> Dict[str, Any]:
+    """Face box agreement and latency of the INT8 face net against the FP32 net"""
+    totals = {'fp32': 0, 'int8': 0, 'matched': 0}
+    for frame in frames:
+        reference = _face_boxes(fp32_net, frame)
+        candidate = _face_boxes(int8_net, frame)
+        totals['fp32'] += len(reference)
+        totals['int8'] += len(candidate)
+        totals['matched'] += len(match_boxes(reference, candidate))
+
+    def run(net):
+        return lambda f: (net.setInput(face_blob(f)), net.forward())
+
+    return {
+        'agreement': {
+            **totals,
+            'recall': round(totals['matched'] / totals['fp32'], 4) if totals['fp32'] else None,
+            'precision': round(totals['matched'] / totals['int8'], 4) if totals['int8'] else None,
+        },
+        'latency': {'fp32': measure_latency(run(fp32_net), frames),
+                    'int8': measure_latency(run(int8_net), frames)},
+    }
+
+
+def compare_landmarks(fp32_model, int8_model, crops: List[np.ndarray]) -> Dict[str, Any]:
+    """Landmark error of the INT8 model against FP32, in pixels of the 128x128 crop"""
+    errors = []
+    for crop in crops:
+        batch = landmark_batch(crop)
+        reference = np.reshape(fp32_model.predict(batch), (-1, 2))
+        candidate = np.reshape(int8_model.predict(batch), (-1, 2))
+        errors.append(np.linalg.norm(reference - candidate, axis=1) * 128)
+    errors = np.concatenate(errors) if errors else np.zeros(0)
+    return {
+        'landmark_error_px': {
+            'mean': round(float(errors.mean()), 4) if errors.size else None,
+            'p95': round(float(np.percentile(errors, 95)), 4) if errors.size else None,
+            'max': round(float(errors.max()), 4) if errors.size else None,
+        },
+        'latency': {
+            'fp32': measure_latency(lambda c: fp32_model.predict(landmark_batch(c)), crops),
+            'int8': measure_latency(lambda c: int8_model.predict(landmark_batch(c)), crops),
+        },
+    }
+
+
+def run_yolo(calibration: List[np.ndarray], evaluation: List[np.ndarray], weights: str,
+             cache_dir: str, imgsz: int, num_threads: Optional[int], conf: float) -> Dict[str, Any]:
+    fp32 = ExportedYOLO(weights, 'onnx', cache_dir=cache_dir, imgsz=imgsz, num_threads=num_threads)
+    fp32.load()
+    input_name = create_ort_session(fp32.exported_path).get_inputs()[0].name
+    reader = FrameCalibrationReader(input_name, (fp32.preprocess([f]) for f in calibration))
+    quantize_onnx(fp32.exported_path, fp32.quantized_path, reader,
+                  nodes_to_exclude=yolo_head_nodes(fp32.exported_path))
+
+    int8 = ExportedYOLO(weights, 'onnx', cache_dir=cache_dir, imgsz=imgsz,
+                        num_threads=num_threads, precision='int8')
+    int8.load()
+    return {'fp32_model': fp32.exported_path, 'int8_model': int8.quantized_path,
+            **compare_yolo(fp32, int8, evaluation, conf=conf)}
+
+
+def run_face(calibration: List[np.ndarray], evaluation: List[np.ndarray], cache_dir: str,
+             num_threads: Optional[int]) -> Dict[str, Any]:
+    fp32_path = os.path.join(cache_dir, FACE_NET_ONNX)
+    if not os.path.exists(fp32_path):
+        raise ModelSkipped(
+            f"{fp32_path} not found. Convert res10_300x300_ssd_iter_140000.caffemodel to ONNX "
+            f"(keeping the SSD detection output) with an external Caffe converter first")
+
+    reference = OnnxFaceNet(fp32_path, num_threads)
+    reader = FrameCalibrationReader(reference.input_name, (face_blob(f) for f in calibration))
+    int8_path = quantize_onnx(fp32_path, quantized_path(fp32_path), reader)
+
+    # The production FP32 path is the Caffe model through OpenCV DNN when it is available
+    if os.path.exists(FACE_PROTO) and os.path.exists(FACE_CAFFEMODEL):
+        reference = cv2.dnn.readNetFromCaffe(FACE_PROTO, FACE_CAFFEMODEL)
+    return {'fp32_model': fp32_path, 'int8_model': int8_path, 'size_mb': {'fp32': _file_mb(fp32_path),
+                                                                          'int8': _file_mb(int8_path)},
+            **compare_face_net(reference, OnnxFaceNet(int8_path, num_threads), evaluation)}
+
+
+def run_landmarks(calibration: List[np.ndarray], evaluation: List[np.ndarray], cache_dir: str,
+                  num_threads: Optional[int]) -> Dict[str, Any]:
+    fp32_path = export_landmark_model(LANDMARK_SAVED_MODEL, os.path.join(cache_dir, LANDMARK_ONNX))
+    fp32 = OnnxLandmarkModel(fp32_path, num_threads)
+    reader = FrameCalibrationReader(fp32.input_name, (landmark_batch(c).astype(fp32.input_dtype)
+                                                      for c in face_crops(calibration)))
+    int8_path = quantize_onnx(fp32_path, quantized_path(fp32_path), reader)
+    return {'fp32_model': fp32_path, 'int8_model': int8_path, 'size_mb': {'fp32': _file_mb(fp32_path),
+                                                                          'int8': _file_mb(int8_path)},
+            **compare_landmarks(fp32, OnnxLandmarkModel(int8_path, num_threads), face_crops(evaluation))}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Create INT8 model variants and compare them with FP32")
+    parser.add_argument('--calibration-dir', required=True, help="Folder of representative frames")
+    parser.add_argument('--eval-dir', help="Held-out frames for the report (default: calibration frames)")
+    parser.add_argument('--models', nargs='+', choices=ALL_MODELS, default=list(ALL_MODELS))
+    parser.add_argument('--weights', default='yolov8n.pt')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--max-frames', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--confidence', type=float, default=0.4)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--output', default='quantization_report.json')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    calibration = load_frames(args.calibration_dir, args.max_frames)
+    evaluation = load_frames(args.eval_dir, args.max_frames) if args.eval_dir else calibration
+
+    runners = {
+        'yolo': lambda: run_yolo(calibration, evaluation, args.weights, args.cache_dir,
+                                 args.imgsz, args.threads, args.confidence),
+        'face': lambda: run_face(calibration, evaluation, args.cache_dir, args.threads),
+        'landmarks': lambda: run_landmarks(calibration, evaluation, args.cache_dir, args.threads),
+    }
+
+    report: Dict[str, Any] = {
+        'calibration_dir': args.calibration_dir,
+        'calibration_frames': len(calibration),
+        'eval_dir': args.eval_dir or args.calibration_dir,
+        'eval_frames': len(evaluation),
+        'models': {},
+    }
+    failed = False
+    for name in args.models:
+        try:
+            result = runners[name]()
+        except ModelSkipped as e:
+            print(f"skipped {name}: {e}")
+            report['models'][name] = {'skipped': str(e)}
+            continue
+        except Exception as e:
+            logger.error(f"Quantization of {name} failed: {e}")
+            report['models'][name] = {'error': str(e)}
+            failed = True
+            continue
+
+        report['models'][name] = result
+        latency = result['latency']
+        agreement = result.get('agreement') or result.get('landmark_error_px')
+        print(f"{name:10s} fp32 p50={latency['fp32']['p50_ms']:8.2f}ms  "
+              f"int8 p50={latency['int8']['p50_ms']:8.2f}ms  {agreement}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Bounded per-session state store.
+
+Several pipeline stages keep a little state per exam session (last analysed
+frame, tracker state, pose warm start...). This store holds that state keyed
+by session ID with LRU eviction and an idle TTL, so a long-running server
+does not grow without bound as students come and go.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class SessionStore(Generic[T]):
+    """Thread-safe LRU/TTL map from session ID to per-session state"""
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: Optional[float] = 900.0,
+                 on_evict: Optional[Callable[[str, T], None]] = None):
+        """
+        Initialize the store.
+
+        Args:
+            max_sessions: Maximum number of sessions kept; least recently used are evicted
+            ttl_seconds: Idle time after which a session's state is dropped (None disables)
+            on_evict: Optional callback run for every evicted (session_id, state) pair
+        """
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+        self._on_evict = on_evict
+        self._entries: "OrderedDict[str, Tuple[T, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, session_id: str) -> Optional[T]:
+        """Return the session's state (refreshing its recency) or None"""
+        evicted = []
+        with self._lock:
+            self._expire(time.monotonic(), evicted)
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries[session_id] = (entry[0], time.monotonic())
+                self._entries.move_to_end(session_id)
+        self._notify(evicted)
+        return entry[0] if entry is not None else None
+
+    def get_or_create(self, session_id: str, factory: Callable[[], T]) -> T:
+        """Return the session's state, creating it with factory() if missing"""
+        evicted = []
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now, evicted)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                state = factory()
+                self._entries[session_id] = (state, now)
+                self._evict_overflow(evicted)
+            else:
+                state = entry[0]
+                self._entries[session_id] = (state, now)
+                self._entries.move_to_end(session_id)
+        self._notify(evicted)
+        return state
+
+    def set(self, session_id: str, state: T):
+        """Store state for a session"""
+        evicted = []
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now, evicted)
+            self._entries[session_id] = (state, now)
+            self._entries.move_to_end(session_id)
+            self._evict_overflow(evicted)
+        self._notify(evicted)
+
+    def pop(self, session_id: str) -> Optional[T]:
+        """Remove and return a session's state"""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        return entry[0] if entry is not None else None
+
+    def items(self) -> List[Tuple[str, T]]:
+        """Snapshot of (session_id, state) pairs, least recently used first"""
+        with self._lock:
+            return [(sid, entry[0]) for sid, entry in self._entries.items()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    def _expire(self, now: float, evicted: list):
+        if self.ttl_seconds is None:
+            return
+        # Entries are kept in recency order, so expired ones are at the front
+        while self._entries:
+            session_id, (state, touched) = next(iter(self._entries.items()))
+            if now - touched <= self.ttl_seconds:
+                break
+            self._entries.popitem(last=False)
+            evicted.append((session_id, state))
+
+    def _evict_overflow(self, evicted: list):
+        while len(self._entries) > self.max_sessions:
+            session_id, (state, _) = self._entries.popitem(last=False)
+            evicted.append((session_id, state))
+
+    def _notify(self, evicted: list):
+        self.evictions += len(evicted)
+        if self._on_evict is not None:
+            for session_id, state in evicted:
+                self._on_evict(session_id, state)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'sessions': len(self), 'evictions': self.evictions}
@@ -0,0 +1,239 @@
+"""
+Long-lived streaming sessions for real-time proctoring.
+
+Each exam session keeps one channel open (WebSocket, or SSE plus binary
+uploads) instead of issuing a fresh HTTP request per frame. Frames are
+analysed by a per-session worker. Backpressure is handled by keeping only
+the newest unprocessed frame: when the analyzer falls behind, stale frames
+are dropped instead of queued. A session ends when its last WebSocket
+disconnects, when it is closed explicitly, or when a background reaper finds
+it idle.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StreamSession:
+    """Latest-frame mailbox plus a bounded result buffer for one exam session"""
+
+    def __init__(self, session_id: str, process_frame: Callable[[str, bytes], Dict[str, Any]],
+                 max_pending_results: int = 8):
+        """
+        Initialize the session and start its analysis worker.
+
+        Args:
+            session_id: Test session identifier
+            process_frame: Callable turning (session_id, encoded frame bytes) into a result dict
+            max_pending_results: Results kept for a slow reader before the oldest is dropped
+        """
+        self.session_id = session_id
+        self._process_frame = process_frame
+        self._cond = threading.Condition()
+        self._pending: Optional[bytes] = None
+        self._pending_id = 0
+        self._results: Deque[Dict[str, Any]] = deque(maxlen=max_pending_results)
+        self._closed = False
+
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.results_dropped = 0
+        self.last_activity = time.monotonic()
+        self.connections = 0  # attached WebSockets (guarded by the manager's lock)
+
+        self._worker = threading.Thread(
+            target=self._run, name=f"stream-{session_id}", daemon=True)
+        self._worker.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def push_frame(self, frame: bytes) -> int:
+        """
+        Offer an encoded frame for analysis.
+
+        If the previous frame has not been picked up by the worker yet it is
+        replaced, so the analyzer always works on the most recent frame.
+
+        Returns:
+            The frame id assigned to this frame
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Stream session is closed")
+            if self._pending is not None:
+                self.frames_dropped += 1
+            self.frames_received += 1
+            self._pending = frame
+            self._pending_id = self.frames_received
+            self.last_activity = time.monotonic()
+            self._cond.notify_all()
+            return self._pending_id
+
+    def next_result(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Block until a result is available, the session closes, or the timeout expires"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._results or self._closed, timeout=timeout)
+            if self._results:
+                return self._results.popleft()
+            return None
+
+    def drain_results(self) -> List[Dict[str, Any]]:
+        """Return every result currently buffered without blocking"""
+        with self._cond:
+            results = list(self._results)
+            self._results.clear()
+            return results
+
+    def close(self):
+        """Stop the worker and wake any waiting reader"""
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify_all()
+
+    def _run(self):
+        """Worker loop: analyse the newest pending frame, publish its result"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._closed)
+                if self._closed:
+                    return
+                frame, frame_id = self._pending, self._pending_id
+                self._pending = None
+
+            try:
+                result = self._process_frame(self.session_id, frame)
+            except ValueError as e:
+                result = {'success': False, 'error': str(e)}
+            except Exception as e:
+                logger.error(f"Stream analysis error ({self.session_id}): {e}")
+                result = {'success': False, 'error': 'Analysis failed'}
+
+            result['session_id'] = self.session_id
+            result['frame_id'] = frame_id
+
+            with self._cond:
+                if len(self._results) == self._results.maxlen:
+                    self.results_dropped += 1
+                self._results.append(result)
+                self.frames_processed += 1
+                self.last_activity = time.monotonic()
+                self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'frames_received': self.frames_received,
+            'frames_processed': self.frames_processed,
+            'frames_dropped': self.frames_dropped,
+            'results_dropped': self.results_dropped,
+            'idle_seconds': round(time.monotonic() - self.last_activity, 1),
+        }
+
+
+class StreamSessionManager:
+    """Registry of open streaming sessions with idle reaping"""
+
+    def __init__(self, process_frame: Callable[[str, bytes], Dict[str, Any]],
+                 idle_timeout: float = 120.0, max_pending_results: int = 8):
+        self._process_frame = process_frame
+        self.idle_timeout = idle_timeout
+        self.max_pending_results = max_pending_results
+        self._sessions: Dict[str, StreamSession] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+
+    def open(self, session_id: str, connection: bool = False) -> StreamSession:
+        """
+        Get the session's channel, creating it if needed.
+
+        Args:
+            session_id: Test session identifier
+            connection: Attach a connection (WebSocket) to the session; call
+                release() when it drops
+        """
+        self._start_reaper()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.closed:
+                session = StreamSession(session_id, self._process_frame, self.max_pending_results)
+                self._sessions[session_id] = session
+                logger.info(f"Stream session opened: {session_id}")
+            if connection:
+                session.connections += 1
+            return session
+
+    def release(self, session_id: str, session: StreamSession) -> bool:
+        """Detach a connection; the session closes when its last one is gone"""
+        with self._lock:
+            session.connections -= 1
+            if session.connections > 0 or self._sessions.get(session_id) is not session:
+                # Still attached elsewhere, or already closed (close() or a newer session)
+                return False
+            del self._sessions[session_id]
+        session.close()
+        logger.info(f"Stream session closed: {session_id} (disconnected)")
+        return True
+
+    def get(self, session_id: str) -> Optional[StreamSession]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        logger.info(f"Stream session closed: {session_id}")
+        return True
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name="stream-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap_loop(self):
+        # Sessions fed over HTTP have no connection whose loss would close them
+        interval = max(1.0, self.idle_timeout / 4)
+        while True:
+            time.sleep(interval)
+            try:
+                self.reap_idle()
+            except Exception as e:
+                logger.error(f"Stream session reaping failed: {e}")
+
+    def reap_idle(self):
+        """
+        Close sessions that have seen no frames or results for idle_timeout seconds.
+
+        Sessions with a WebSocket attached are left alone; they close when it drops.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stale = [sid for sid, s in self._sessions.items()
+                     if s.closed or (s.connections == 0 and now - s.last_activity > self.idle_timeout)]
+            sessions = [self._sessions.pop(sid) for sid in stale]
+        for session in sessions:
+            session.close()
+            logger.info(f"Stream session closed: {session.session_id} (idle)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            'open_sessions': len(sessions),
+            'frames_dropped': sum(s.frames_dropped for s in sessions),
+            'sessions': [s.get_stats() for s in sessions],
+        }
@@ -0,0 +1,44 @@
+"""Tests for camera_intrinsics.IntrinsicsRegistry"""
+
+import numpy as np
+
+from camera_intrinsics import CameraIntrinsics, IntrinsicsRegistry
+
+CALIBRATION = [[800.0, 0.0, 320.0], [0.0, 800.0, 240.0], [0.0, 0.0, 1.0]]
+
+
+def test_approximation_is_cached_per_resolution():
+    registry = IntrinsicsRegistry()
+    first = registry.get(640, 480)
+    assert registry.get(640, 480) is first
+    assert first.camera_matrix[0, 0] == 640
+    assert tuple(first.camera_matrix[:2, 2]) == (320, 240)
+
+
+def test_resolution_cache_is_bounded():
+    registry = IntrinsicsRegistry(max_resolutions=2)
+    for width in (320, 640, 1280, 1920):
+        registry.get(width, 480)
+    assert len(registry._by_size) == 2
+
+
+def test_session_calibration_scales_and_clears():
+    registry = IntrinsicsRegistry(max_session_resolutions=2)
+    registry.set_calibration('s1', CALIBRATION, 640, 480)
+
+    scaled = registry.get(1280, 960, session_id='s1')
+    assert scaled.calibrated
+    np.testing.assert_allclose(scaled.camera_matrix[0], [1600.0, 0.0, 640.0])
+    assert registry.get(1280, 960, session_id='other') is registry.get(1280, 960)
+
+    for width in (320, 800, 1024):
+        registry.get(width, 480, session_id='s1')
+    assert len(registry._calibrations.get('s1').by_size) == 2
+
+    assert registry.clear_calibration('s1')
+    assert not registry.get(640, 480, session_id='s1').calibrated
+
+
+def test_intrinsics_are_read_only():
+    intrinsics = CameraIntrinsics.approximate(640, 480)
+    assert not intrinsics.camera_matrix.flags.writeable
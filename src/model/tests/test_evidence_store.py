@@ -0,0 +1,64 @@
+"""Tests for evidence_store.EvidenceWriter"""
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from evidence_store import EvidenceWriter, safe_session_name, sniff_image_format
+
+
+def jpeg(value: int) -> bytes:
+    image = np.full((32, 32, 3), value, dtype=np.uint8)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = EvidenceWriter(str(tmp_path))
+    yield writer
+    writer.close()
+
+
+def test_safe_session_name_is_collision_free():
+    assert safe_session_name('a.b') != safe_session_name('a_b')
+    assert safe_session_name('../x').startswith('___x-')
+    assert safe_session_name('') == safe_session_name('')
+
+
+def test_sniff_image_format():
+    assert sniff_image_format(jpeg(0)) == 'jpg'
+    assert sniff_image_format(b'not an image') is None
+
+
+def test_exact_duplicates_share_one_file(writer, tmp_path):
+    first = writer.submit('s1', jpeg(10), metadata={'severity': 'high', 'cheating_types': ['phone_detected']})
+    second = writer.submit('s1', jpeg(10))
+    writer.flush()
+
+    records = writer.query('s1')
+    assert [r.duplicate for r in records] == [None, 'exact']
+    assert records[1].path == records[0].path
+    assert os.path.exists(os.path.join(str(tmp_path), records[0].path))
+    assert writer.status(first.handle)['status'] == 'written'
+    assert writer.status(second.handle)['status'] == 'written'
+    assert [r.entry_id for r in writer.query('s1', cheating_type='phone_detected')] == [records[0].entry_id]
+
+
+def test_sessions_with_similar_names_stay_separate(writer):
+    writer.submit('a.b', jpeg(10))
+    writer.submit('a_b', jpeg(20))
+    writer.flush()
+    assert [r.session_id for r in writer.query('a.b')] == ['a.b']
+    assert [r.session_id for r in writer.query('a_b')] == ['a_b']
+
+
+def test_bad_metadata_does_not_stop_the_writer(writer):
+    bad = writer.submit('s1', jpeg(30), metadata={'cheating_types': 5})
+    good = writer.submit('s1', jpeg(40))
+    writer.flush()
+
+    assert writer.status(bad.handle)['status'] == 'failed'
+    assert writer.status(good.handle)['status'] == 'written'
+    assert writer.get_stats()['failed'] == 1
@@ -0,0 +1,99 @@
+"""
+Parity of the exported ONNX backend with the PyTorch detector.
+
+The preprocessing and raw-output tests run offline on a randomly initialised
+YOLOv8n built from its config (skipped without onnxruntime/ultralytics).
+Random weights produce no confident detections, so detection-level parity on
+the sample images is a manual check that needs real weights: set
+PARITY_WEIGHTS to a .pt file (default yolov8n.pt in this directory).
+"""
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from inference_backends import ExportedYOLO, letterbox, scale_boxes
+
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGES_DIR = os.path.join(MODEL_DIR, 'images')
+
+
+def sample_images():
+    return sorted(os.path.join(IMAGES_DIR, f) for f in os.listdir(IMAGES_DIR)
+                  if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+
+
+@pytest.fixture(scope='module')
+def fixture_model(tmp_path_factory):
+    """Offline YOLOv8n (random weights) exported to ONNX, plus its PyTorch model"""
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('ultralytics')
+    import torch
+    from ultralytics import YOLO
+
+    torch.manual_seed(0)
+    directory = tmp_path_factory.mktemp('yolo')
+    weights = str(directory / 'fixture.pt')
+    YOLO('yolov8n.yaml').save(weights)
+
+    exported = ExportedYOLO(weights, 'onnx', cache_dir=str(directory))
+    exported.load()
+    return exported, YOLO(weights).model.float().eval()
+
+
+def test_scale_boxes_undoes_letterbox():
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    padded = letterbox(image, 320)
+    assert padded.shape[:2] == (320, 320)
+
+    # The full letterboxed image area maps back onto the original frame
+    boxes = np.array([[0.0, 40.0, 320.0, 280.0]])
+    np.testing.assert_allclose(scale_boxes(boxes, 320, image.shape), [[0.0, 0.0, 640.0, 480.0]], atol=1.0)
+
+
+def test_stride_letterbox_pads_minimally():
+    image = np.zeros((607, 819, 3), dtype=np.uint8)
+    padded = letterbox(image, 640, stride=32)
+    assert padded.shape[:2] == (480, 640)
+
+    boxes = np.array([[0.0, 3.0, 640.0, 477.0]])
+    np.testing.assert_allclose(scale_boxes(boxes, padded.shape, image.shape), [[0.0, 0.0, 819.0, 607.0]], atol=1.0)
+
+
+def test_letterbox_matches_ultralytics():
+    pytest.importorskip('ultralytics')
+    from ultralytics.data.augment import LetterBox
+
+    for path in sample_images():
+        image = cv2.imread(path)
+        np.testing.assert_array_equal(letterbox(image, 640, stride=32),
+                                      LetterBox(640, auto=True, stride=32)(image=image))
+        np.testing.assert_array_equal(letterbox(image, 640), LetterBox(640)(image=image))
+
+
+def test_onnx_raw_output_matches_torch(fixture_model):
+    import torch
+
+    exported, torch_model = fixture_model
+    image = cv2.imread(sample_images()[0])
+    batch = exported.preprocess([image])
+    assert batch.shape[2:] != (exported.imgsz, exported.imgsz)  # rectangular, as on the torch path
+
+    with torch.no_grad():
+        expected = torch_model(torch.from_numpy(batch))[0].numpy()
+    np.testing.assert_allclose(exported._infer(batch), expected, rtol=1e-3, atol=1e-3)
+
+
+def test_onnx_matches_torch():
+    """Detection-level parity on the sample images (manual: needs real weights)"""
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('ultralytics')
+    weights = os.environ.get('PARITY_WEIGHTS', os.path.join(MODEL_DIR, 'yolov8n.pt'))
+    if not os.path.exists(weights):
+        pytest.skip(f"YOLO weights not found at {weights}")
+
+    from inference_backends import compare_backends
+
+    assert compare_backends(sample_images(), 'onnx', weights, confidence_threshold=0.25)
@@ -0,0 +1,47 @@
+"""Tests for pose_geometry"""
+
+import cv2
+import numpy as np
+import pytest
+
+from pose_geometry import head_pose_from_angles, rodrigues, rotation_vectors_to_euler
+
+
+def test_rodrigues_matches_opencv():
+    rng = np.random.default_rng(0)
+    r_vecs = rng.uniform(-1.0, 1.0, size=(16, 3))
+    expected = np.stack([cv2.Rodrigues(r)[0] for r in r_vecs])
+    np.testing.assert_allclose(rodrigues(r_vecs), expected, atol=1e-9)
+
+
+def test_euler_matches_rq_decomposition():
+    rng = np.random.default_rng(1)
+    r_vecs = rng.uniform(-0.6, 0.6, size=(16, 3))
+    expected = np.array([cv2.RQDecomp3x3(cv2.Rodrigues(r)[0])[0] for r in r_vecs])
+    np.testing.assert_allclose(rotation_vectors_to_euler(r_vecs), expected, atol=1e-6)
+
+
+def test_zero_rotation():
+    np.testing.assert_allclose(rotation_vectors_to_euler(np.zeros((1, 3))), [[0.0, 0.0, 0.0]], atol=1e-9)
+
+
+@pytest.mark.parametrize('pitch, yaw, mirrored, direction', [
+    (0, 0, False, 'straight'),
+    (-20, 0, False, 'up'),
+    (20, 0, False, 'down'),
+    (0, -25, False, 'left'),
+    (0, 25, False, 'right'),
+    (0, -25, True, 'right'),
+    (0, 25, True, 'left'),
+    (20, 25, False, 'right'),  # yaw wins over pitch
+])
+def test_head_pose_direction(pitch, yaw, mirrored, direction):
+    pose = head_pose_from_angles(pitch, yaw, 0.0, mirrored=mirrored)
+    assert pose.direction == direction
+    assert pose.looking_straight == (direction == 'straight')
+
+
+def test_head_pose_custom_thresholds():
+    assert head_pose_from_angles(12, 0, 0).direction == 'straight'
+    assert head_pose_from_angles(12, 0, 0, pitch_down=10).direction == 'down'
+    assert head_pose_from_angles(0, 17, 0, mirrored=True, yaw_threshold=15).direction == 'left'
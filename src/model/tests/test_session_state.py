@@ -0,0 +1,49 @@
+"""Tests for session_state.SessionStore"""
+
+import time
+
+from session_state import SessionStore
+
+
+def test_lru_eviction_and_callback():
+    evicted = []
+    store = SessionStore(max_sessions=2, ttl_seconds=None, on_evict=lambda sid, state: evicted.append(sid))
+    store.set('a', 1)
+    store.set('b', 2)
+    assert store.get('a') == 1  # 'b' is now least recently used
+    store.set('c', 3)
+
+    assert 'b' not in store
+    assert evicted == ['b']
+    assert store.get_stats() == {'sessions': 2, 'evictions': 1}
+
+
+def test_ttl_expiry():
+    store = SessionStore(max_sessions=10, ttl_seconds=0.05)
+    store.set('a', 1)
+    time.sleep(0.1)
+    assert store.get('a') is None
+    assert store.evictions == 1
+
+
+def test_get_or_create_calls_factory_once():
+    store = SessionStore()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return object()
+
+    first = store.get_or_create('a', factory)
+    assert store.get_or_create('a', factory) is first
+    assert len(calls) == 1
+
+
+def test_pop_and_items():
+    store = SessionStore()
+    store.set('a', 1)
+    store.set('b', 2)
+    assert store.items() == [('a', 1), ('b', 2)]
+    assert store.pop('a') == 1
+    assert store.pop('a') is None
+    assert len(store) == 1
@@ -0,0 +1,86 @@
+"""Tests for violation_aggregator.ViolationAggregator"""
+
+import pytest
+
+from cheating_detector import CheatingAnalysis
+from violation_aggregator import ViolationAggregator, ViolationRule
+
+PHONE = 'phone_detected'
+
+
+def frame(*cheating_types, confidence=0.9):
+    return CheatingAnalysis(
+        is_cheating=bool(cheating_types), cheating_types=list(cheating_types),
+        confidence_score=confidence if cheating_types else 0.0, warnings=[], detections=[],
+        person_count=1, head_pose=None, severity='none', timestamp='',
+    )
+
+
+def aggregator(**rule):
+    return ViolationAggregator(rules={PHONE: ViolationRule(**rule)})
+
+
+def test_sustained_behaviour_starts_violation():
+    agg = aggregator(min_duration=1.0, activate_ratio=0.5, severity='critical')
+    events = []
+    for i in range(20):
+        events += agg.update('s', frame(PHONE), t=100.0 + i * 0.1)
+
+    assert [e.event for e in events] == ['started']
+    assert events[0].started_at == 100.0
+    assert events[0].severity == 'critical'
+
+
+def test_single_frame_after_long_gap_does_not_start():
+    agg = aggregator(min_duration=1.0, activate_ratio=0.5)
+    assert agg.update('s', frame(PHONE), t=0.0) == []
+    assert agg.update('s', frame(), t=1.0) == []
+    # Far apart from the first hit: a new run of one frame, not a violation
+    assert agg.update('s', frame(PHONE), t=10.0) == []
+    assert agg.get_session('s')['active'] == []
+
+
+def test_sparse_hits_below_min_frames_do_not_start():
+    agg = aggregator(min_duration=1.0, activate_ratio=0.5, min_frames=3)
+    assert agg.update('s', frame(PHONE), t=0.0) == []
+    assert agg.update('s', frame(PHONE), t=1.5) == []
+
+
+def test_violation_ends_and_close_reports_active():
+    agg = aggregator(min_duration=0.5, activate_ratio=0.5, clear_duration=1.0, escalate_after=None)
+    t = 0.0
+    for _ in range(10):
+        agg.update('s', frame(PHONE), t=t)
+        t += 0.1
+    events = []
+    for _ in range(30):
+        events += agg.update('s', frame(), t=t)
+        t += 0.1
+    assert [e.event for e in events] == ['ended']
+
+    for _ in range(10):
+        agg.update('s', frame(PHONE), t=t)
+        t += 0.1
+    closed = agg.close('s', t=t)
+    assert [e.event for e in closed] == ['ended']
+    assert agg.get_session('s') is None
+
+
+def test_escalation():
+    agg = aggregator(min_duration=0.5, activate_ratio=0.5, severity='low', escalate_after=1.0)
+    severities = [e.severity for i in range(30)
+                  for e in agg.update('s', frame(PHONE), t=i * 0.1)]
+    assert severities[:3] == ['low', 'medium', 'high']
+
+
+def test_eviction_ends_active_violations():
+    evicted = []
+    agg = ViolationAggregator(rules={PHONE: ViolationRule(min_duration=0.5, activate_ratio=0.5)},
+                              max_sessions=1, on_evicted=evicted.extend)
+    for i in range(10):
+        agg.update('a', frame(PHONE), t=i * 0.1)
+    agg.update('b', frame(), t=5.0)
+
+    assert [(e.session_id, e.event) for e in evicted] == [('a', 'ended')]
+    assert evicted[0].timestamp == pytest.approx(0.9)
+    assert agg.get_session('a') is None
@@ -0,0 +1,240 @@
+"""
+Per-session object tracking on top of YOLO detections.
+
+An IoU tracker keeps stable track IDs for the people and objects in each
+session's frames. Tracks missed for a couple of frames keep being reported
+(coasting) instead of vanishing, so a phone missed on one frame no longer
+flips `is_cheating` back and forth. Between full detections, boxes are
+propagated with a constant-velocity model, which lets YOLO run only every
+`detect_interval` frames or when a track is lost.
+"""
+
+import itertools
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Tuple
+import logging
+
+import numpy as np
+
+from cheating_detector import Detection
+from session_state import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) x1, y1, x2, y2 boxes"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+@dataclass
+class Track:
+    """A detection followed across frames"""
+    track_id: int
+    detection: Detection
+    box: np.ndarray                 # float x1, y1, x2, y2 (propagated between detections)
+    velocity: np.ndarray            # per-frame box displacement
+    hits: int = 1                   # frames the track was matched by a detection
+    age: int = 1                    # frames since the track was created
+    misses: int = 0                 # consecutive detection rounds without a match
+    frames_since_update: int = 0    # frames since the last matched detection
+
+    def to_detection(self) -> Detection:
+        x1, y1, x2, y2 = (int(v) for v in self.box)
+        return replace(self.detection, bbox=(x1, y1, x2, y2), track_id=self.track_id)
+
+
+class ObjectTracker:
+    """Greedy IoU tracker with constant-velocity propagation for one session"""
+
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 2, min_hits: int = 1,
+                 velocity_smoothing: float = 0.5):
+        """
+        Initialize the tracker.
+
+        Args:
+            iou_threshold: Minimum IoU for a detection to continue a track
+            max_misses: Detection rounds a track may go unmatched before it is dropped
+                (it keeps being reported until then)
+            min_hits: Matches needed before a track is reported
+            velocity_smoothing: Weight of the newest displacement in the velocity estimate
+        """
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.velocity_smoothing = velocity_smoothing
+        self.tracks: List[Track] = []
+        self._ids = itertools.count(1)
+        self.frames_since_detection = 0
+
+    def update(self, detections: List[Detection]) -> List[Detection]:
+        """
+        Match a fresh set of detections against the existing tracks.
+
+        Returns:
+            Detections with track IDs, including recently missed tracks
+        """
+        self.frames_since_detection = 0
+        # Move every track to where it should be in this frame before matching
+        self._advance()
+        boxes = np.array([d.bbox for d in detections], dtype=np.float32).reshape(-1, 4)
+        track_boxes = np.array([t.box for t in self.tracks], dtype=np.float32).reshape(-1, 4)
+        ious = iou_matrix(track_boxes, boxes)
+
+        # Only same-class pairs may match
+        for ti, track in enumerate(self.tracks):
+            for di, detection in enumerate(detections):
+                if track.detection.class_name != detection.class_name:
+                    ious[ti, di] = 0.0
+
+        matched_tracks, matched_detections = set(), set()
+        # Greedy assignment, best overlap first
+        for flat in np.argsort(-ious, axis=None):
+            ti, di = divmod(int(flat), ious.shape[1])
+            if ious[ti, di] < self.iou_threshold:
+                break
+            if ti in matched_tracks or di in matched_detections:
+                continue
+            matched_tracks.add(ti)
+            matched_detections.add(di)
+            self._refresh(self.tracks[ti], detections[di], boxes[di])
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+
+        for di, detection in enumerate(detections):
+            if di not in matched_detections:
+                survivors.append(Track(
+                    track_id=next(self._ids),
+                    detection=detection,
+                    box=boxes[di].copy(),
+                    velocity=np.zeros(4, dtype=np.float32)
+                ))
+
+        self.tracks = survivors
+        return self.active_detections()
+
+    def _advance(self):
+        for track in self.tracks:
+            track.box = track.box + track.velocity
+            track.age += 1
+            track.frames_since_update += 1
+
+    def _refresh(self, track: Track, detection: Detection, box: np.ndarray):
+        # track.box was extrapolated with the old velocity; correct by the residual
+        displacement = track.velocity + (box - track.box) / track.frames_since_update
+        track.velocity = (self.velocity_smoothing * displacement
+                          + (1 - self.velocity_smoothing) * track.velocity)
+        track.box = box.copy()
+        track.detection = detection
+        track.hits += 1
+        track.misses = 0
+        track.frames_since_update = 0
+
+    def predict(self) -> List[Detection]:
+        """Advance every track one frame with its velocity (no detector run)"""
+        self.frames_since_detection += 1
+        self._advance()
+        return self.active_detections()
+
+    def active_detections(self) -> List[Detection]:
+        return [t.to_detection() for t in self.tracks if t.hits >= self.min_hits]
+
+    def is_lost(self, frame_shape: Tuple[int, ...]) -> bool:
+        """True when a track went unmatched or has drifted out of the frame"""
+        height, width = frame_shape[:2]
+        for track in self.tracks:
+            if track.misses > 0:
+                return True
+            x1, y1, x2, y2 = track.box
+            if x1 < 0 or y1 < 0 or x2 > width or y2 > height or x2 <= x1 or y2 <= y1:
+                return True
+        return False
+
+
+class TrackingManager:
+    """Per-session trackers deciding when YOLO actually has to run"""
+
+    def __init__(self, detect_interval: int = 1, iou_threshold: float = 0.3, max_misses: int = 2,
+                 max_sessions: int = 1000, session_ttl: float = 900.0):
+        """
+        Initialize the manager.
+
+        Args:
+            detect_interval: Run the detector at least every this many frames (1 = every frame)
+            iou_threshold: Minimum IoU for a detection to continue a track
+            max_misses: Detection rounds a track may go unmatched before it is dropped
+            max_sessions: Sessions tracked before least recently used ones are evicted
+            session_ttl: Idle seconds after which a session's tracks are dropped
+        """
+        self.detect_interval = max(1, detect_interval)
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self._trackers: SessionStore[Tuple[ObjectTracker, threading.Lock]] = SessionStore(
+            max_sessions, session_ttl)
+        self._stats_lock = threading.Lock()
+        self.frames = 0
+        self.detector_runs = 0
+
+    def _new_tracker(self) -> Tuple[ObjectTracker, threading.Lock]:
+        return ObjectTracker(self.iou_threshold, self.max_misses), threading.Lock()
+
+    def detect(self, session_id: str, image: np.ndarray,
+               detect_fn: Callable[[np.ndarray], List[Detection]]) -> Tuple[List[Detection], bool]:
+        """
+        Tracked detections for a session's frame.
+
+        Args:
+            session_id: Test session identifier
+            image: BGR image (OpenCV format)
+            detect_fn: Object detector, run when the tracks need refreshing
+
+        Returns:
+            Tuple of (detections with track IDs, whether the detector ran)
+        """
+        tracker, lock = self._trackers.get_or_create(session_id, self._new_tracker)
+        with lock:
+            run_detector = (
+                not tracker.tracks
+                or tracker.frames_since_detection + 1 >= self.detect_interval
+                or tracker.is_lost(image.shape)
+            )
+            if run_detector:
+                detections = tracker.update(detect_fn(image))
+            else:
+                detections = tracker.predict()
+
+        with self._stats_lock:
+            self.frames += 1
+            self.detector_runs += int(run_detector)
+        return detections, run_detector
+
+    def reset(self, session_id: str):
+        """Forget a session's tracks"""
+        self._trackers.pop(session_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'frames': self.frames,
+                'detector_runs': self.detector_runs,
+                'detector_run_rate': round(self.detector_runs / self.frames, 4) if self.frames else 0.0,
+                'detect_interval': self.detect_interval,
+                'sessions': len(self._trackers),
+            }
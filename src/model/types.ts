@@ -66,6 +66,7 @@ export interface ImageRequest {
  */
 export interface AnalyzeRequest extends ImageRequest {
   return_annotated?: boolean;
+  session_id?: string;
 }
 
 /**
@@ -73,6 +74,18 @@ export interface AnalyzeRequest extends ImageRequest {
  */
 export interface PoseDetectionRequest extends ImageRequest {
   use_advanced?: boolean;
+  session_id?: string; // Tracks the session's frames with its own FaceMesh and uses its camera calibration
+}
+
+/**
+ * Calibrated webcam intrinsics (PUT /sessions/<session_id>/calibration)
+ */
+export interface CameraCalibration {
+  camera_matrix: number[][]; // 3x3
+  width: number; // Frame size the calibration was made at
+  height: number;
+  dist_coeffs?: number[];
+  calibrated?: boolean;
 }
 
 /**
@@ -80,6 +93,10 @@ export interface PoseDetectionRequest extends ImageRequest {
  */
 export interface SaveImageRequest extends ImageRequest {
   user: string;
+  session_id?: string; // Evidence directory (defaults to user)
+  analysis?: CheatingAnalysisResponse; // Recorded in the evidence manifest
+  severity?: CheatingSeverity | string;
+  cheating_types?: string[];
 }
 
 // ============================================
@@ -99,6 +116,8 @@ export interface Detection {
   confidence: number;
   bbox: BoundingBox;
   is_cheating_object: boolean;
+  /** Stable ID across a session's frames (requests with a session_id) */
+  track_id?: number | null;
 }
 
 /**
@@ -140,10 +159,25 @@ export interface CheatingAnalysisResponse {
   head_pose: HeadPose | null;
   severity: CheatingSeverity | string;
   detections: Detection[];
+  violation_events?: ViolationEvent[] | null; // Only present for requests with a session_id
   annotated_image?: string; // Base64 encoded annotated image
   error?: string;
 }
 
+/**
+ * Session-level violation state change (started, escalated or ended)
+ */
+export interface ViolationEvent {
+  session_id: string;
+  cheating_type: CheatingType | string;
+  event: 'started' | 'escalated' | 'ended';
+  severity: CheatingSeverity | string;
+  timestamp: number; // seconds since the epoch
+  started_at: number;
+  duration: number; // seconds
+  peak_confidence: number;
+}
+
 /**
  * Object detection response
  */
@@ -201,9 +235,30 @@ export interface SaveImageResponse {
   success: boolean;
   path: string;
   filename?: string;
+  handle?: string; // Poll GET /evidence/<handle> for the write status
+  status?: 'queued' | 'written' | 'failed';
+  sha256?: string;
   error?: string;
 }
 
+/**
+ * Evidence manifest record (GET /sessions/<session_id>/evidence)
+ */
+export interface EvidenceRecord {
+  entry_id: string;
+  session_id: string;
+  timestamp: number; // seconds since the epoch
+  sha256: string;
+  path: string; // relative to the evidence directory
+  size: number;
+  duplicate: 'exact' | 'near' | null;
+  duplicate_of: string | null;
+  phash: string | null;
+  severity: CheatingSeverity | string | null;
+  cheating_types: string[];
+  summary: Record<string, unknown> | null;
+}
+
 /**
  * Health check response
  */
@@ -0,0 +1,369 @@
+"""
+Offline analysis of recorded exam videos.
+
+Streams a video file through YOLOCheatingDetector for dispute reviews: frames
+are decoded and sampled on a background thread, handed over through a bounded
+queue, and analyzed in YOLO batches while the next frames decode. Every
+sampled frame becomes one row of a compact timeline (JSONL, or Parquet when
+pyarrow is installed), and the per-frame results are fed to a
+ViolationAggregator on media time to produce violation intervals. Rows are
+written as they are produced, so memory stays constant for multi-hour videos.
+
+Usage:
+    python video_analysis.py --video exam.mp4 --output timeline.jsonl
+    python video_analysis.py --video exam.mp4 --fps 2 --format parquet --output timeline.parquet
+"""
+
+import argparse
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+from cheating_detector import CheatingAnalysis, YOLOCheatingDetector
+from violation_aggregator import DEFAULT_RULES, ViolationAggregator, ViolationEvent
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_FORMATS = ('jsonl', 'parquet')
+
+# Rows buffered before a Parquet row group is written
+PARQUET_ROW_GROUP = 1024
+
+_END = object()
+
+
+def read_frames(path: str, sample_fps: Optional[float] = None) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Yield (frame_index, media_time, frame) from a video file.
+
+    Args:
+        path: Video file readable by cv2.VideoCapture
+        sample_fps: Frames per second to keep (default: every frame). Skipped
+            frames are only grabbed, not decoded.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video {path}")
+
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    if source_fps <= 0:
+        logger.warning(f"{path} reports no frame rate, assuming 30 fps")
+        source_fps = 30.0
+    interval = 1.0 / sample_fps if sample_fps else 0.0
+
+    try:
+        index = 0
+        next_time = 0.0
+        while capture.grab():
+            t = index / source_fps
+            if t + 1e-6 >= next_time:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield index, t, frame
+                next_time += interval
+                # Don't fall behind when the source rate is below the sample rate
+                next_time = max(next_time, t)
+            index += 1
+    finally:
+        capture.release()
+
+
+def batched(frames: Iterator[Tuple[int, float, np.ndarray]],
+            batch_size: int) -> Iterator[List[Tuple[int, float, np.ndarray]]]:
+    batch = []
+    for item in frames:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class FramePrefetcher:
+    """Decodes batches on a background thread so decoding overlaps inference"""
+
+    def __init__(self, batches: Iterator[List[Tuple[int, float, np.ndarray]]], max_batches: int = 2):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            batches: Batch generator, consumed on the background thread
+            max_batches: Decoded batches held in the queue; bounds memory use
+        """
+        self._batches = batches
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_batches))
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name='video-decode', daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            for batch in self._batches:
+                if not self._put(batch):
+                    return
+        except BaseException as e:  # re-raised on the consumer thread
+            self._error = e
+        finally:
+            self._put(_END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        close = getattr(self._batches, 'close', None)
+        if close is not None:
+            close()
+
+
+def timeline_row(frame_index: int, t: float, analysis: CheatingAnalysis) -> Dict[str, Any]:
+    """Compact per-frame record; bounding boxes are left out"""
+    head_pose = analysis.head_pose or {}
+    return {
+        'frame': frame_index,
+        't': round(t, 3),
+        'is_cheating': analysis.is_cheating,
+        'severity': analysis.severity,
+        'confidence': round(analysis.confidence_score, 4),
+        'cheating_types': list(analysis.cheating_types),
+        'person_count': analysis.person_count,
+        'objects': sorted({d['class_name'] for d in analysis.detections}),
+        'pitch': head_pose.get('pitch'),
+        'yaw': head_pose.get('yaw'),
+        'roll': head_pose.get('roll'),
+        'direction': head_pose.get('direction'),
+    }
+
+
+class TimelineWriter:
+    """Appends timeline rows to JSONL, or to Parquet in fixed-size row groups"""
+
+    def __init__(self, path: str, fmt: str = 'jsonl'):
+        if fmt not in TIMELINE_FORMATS:
+            raise ValueError(f"Unknown timeline format '{fmt}', expected one of {TIMELINE_FORMATS}")
+        self.path = path
+        self.format = fmt
+        self.rows = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._file = None
+        self._parquet = None
+        if fmt == 'jsonl':
+            self._file = open(path, 'w')
+        else:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)") from e
+
+    def write(self, row: Dict[str, Any]):
+        self.rows += 1
+        if self._file is not None:
+            self._file.write(json.dumps(row, separators=(',', ':')) + '\n')
+            return
+        self._pending.append(row)
+        if len(self._pending) >= PARQUET_ROW_GROUP:
+            self._flush_parquet()
+
+    def _flush_parquet(self):
+        if not self._pending:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(self._pending, schema=self._schema())
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self.path, table.schema, compression='zstd')
+        self._parquet.write_table(table)
+        self._pending = []
+
+    @staticmethod
+    def _schema():
+        import pyarrow as pa
+        return pa.schema([
+            ('frame', pa.int64()),
+            ('t', pa.float64()),
+            ('is_cheating', pa.bool_()),
+            ('severity', pa.string()),
+            ('confidence', pa.float32()),
+            ('cheating_types', pa.list_(pa.string())),
+            ('person_count', pa.int32()),
+            ('objects', pa.list_(pa.string())),
+            ('pitch', pa.float32()),
+            ('yaw', pa.float32()),
+            ('roll', pa.float32()),
+            ('direction', pa.string()),
+        ])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            return
+        self._flush_parquet()
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        elif self.rows == 0:
+            import pyarrow.parquet as pq
+            pq.write_table(self._schema().empty_table(), self.path)
+
+
+def aggregator_capacity(aggregator_rules, sample_fps: float) -> int:
+    """Ring buffer size covering the longest rule window at the sample rate"""
+    longest = max((max(rule.min_duration, rule.clear_duration) for rule in aggregator_rules.values()),
+                  default=0.0)
+    return max(256, math.ceil(longest * sample_fps) + 2)
+
+
+def interval_from_event(event: ViolationEvent) -> Dict[str, Any]:
+    return {
+        'cheating_type': event.cheating_type,
+        'start': round(event.started_at, 3),
+        'end': round(event.timestamp, 3),
+        'duration': event.duration,
+        'severity': event.severity,
+        'peak_confidence': event.peak_confidence,
+    }
+
+
+def analyze_video(detector: YOLOCheatingDetector, video_path: str, timeline: TimelineWriter,
+                  sample_fps: float = 5.0, batch_size: int = 8, prefetch_batches: int = 2,
+                  aggregator: Optional[ViolationAggregator] = None) -> Dict[str, Any]:
+    """
+    Analyze a video file frame by frame.
+
+    Args:
+        detector: Initialized cheating detector
+        video_path: Video file to analyze
+        timeline: Receives one row per sampled frame
+        sample_fps: Frames per second of media time to analyze
+        batch_size: Frames per YOLO call
+        prefetch_batches: Decoded batches buffered ahead of inference
+        aggregator: Violation aggregator (default: one sized for sample_fps)
+
+    Returns:
+        Summary with frame counts, throughput and violation intervals
+    """
+    if aggregator is None:
+        aggregator = ViolationAggregator(capacity=aggregator_capacity(DEFAULT_RULES, sample_fps),
+                                         max_sessions=1, session_ttl=None)
+    session_id = os.path.basename(video_path)
+    intervals: List[Dict[str, Any]] = []
+    frames = 0
+    cheating_frames = 0
+    last_t = 0.0
+    started = time.perf_counter()
+
+    prefetcher = FramePrefetcher(batched(read_frames(video_path, sample_fps), batch_size),
+                                 prefetch_batches)
+    try:
+        for batch in prefetcher:
+            images = [frame for _, _, frame in batch]
+            detections = detector.detect_objects_batch(images)
+            for (index, t, frame), frame_detections in zip(batch, detections):
+                analysis = detector.analyze_frame(frame, timestamp=f"{t:.3f}",
+                                                  detections=frame_detections)
+                timeline.write(timeline_row(index, t, analysis))
+                for event in aggregator.update(session_id, analysis, t=t):
+                    if event.event == 'ended':
+                        intervals.append(interval_from_event(event))
+                frames += 1
+                cheating_frames += analysis.is_cheating
+                last_t = t
+            if frames and frames % (batch_size * 50) < batch_size:
+                logger.info(f"Analyzed {frames} frames ({last_t:.0f}s of media)")
+    finally:
+        prefetcher.close()
+
+    intervals.extend(interval_from_event(event) for event in aggregator.close(session_id, last_t))
+    intervals.sort(key=lambda interval: (interval['start'], interval['cheating_type']))
+    elapsed = time.perf_counter() - started
+    return {
+        'video': video_path,
+        'sample_fps': sample_fps,
+        'frames_analyzed': frames,
+        'cheating_frames': cheating_frames,
+        'media_seconds': round(last_t, 3),
+        'elapsed_seconds': round(elapsed, 3),
+        'frames_per_second': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        'violations': intervals,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analyze a recorded exam video offline")
+    parser.add_argument('--video', required=True)
+    parser.add_argument('--output', required=True, help="Timeline path (.jsonl or .parquet)")
+    parser.add_argument('--format', choices=TIMELINE_FORMATS, default=None,
+                        help="Timeline format (default: from the output extension)")
+    parser.add_argument('--intervals-output', default=None,
+                        help="Summary and violation intervals JSON (default: <output>.violations.json)")
+    parser.add_argument('--fps', type=float, default=5.0, help="Frames analyzed per second of video")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--prefetch', type=int, default=2, help="Decoded batches buffered ahead")
+    parser.add_argument('--model', default=None, help="YOLO weights (default: yolov8n.pt)")
+    parser.add_argument('--backend', default='torch', choices=('torch', 'onnx', 'openvino'))
+    parser.add_argument('--precision', default='fp32', choices=('fp32', 'int8'))
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--confidence', type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.fps <= 0 or args.batch_size <= 0:
+        parser.error("--fps and --batch-size must be positive")
+    fmt = args.format or ('parquet' if args.output.endswith('.parquet') else 'jsonl')
+
+    detector = YOLOCheatingDetector(args.model, confidence_threshold=args.confidence,
+                                    backend=args.backend, num_threads=args.threads,
+                                    precision=args.precision)
+    if not detector.initialize():
+        print("Failed to initialize the detector", file=sys.stderr)
+        return 1
+
+    timeline = TimelineWriter(args.output, fmt)
+    try:
+        summary = analyze_video(detector, args.video, timeline, args.fps, args.batch_size, args.prefetch)
+    finally:
+        timeline.close()
+    summary['timeline'] = args.output
+
+    intervals_path = args.intervals_output or f"{os.path.splitext(args.output)[0]}.violations.json"
+    with open(intervals_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"{summary['frames_analyzed']} frames over {summary['media_seconds']}s of video "
+          f"at {summary['frames_per_second']} frames/s, {len(summary['violations'])} violation intervals")
+    print(f"Timeline written to {args.output}, violations to {intervals_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+Temporal aggregation of per-frame cheating flags into violations.
+
+`analyze_frame` judges single frames, so one blurry frame labelled
+`looking_down` is enough for a warning. The aggregator keeps a compact ring
+buffer of recent frame outcomes per session (timestamp, bitmask of
+CheatingTypes, confidence) and turns them into violations:
+
+- a violation starts once a behaviour has persisted for its minimum
+  duration, measured from the first flagged frame of the current run, in
+  most frames and in at least a minimum number of them (e.g. looking away
+  for more than 3 s), so isolated hits never start one however far apart
+  the frames are,
+- it ends only when the behaviour has been mostly absent for a while
+  (hysteresis, so flicker does not open and close it repeatedly),
+- its severity escalates the longer it stays active.
+
+Only state changes (started, escalated, ended) are emitted as events. A
+session dropped by LRU/TTL eviction still reports its open violations as
+'ended' (at its last frame's time) through the on_evicted callback.
+"""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Deque, Dict, List, Optional
+import logging
+
+import numpy as np
+
+from cheating_detector import CheatingAnalysis, CheatingType
+from session_state import SessionStore
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_LEVELS = ('none', 'low', 'medium', 'high', 'critical')
+
+# Bit position of each CheatingType in the per-frame mask
+TYPE_BITS = {t.value: i for i, t in enumerate(CheatingType)}
+
+
+@dataclass
+class ViolationRule:
+    """When a CheatingType starts, escalates and stops being a violation"""
+    min_duration: float = 3.0       # seconds the behaviour must persist before a violation starts
+    activate_ratio: float = 0.7     # fraction of frames within min_duration that must show it
+    min_frames: int = 3             # flagged frames the run needs before a violation starts
+    clear_duration: float = 2.0     # seconds of history examined before a violation ends;
+                                    # also the longest gap between flagged frames of one run
+    clear_ratio: float = 0.2        # ends when at most this fraction of those frames show it
+    severity: str = 'low'           # severity when the violation starts
+    escalate_after: Optional[float] = 10.0  # seconds per one-level severity increase (None disables)
+
+
+DEFAULT_RULES: Dict[str, ViolationRule] = {
+    CheatingType.PHONE_DETECTED.value: ViolationRule(min_duration=1.0, activate_ratio=0.5, severity='critical'),
+    CheatingType.MULTIPLE_PERSONS.value: ViolationRule(min_duration=2.0, severity='critical'),
+    CheatingType.BOOK_DETECTED.value: ViolationRule(min_duration=1.0, activate_ratio=0.5, severity='high'),
+    CheatingType.EARPHONE_DETECTED.value: ViolationRule(min_duration=1.0, activate_ratio=0.5, severity='high'),
+    CheatingType.NO_PERSON.value: ViolationRule(min_duration=5.0, severity='high'),
+    CheatingType.PAPER_DETECTED.value: ViolationRule(min_duration=2.0, severity='medium'),
+    CheatingType.SUSPICIOUS_OBJECT.value: ViolationRule(min_duration=2.0, severity='medium'),
+    CheatingType.FACE_NOT_VISIBLE.value: ViolationRule(min_duration=3.0),
+    CheatingType.LOOKING_AWAY.value: ViolationRule(min_duration=3.0),
+    CheatingType.LOOKING_DOWN.value: ViolationRule(min_duration=3.0),
+    CheatingType.LOOKING_UP.value: ViolationRule(min_duration=3.0),
+    CheatingType.LOOKING_LEFT.value: ViolationRule(min_duration=3.0),
+    CheatingType.LOOKING_RIGHT.value: ViolationRule(min_duration=3.0),
+}
+
+
+@dataclass
+class ViolationEvent:
+    """A violation starting, escalating or ending"""
+    session_id: str
+    cheating_type: str
+    event: str              # started, escalated, ended
+    severity: str
+    timestamp: float        # seconds since the epoch (or media time for offline analysis)
+    started_at: float
+    duration: float
+    peak_confidence: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class _Run:
+    """Consecutive frames showing a behaviour that is not (yet) a violation"""
+    started_at: float
+    last_seen: float
+    frames: int = 0
+    hits: int = 0
+    peak_confidence: float = 0.0
+
+
+@dataclass
+class _ActiveViolation:
+    started_at: float
+    severity: str
+    peak_confidence: float
+
+
+class _SessionViolations:
+    """Ring buffer of frame outcomes plus the active violations of one session"""
+
+    def __init__(self, capacity: int, max_events: int):
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.masks = np.zeros(capacity, dtype=np.uint32)
+        self.confidences = np.zeros(capacity, dtype=np.float32)
+        self.count = 0
+        self.head = 0
+        self.active: Dict[str, _ActiveViolation] = {}
+        self.runs: Dict[str, _Run] = {}
+        self.events: Deque[ViolationEvent] = deque(maxlen=max_events)
+        self.lock = threading.Lock()
+
+    def append(self, t: float, mask: int, confidence: float):
+        self.times[self.head] = t
+        self.masks[self.head] = mask
+        self.confidences[self.head] = confidence
+        self.head = (self.head + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def latest_mask(self) -> int:
+        return int(self.masks[(self.head - 1) % len(self.masks)])
+
+    def latest_confidence(self) -> float:
+        return float(self.confidences[(self.head - 1) % len(self.confidences)])
+
+    def window(self, since: float):
+        """(masks, confidences) of buffered frames at or after `since`, plus the oldest buffered time"""
+        times = self.times[:self.count]
+        selected = times >= since
+        return self.masks[:self.count][selected], self.confidences[:self.count][selected], times.min()
+
+
+class ViolationAggregator:
+    """Per-session sliding-window aggregation of CheatingAnalysis results"""
+
+    def __init__(self, rules: Optional[Dict[str, ViolationRule]] = None, capacity: int = 256,
+                 max_events: int = 100, max_sessions: int = 1000, session_ttl: float = 900.0,
+                 on_evicted: Optional[Callable[[List[ViolationEvent]], None]] = None):
+        """
+        Initialize the aggregator.
+
+        Args:
+            rules: Rule per CheatingType value (defaults to DEFAULT_RULES)
+            capacity: Frame outcomes kept per session; must cover the longest rule
+                duration at the highest expected frame rate
+            max_events: Recent events kept per session for get_session()
+            max_sessions: Sessions tracked before least recently used ones are evicted
+            session_ttl: Idle seconds after which a session's state is dropped
+            on_evicted: Called with the 'ended' events of an evicted session's
+                active violations (they are also logged)
+        """
+        self.rules = dict(DEFAULT_RULES if rules is None else rules)
+        self.capacity = capacity
+        self.max_events = max_events
+        self._on_evicted = on_evicted
+        self._sessions: SessionStore[_SessionViolations] = SessionStore(max_sessions, session_ttl,
+                                                                        on_evict=self._evicted)
+        self._stats_lock = threading.Lock()
+        self.frames = 0
+        self.events_emitted = 0
+
+    def _new_session(self) -> _SessionViolations:
+        return _SessionViolations(self.capacity, self.max_events)
+
+    def update(self, session_id: str, analysis: CheatingAnalysis,
+               t: Optional[float] = None) -> List[ViolationEvent]:
+        """
+        Add a frame's analysis to the session and return any state changes.
+
+        Args:
+            session_id: Test session identifier
+            analysis: Per-frame analysis
+            t: Frame time in seconds (default: now)
+
+        Returns:
+            Events for violations that started, escalated or ended on this frame
+        """
+        t = time.time() if t is None else t
+        mask = 0
+        for cheating_type in analysis.cheating_types:
+            bit = TYPE_BITS.get(cheating_type)
+            if bit is not None:
+                mask |= 1 << bit
+
+        state = self._sessions.get_or_create(session_id, self._new_session)
+        events: List[ViolationEvent] = []
+        with state.lock:
+            state.append(t, mask, analysis.confidence_score)
+            for cheating_type, rule in self.rules.items():
+                event = self._evaluate(session_id, state, cheating_type, rule, t)
+                if event is not None:
+                    events.append(event)
+            state.events.extend(events)
+
+        with self._stats_lock:
+            self.frames += 1
+            self.events_emitted += len(events)
+        return events
+
+    def _evaluate(self, session_id: str, state: _SessionViolations, cheating_type: str,
+                  rule: ViolationRule, t: float) -> Optional[ViolationEvent]:
+        bit = 1 << TYPE_BITS[cheating_type]
+        active = state.active.get(cheating_type)
+
+        if active is None:
+            present = bool(state.latest_mask() & bit)
+            run = self._track_run(state, cheating_type, rule, t, present, state.latest_confidence())
+            if run is None or not present:
+                return None
+            if t - run.started_at < rule.min_duration or run.hits < rule.min_frames \
+                    or run.hits / run.frames < rule.activate_ratio:
+                return None
+            del state.runs[cheating_type]
+            state.active[cheating_type] = _ActiveViolation(run.started_at, rule.severity, run.peak_confidence)
+            return ViolationEvent(session_id, cheating_type, 'started', rule.severity, t,
+                                  run.started_at, round(t - run.started_at, 3),
+                                  round(run.peak_confidence, 4))
+
+        masks, confidences, _ = state.window(t - rule.clear_duration)
+        present = (masks & bit) != 0
+        if present.any():
+            active.peak_confidence = max(active.peak_confidence, float(confidences[present].max()))
+
+        if t - active.started_at >= rule.min_duration + rule.clear_duration \
+                and present.mean() <= rule.clear_ratio:
+            del state.active[cheating_type]
+            return ViolationEvent(session_id, cheating_type, 'ended', active.severity, t,
+                                  active.started_at, round(t - active.started_at, 3),
+                                  round(active.peak_confidence, 4))
+
+        severity = self._escalated_severity(rule, t - active.started_at)
+        if SEVERITY_LEVELS.index(severity) > SEVERITY_LEVELS.index(active.severity):
+            active.severity = severity
+            return ViolationEvent(session_id, cheating_type, 'escalated', severity, t,
+                                  active.started_at, round(t - active.started_at, 3),
+                                  round(active.peak_confidence, 4))
+        return None
+
+    @staticmethod
+    def _track_run(state: _SessionViolations, cheating_type: str, rule: ViolationRule,
+                   t: float, present: bool, confidence: float) -> Optional[_Run]:
+        """Update the behaviour's current run with this frame and return it (None if there is none)"""
+        run = state.runs.get(cheating_type)
+        if present:
+            if run is None or t - run.last_seen > rule.clear_duration:
+                # First hit, or the previous hit is too old to belong to the same run
+                run = state.runs[cheating_type] = _Run(started_at=t, last_seen=t)
+            run.frames += 1
+            run.hits += 1
+            run.last_seen = t
+            run.peak_confidence = max(run.peak_confidence, confidence)
+        elif run is not None:
+            run.frames += 1
+            if t - run.last_seen > rule.clear_duration or \
+                    (run.frames >= rule.min_frames and run.hits / run.frames < rule.activate_ratio):
+                del state.runs[cheating_type]
+                run = None
+        return run
+
+    @staticmethod
+    def _escalated_severity(rule: ViolationRule, active_for: float) -> str:
+        level = SEVERITY_LEVELS.index(rule.severity)
+        if rule.escalate_after:
+            level += int(active_for // rule.escalate_after)
+        return SEVERITY_LEVELS[min(level, len(SEVERITY_LEVELS) - 1)]
+
+    def close(self, session_id: str, t: Optional[float] = None) -> List[ViolationEvent]:
+        """End every active violation of a session and forget it"""
+        t = time.time() if t is None else t
+        state = self._sessions.pop(session_id)
+        if state is None:
+            return []
+        return self._end_all(session_id, state, t)
+
+    def _end_all(self, session_id: str, state: _SessionViolations, t: float) -> List[ViolationEvent]:
+        with state.lock:
+            events = [
+                ViolationEvent(session_id, cheating_type, 'ended', active.severity, t,
+                               active.started_at, round(t - active.started_at, 3),
+                               round(active.peak_confidence, 4))
+                for cheating_type, active in state.active.items()
+            ]
+            state.active.clear()
+        with self._stats_lock:
+            self.events_emitted += len(events)
+        return events
+
+    def _evicted(self, session_id: str, state: _SessionViolations):
+        """SessionStore eviction callback: end the session's violations at its last frame"""
+        with state.lock:
+            last_seen = float(state.times[(state.head - 1) % len(state.times)]) if state.count else time.time()
+        events = self._end_all(session_id, state, last_seen)
+        if not events:
+            return
+        for event in events:
+            logger.info(f"Violation ended on session eviction: {event.to_dict()}")
+        if self._on_evicted is not None:
+            self._on_evicted(events)
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Active violations and recent events of a session"""
+        state = self._sessions.get(session_id)
+        if state is None:
+            return None
+        with state.lock:
+            return {
+                'session_id': session_id,
+                'frames': state.count,
+                'active': [
+                    {
+                        'cheating_type': cheating_type,
+                        'severity': active.severity,
+                        'started_at': active.started_at,
+                        'peak_confidence': round(active.peak_confidence, 4),
+                    }
+                    for cheating_type, active in state.active.items()
+                ],
+                'events': [event.to_dict() for event in state.events],
+            }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'frames': self.frames,
+                'events': self.events_emitted,
+                'sessions': len(self._sessions),
+            }
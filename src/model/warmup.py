@@ -0,0 +1,164 @@
+"""
+Eager model loading and warm-up for the proctoring API.
+
+Models are loaded in a background thread at startup and each one runs a few
+warm-up inferences at every configured input size, so the first real request
+does not pay for weight loading or first-inference graph setup. The server
+reports ready (GET /ready) only once every required model is hot.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from metrics import WARMUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WARMUP_SIZES = ((640, 480), (1280, 720))
+
+
+def parse_sizes(spec: str) -> List[Tuple[int, int]]:
+    """Parse "640x480,1280x720" into [(640, 480), (1280, 720)]"""
+    sizes = []
+    for item in spec.split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        width, height = item.split('x')
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def make_warmup_frame(width: int, height: int) -> np.ndarray:
+    """Deterministic textured BGR frame so every network actually runs"""
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+
+@dataclass
+class WarmupStep:
+    """One model to load and warm up"""
+    name: str
+    load: Callable[[], Any]                                # returns the loaded model, raises on failure
+    warm: Optional[Callable[[Any, np.ndarray], Any]] = None
+    required: bool = True                                  # optional steps never block readiness
+    iterations: int = 2
+
+
+@dataclass
+class StepStatus:
+    """Progress and durations for one step"""
+    state: str = 'pending'      # pending, loading, warming, ready, failed
+    load_ms: Optional[float] = None
+    warmup_ms: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class ModelWarmup:
+    """Runs the warm-up steps once in a background thread and tracks readiness"""
+
+    def __init__(self, steps: List[WarmupStep], sizes=DEFAULT_WARMUP_SIZES):
+        """
+        Initialize the warm-up.
+
+        Args:
+            steps: Models to load, in order
+            sizes: (width, height) input sizes to run warm-up inferences at
+        """
+        self.steps = steps
+        self.sizes = list(sizes)
+        self._status: Dict[str, StepStatus] = {step.name: StepStatus() for step in steps}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.total_ms: Optional[float] = None
+
+    def start(self):
+        """Launch the background warm-up (no-op if already started)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+            self._thread.start()
+
+    def run(self):
+        """Load and warm up every step in order"""
+        self.started_at = time.monotonic()
+        frames = {f"{w}x{h}": make_warmup_frame(w, h) for w, h in self.sizes}
+
+        for step in self.steps:
+            status = self._status[step.name]
+            try:
+                self._set_state(status, 'loading')
+                started = time.perf_counter()
+                model = step.load()
+                status.load_ms = round((time.perf_counter() - started) * 1000, 1)
+
+                if step.warm is not None:
+                    self._set_state(status, 'warming')
+                    for label, frame in frames.items():
+                        started = time.perf_counter()
+                        for _ in range(step.iterations):
+                            step.warm(model, frame)
+                        elapsed = time.perf_counter() - started
+                        status.warmup_ms[label] = round(elapsed * 1000, 1)
+                        WARMUP_SECONDS.set(elapsed, step.name, label)
+
+                self._set_state(status, 'ready')
+                logger.info(f"Model {step.name} ready (load {status.load_ms} ms, warm-up {status.warmup_ms})")
+            except Exception as e:
+                status.error = str(e)
+                self._set_state(status, 'failed')
+                level = logging.ERROR if step.required else logging.WARNING
+                logger.log(level, f"Warm-up of {step.name} failed: {e}")
+
+        self.total_ms = round((time.monotonic() - self.started_at) * 1000, 1)
+        self._done.set()
+        logger.info(f"Model warm-up finished in {self.total_ms} ms (ready={self.ready})")
+
+    def _set_state(self, status: StepStatus, state: str):
+        with self._lock:
+            status.state = state
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until warm-up has finished; returns readiness"""
+        self._done.wait(timeout)
+        return self.ready
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def ready(self) -> bool:
+        """True once every required step is ready"""
+        with self._lock:
+            return all(self._status[step.name].state == 'ready'
+                       for step in self.steps if step.required)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {
+                step.name: {
+                    'state': status.state,
+                    'required': step.required,
+                    'load_ms': status.load_ms,
+                    'warmup_ms': dict(status.warmup_ms),
+                    'error': status.error,
+                }
+                for step, status in ((s, self._status[s.name]) for s in self.steps)
+            }
+        return {
+            'started': self._thread is not None,
+            'finished': self.finished,
+            'ready': self.ready,
+            'total_ms': self.total_ms,
+            'sizes': [f"{w}x{h}" for w, h in self.sizes],
+            'models': models,
+        }
@@ -0,0 +1,396 @@
+"""
+Multi-process inference worker pool with shared-memory frame handoff.
+
+Each worker process is pinned to its own set of cores and holds one copy of
+the models (YOLO, the Caffe face net). Web handlers copy decoded frames into
+slots of a shared-memory ring instead of pickling arrays; only a small task
+tuple (slot index, shape, timestamp) travels over the queue, and results come
+back as plain dicts on a per-worker result pipe. Each worker has its own task
+queue, so the pool knows which frames a worker holds: if the process dies,
+those frames' futures fail, their slots are recycled and the worker is
+respawned.
+
+Run the web server as a single process with threads (e.g.
+`gunicorn -w 1 -k gthread --threads 32 app:app`) so the models are loaded
+once per worker process here rather than once per HTTP worker.
+"""
+
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, field
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+import logging
+import multiprocessing as mp
+import multiprocessing.connection as mp_connection
+
+import numpy as np
+
+from cheating_detector import CheatingAnalysis
+
+logger = logging.getLogger(__name__)
+
+# Room for a 1080p BGR frame per slot
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+
+
+def _split_cpus(num_workers: int) -> List[Optional[List[int]]]:
+    """Partition the CPUs available to this process into one set per worker"""
+    if not hasattr(os, 'sched_getaffinity'):
+        return [None] * num_workers
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < num_workers:
+        return [None] * num_workers
+    per_worker = len(cpus) // num_workers
+    return [cpus[i * per_worker:(i + 1) * per_worker] for i in range(num_workers)]
+
+
+def _worker_main(worker_id: int, shm_name: str, slot_bytes: int, task_queue, result_conn,
+                 cpus: Optional[List[int]], detector_kwargs: Dict[str, Any]):
+    """Worker process entry point: load models once, then serve frames from shared memory"""
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+
+    from cheating_detector import YOLOCheatingDetector
+
+    kwargs = dict(detector_kwargs)
+    if cpus:
+        kwargs.setdefault('object_threads', len(cpus))
+        kwargs.setdefault('face_threads', len(cpus))
+    detector = YOLOCheatingDetector(**kwargs)
+    ready = detector.initialize()
+    result_conn.send(('ready', worker_id, ready))
+    if not ready:
+        # Without models every frame would fail; the pool marks this worker failed
+        return
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            task_id, slot, shape, dtype, timestamp = task
+            try:
+                frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf,
+                                   offset=slot * slot_bytes)
+                analysis = detector.analyze_frame(frame, timestamp)
+                del frame  # drop the view before the slot is handed back
+                result_conn.send(('result', worker_id, task_id, asdict(analysis), None))
+            except Exception as e:
+                result_conn.send(('result', worker_id, task_id, None, str(e)))
+    finally:
+        shm.close()
+
+
+@dataclass
+class _Worker:
+    """A worker process, its task queue and the tasks it holds"""
+    worker_id: int
+    cpus: Optional[List[int]]
+    process: Any = None
+    task_queue: Any = None
+    results: Any = None                     # receiving end of the worker's result pipe
+    state: str = 'starting'                 # starting, ready, failed
+    in_flight: Dict[int, int] = field(default_factory=dict)  # task_id -> slot
+    restarts: int = 0
+
+
+class InferenceWorkerPool:
+    """Pool of pinned model-holding processes fed through a shared-memory slot ring"""
+
+    def __init__(self, num_workers: Optional[int] = None, num_slots: int = 32,
+                 slot_bytes: int = DEFAULT_SLOT_BYTES,
+                 detector_kwargs: Optional[Dict[str, Any]] = None,
+                 max_restarts: int = 5, monitor_interval: float = 1.0):
+        """
+        Initialize the pool (call start() to launch the workers).
+
+        Args:
+            num_workers: Worker processes (default: one per 2 available cores)
+            num_slots: Frames that can be in flight at once
+            slot_bytes: Maximum decoded frame size in bytes
+            detector_kwargs: Keyword arguments for YOLOCheatingDetector in each worker
+            max_restarts: Times a worker that dies is respawned before it is marked failed
+            monitor_interval: Seconds between liveness checks of the worker processes
+        """
+        available = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+        self.num_workers = num_workers or max(1, available // 2)
+        self.num_slots = num_slots
+        self.slot_bytes = slot_bytes
+        self.detector_kwargs = detector_kwargs or {}
+        self.max_restarts = max_restarts
+        self.monitor_interval = monitor_interval
+
+        self._ctx = mp.get_context('spawn')
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._workers: List[_Worker] = []
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        self._pending: Dict[int, Future] = {}
+        # Guards _pending and every worker's state and in_flight tasks
+        self._pending_lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._collector: Optional[threading.Thread] = None
+        self._reported_event = threading.Event()
+        self._stopping = False
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+    def start(self, wait_ready: bool = False, timeout: Optional[float] = None):
+        """Allocate the shared ring and spawn the workers"""
+        if self._workers:
+            return
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.num_slots * self.slot_bytes)
+        for slot in range(self.num_slots):
+            self._free_slots.put(slot)
+
+        self._workers = [_Worker(worker_id, cpus) for worker_id, cpus in enumerate(_split_cpus(self.num_workers))]
+        for worker in self._workers:
+            self._spawn(worker)
+
+        self._collector = threading.Thread(target=self._collect, name="worker-pool-results", daemon=True)
+        self._collector.start()
+
+        if wait_ready:
+            self.wait_ready(timeout)
+
+    def _spawn(self, worker: _Worker):
+        # A private result pipe per worker: a worker killed mid-write cannot
+        # wedge the others (as a shared queue's lock would), and its death
+        # shows up as EOF on the pipe
+        worker.results, result_conn = self._ctx.Pipe(duplex=False)
+        worker.task_queue = self._ctx.Queue()
+        worker.state = 'starting'
+        self._reported_event.clear()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_id, self._shm.name, self.slot_bytes, worker.task_queue,
+                  result_conn, worker.cpus, self.detector_kwargs),
+            name=f"inference-worker-{worker.worker_id}",
+            daemon=True
+        )
+        worker.process.start()
+        result_conn.close()
+        logger.info(f"Started inference worker {worker.worker_id} (pid={worker.process.pid}, cpus={worker.cpus})")
+
+    @property
+    def ready(self) -> bool:
+        """True while every worker has its models loaded"""
+        with self._pending_lock:
+            return bool(self._workers) and all(w.state == 'ready' for w in self._workers)
+
+    @property
+    def failed_workers(self) -> List[int]:
+        """Workers that could not load their models or kept dying"""
+        with self._pending_lock:
+            return [w.worker_id for w in self._workers if w.state == 'failed']
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until every worker has reported in; returns whether all loaded their models"""
+        self._reported_event.wait(timeout)
+        return self.ready
+
+    def submit(self, image: np.ndarray, timestamp: str = "", timeout: Optional[float] = 5.0) -> Future:
+        """
+        Copy a frame into a free slot and queue it for analysis.
+
+        Args:
+            image: BGR image (OpenCV format)
+            timestamp: Timestamp string for the analysis
+            timeout: Seconds to wait for a free slot
+
+        Returns:
+            Future resolving to a CheatingAnalysis
+
+        Raises:
+            RuntimeError: If no slot frees up in time or every worker has failed
+        """
+        if not self._workers:
+            self.start()
+        if image.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {image.nbytes} bytes exceeds worker slot size ({self.slot_bytes})")
+
+        try:
+            slot = self._free_slots.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError("No free inference slot")
+
+        view = np.ndarray(image.shape, dtype=image.dtype, buffer=self._shm.buf,
+                          offset=slot * self.slot_bytes)
+        view[...] = image
+        del view
+
+        task_id = next(self._task_ids)
+        future: Future = Future()
+        with self._pending_lock:
+            # Least loaded worker that is (or will soon be) able to serve
+            candidates = [w for w in self._workers if w.state != 'failed']
+            if not candidates:
+                self._free_slots.put(slot)
+                raise RuntimeError("No inference worker available")
+            worker = min(candidates, key=lambda w: (w.state != 'ready', len(w.in_flight)))
+            worker.in_flight[task_id] = slot
+            self._pending[task_id] = future
+            worker.task_queue.put((task_id, slot, image.shape, image.dtype.str, timestamp))
+        return future
+
+    def analyze(self, image: np.ndarray, timestamp: str = "",
+                timeout: Optional[float] = 30.0) -> CheatingAnalysis:
+        """Analyse a frame in a worker process and wait for the result"""
+        return self.submit(image, timestamp).result(timeout=timeout)
+
+    def _collect(self):
+        """Route worker results back to their futures, recycle slots and replace dead workers"""
+        while True:
+            with self._pending_lock:
+                connections = {w.results: w for w in self._workers if w.state != 'failed'}
+                if self._stopping and not any(w.process.is_alive() for w in self._workers):
+                    # Keep draining results until the last worker has exited
+                    break
+            for conn in mp_connection.wait(list(connections), timeout=self.monitor_interval):
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    # The worker exited; _check_workers reaps it below
+                    connections[conn].process.join(timeout=1)
+                    continue
+                self._handle(message)
+            self._check_workers()
+
+    def _handle(self, message):
+        if message[0] == 'ready':
+            _, worker_id, ok = message
+            with self._pending_lock:
+                worker = self._workers[worker_id]
+                worker.state = 'ready' if ok else 'failed'
+                orphaned = [] if ok else self._release_tasks(worker)
+                reported = all(w.state != 'starting' for w in self._workers)
+            if ok:
+                logger.info(f"Inference worker {worker_id} ready")
+            else:
+                logger.error(f"Inference worker {worker_id} failed to load models")
+                self._fail_futures(orphaned, f"Inference worker {worker_id} failed to load models")
+            if reported:
+                self._reported_event.set()
+            return
+
+        _, worker_id, task_id, result, error = message
+        with self._pending_lock:
+            slot = self._workers[worker_id].in_flight.pop(task_id, None)
+            future = self._pending.pop(task_id, None)
+            if slot is not None and future is not None:
+                if error is not None:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+        if slot is None:
+            # Already failed and recycled when the worker was declared dead
+            return
+        self._free_slots.put(slot)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(CheatingAnalysis(**result))
+
+    def _release_tasks(self, worker: _Worker) -> List[Future]:
+        """Hand a worker's slots back and detach its futures (call with _pending_lock held)"""
+        futures = []
+        for task_id, slot in worker.in_flight.items():
+            self._free_slots.put(slot)
+            future = self._pending.pop(task_id, None)
+            if future is not None:
+                futures.append(future)
+        worker.in_flight.clear()
+        return futures
+
+    def _fail_futures(self, futures: List[Future], reason: str):
+        with self._pending_lock:
+            self.failed += len(futures)
+        for future in futures:
+            future.set_exception(RuntimeError(reason))
+
+    def _check_workers(self):
+        """Fail the tasks of workers that died and respawn them"""
+        if self._stopping:
+            return
+        for worker in self._workers:
+            with self._pending_lock:
+                if worker.state == 'failed' or worker.process.is_alive():
+                    continue
+                orphaned = self._release_tasks(worker)
+                exitcode = worker.process.exitcode
+                if worker.restarts >= self.max_restarts:
+                    worker.state = 'failed'
+                    respawn = False
+                else:
+                    worker.restarts += 1
+                    self.restarts += 1
+                    respawn = True
+            logger.error(f"Inference worker {worker.worker_id} died (exit code {exitcode}), "
+                         f"{len(orphaned)} frames lost; " + ("restarting" if respawn else "giving up"))
+            self._fail_futures(orphaned, f"Inference worker {worker.worker_id} died")
+            if respawn:
+                worker.task_queue.close()
+                worker.results.close()
+                with self._pending_lock:
+                    self._spawn(worker)
+            elif all(w.state != 'starting' for w in self._workers):
+                self._reported_event.set()
+
+    def stop(self):
+        """Stop the workers and release the shared memory"""
+        if not self._workers:
+            return
+        self._stopping = True
+        for worker in self._workers:
+            if worker.process.is_alive():
+                worker.task_queue.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+        if self._collector is not None:
+            self._collector.join(timeout=self.monitor_interval + 5)
+
+        with self._pending_lock:
+            for future in self._pending.values():
+                future.set_exception(RuntimeError("Worker pool stopped"))
+            self._pending.clear()
+            for worker in self._workers:
+                worker.results.close()
+            self._workers = []
+
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._pending_lock:
+            in_flight = len(self._pending)
+            workers = [
+                {'id': w.worker_id, 'state': w.state, 'alive': w.process.is_alive(),
+                 'in_flight': len(w.in_flight), 'restarts': w.restarts}
+                for w in self._workers
+            ]
+            completed, failed, restarts = self.completed, self.failed, self.restarts
+        return {
+            'workers': len(workers),
+            'alive': sum(1 for w in workers if w['alive']),
+            'ready': all(w['state'] == 'ready' for w in workers) and bool(workers),
+            'failed_workers': [w['id'] for w in workers if w['state'] == 'failed'],
+            'worker_states': workers,
+            'slots': self.num_slots,
+            'free_slots': self._free_slots.qsize(),
+            'in_flight': in_flight,
+            'completed': completed,
+            'failed': failed,
+            'restarts': restarts,
+        }